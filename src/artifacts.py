@@ -0,0 +1,243 @@
+import datetime
+import json
+import os
+from collections.abc import Mapping
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.pipeline import Pipeline
+
+ARTIFACTS_DIR = '../data/predicted/models'
+MANIFEST_FILE = 'manifest.json'
+PREPROCESSOR_FILE = 'preprocessor.joblib'
+OOF_FILE = 'oof.parquet'
+HOLDOUT_FILE = 'holdout.parquet'
+
+# Formato nativo de cada família de booster; as demais usam joblib
+CLASSIFIER_FILES = {
+    'xgboost': 'classifier.ubj',
+    'lightgbm': 'classifier.txt',
+    'joblib': 'classifier.joblib'
+}
+
+# Tabelas do resultado gravadas em parquet: predições out-of-fold do treino
+# (paciente_id, alvo, oof_proba) e pacientes do holdout (paciente_id, alvo)
+TABLE_FILES = {
+    'oof_proba': OOF_FILE,
+    'holdout': HOLDOUT_FILE
+}
+
+# Chaves do resultado que vão para arquivos próprios e só são lidas sob demanda
+LAZY_KEYS = ('model', *TABLE_FILES)
+
+
+class LGBMBoosterClassifier(ClassifierMixin, BaseEstimator):
+
+    # Adaptador com a interface de classificador do sklearn sobre um
+    # lightgbm.Booster carregado do formato texto nativo
+    def __init__(self, booster=None):
+        self.booster = booster
+
+    @property
+    def booster_(self):
+        return self.booster
+
+    @property
+    def classes_(self):
+        return np.array([0, 1])
+
+    @property
+    def n_features_in_(self):
+        return self.booster.num_feature()
+
+    def __sklearn_is_fitted__(self):
+        return self.booster is not None
+
+    def predict_proba(self, X):
+        proba = self.booster.predict(np.asarray(X, dtype=np.float64))
+        return np.column_stack([1 - proba, proba])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+
+class LoadedPipeline(Pipeline):
+
+    # Pipeline de um modelo lido do disco. O classificador pode ser um
+    # adaptador só de inferência (sem fit), que a checagem padrão do sklearn
+    # recusa; para esses vale o __sklearn_is_fitted__ do próprio adaptador.
+    def __sklearn_is_fitted__(self):
+        classifier = self._final_estimator
+        if hasattr(classifier, 'fit'):
+            return super().__sklearn_is_fitted__()
+        return classifier.__sklearn_is_fitted__()
+
+
+def loaded_pipeline(preprocessor, classifier):
+    return LoadedPipeline([
+        ('preprocessor', preprocessor),
+        ('classifier', classifier)
+    ])
+
+
+def _slug(model_name):
+    return model_name.lower().replace(' ', '_')
+
+
+def _to_json(value):
+
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+
+    raise TypeError(f'Tipo não serializável no manifest: {type(value)}')
+
+
+def _classifier_format(classifier):
+
+    nome = type(classifier).__name__
+    if nome == 'XGBClassifier':
+        return 'xgboost'
+    if nome in ('LGBMClassifier', 'LGBMBoosterClassifier'):
+        return 'lightgbm'
+
+    return 'joblib'
+
+
+def save_classifier(classifier, path, formato):
+
+    if formato == 'xgboost':
+        classifier.save_model(path)
+    elif formato == 'lightgbm':
+        classifier.booster_.save_model(path)
+    else:
+        joblib.dump(classifier, path)
+
+
+def load_classifier(path, formato):
+
+    if formato == 'xgboost':
+        from xgboost import XGBClassifier
+        classifier = XGBClassifier()
+        classifier.load_model(path)
+        return classifier
+
+    if formato == 'lightgbm':
+        import lightgbm
+        return LGBMBoosterClassifier(lightgbm.Booster(model_file=path))
+
+    return joblib.load(path)
+
+
+def save_artifacts(results, artifacts_dir=ARTIFACTS_DIR):
+
+    # Um diretório por modelo (pré-processador + classificador em formato
+    # nativo) e um manifest com métricas e parâmetros de todos eles, que pode
+    # ser lido sem desserializar nenhum estimador
+    import store
+
+    os.makedirs(artifacts_dir, exist_ok=True)
+    manifest = {'created_at': datetime.datetime.now().isoformat(), 'models': {}}
+
+    for model_name, result in results.items():
+        diretorio = os.path.join(artifacts_dir, _slug(model_name))
+        os.makedirs(diretorio, exist_ok=True)
+
+        pipeline = result['model']
+        classifier = pipeline.named_steps['classifier']
+        formato = _classifier_format(classifier)
+
+        joblib.dump(pipeline.named_steps['preprocessor'], os.path.join(diretorio, PREPROCESSOR_FILE))
+        save_classifier(classifier, os.path.join(diretorio, CLASSIFIER_FILES[formato]), formato)
+        arquivos = [PREPROCESSOR_FILE, CLASSIFIER_FILES[formato]]
+
+        for key, arquivo in TABLE_FILES.items():
+            if result.get(key) is not None:
+                result[key].to_parquet(os.path.join(diretorio, arquivo), index=False)
+                arquivos.append(arquivo)
+
+        entrada = {key: value for key, value in result.items() if key not in LAZY_KEYS}
+        entrada['artifact'] = {
+            'dir': _slug(model_name),
+            'format': formato,
+            'sha256': {arquivo: store.file_sha256(os.path.join(diretorio, arquivo)) for arquivo in arquivos}
+        }
+        manifest['models'][model_name] = entrada
+
+    path = os.path.join(artifacts_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, default=_to_json)
+    os.replace(path + '.tmp', path)
+
+    print(f'Artefatos salvos em {artifacts_dir}: {", ".join(results)}')
+
+
+class ModelEntry(Mapping):
+
+    # Entrada de um modelo com as mesmas chaves do antigo model_series.pkl;
+    # o pipeline ('model') e as tabelas de TABLE_FILES só são carregados do
+    # disco no primeiro acesso
+    def __init__(self, artifacts_dir, info):
+        self._artifacts_dir = artifacts_dir
+        self._info = dict(info)
+        self._lazy = {}
+        self._lazy_keys = ['model'] + [key for key, arquivo in TABLE_FILES.items() if arquivo in self._info['artifact']['sha256']]
+
+    def _path(self, arquivo):
+        return os.path.join(self._artifacts_dir, self._info['artifact']['dir'], arquivo)
+
+    def _load(self, key):
+
+        if key in TABLE_FILES:
+            return pd.read_parquet(self._path(TABLE_FILES[key]))
+
+        formato = self._info['artifact']['format']
+        preprocessor = joblib.load(self._path(PREPROCESSOR_FILE))
+        classifier = load_classifier(self._path(CLASSIFIER_FILES[formato]), formato)
+
+        return loaded_pipeline(preprocessor, classifier)
+
+    def __getitem__(self, key):
+
+        if key in self._lazy_keys:
+            if key not in self._lazy:
+                self._lazy[key] = self._load(key)
+            return self._lazy[key]
+
+        return self._info[key]
+
+    def __iter__(self):
+        return iter([*self._info, *self._lazy_keys])
+
+    def __len__(self):
+        return len(self._info) + len(self._lazy_keys)
+
+
+class ModelRegistry(Mapping):
+
+    def __init__(self, artifacts_dir=ARTIFACTS_DIR):
+        self.artifacts_dir = artifacts_dir
+        with open(os.path.join(artifacts_dir, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self._entries = {
+            model_name: ModelEntry(artifacts_dir, info)
+            for model_name, info in self.manifest['models'].items()
+        }
+
+    def __getitem__(self, model_name):
+        return self._entries[model_name]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def load_artifacts(artifacts_dir=ARTIFACTS_DIR):
+    return ModelRegistry(artifacts_dir)
@@ -0,0 +1,130 @@
+# Escoragem em lote, out-of-core, com o pipeline salvo por train.py.
+# Uso: python batch_score.py --entrada ../data/processed/processed_cardio_data.csv \
+#                            --saida ../data/predicted/scores.parquet [--workers 4]
+#      python batch_score.py --entrada ../data/processed/store [--versao 3] --saida ...
+import argparse
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import artifacts
+import perf
+import processing
+import scoring
+import store
+
+OUTPUT_SCHEMA = pa.schema([('paciente_id', pa.int64()), ('pred_proba', pa.float64())])
+
+_entrada = None
+
+
+def read_chunks(path, columns, chunksize, version=None):
+
+    # CSV é lido em chunks; uma versão do store (diretório do store + versão,
+    # a última por padrão) é lida por store.read_table, que aplica as
+    # partições e exclusões do ingest.py, mapeada em memória e fatiada sem
+    # cópia, de modo que só o chunk corrente é materializado
+    if path.endswith('.csv'):
+        with processing.read_processed_csv(path, usecols=columns, chunksize=chunksize) as reader:
+            yield from reader
+        return
+    if not os.path.isdir(path):
+        raise ValueError(f'Entrada deve ser um CSV processado ou o diretório do store (com --versao): {path}')
+
+    table = store.read_table(columns, version, path)
+    for inicio in range(0, table.num_rows, chunksize):
+        yield table.slice(inicio, chunksize).to_pandas(split_blocks=True)
+
+
+def _init_worker(artifacts_dir, model_name):
+
+    global _entrada
+    _entrada = scoring.load_model(model_name, artifacts_dir)
+    # Carrega o pipeline já na inicialização do worker, e não no primeiro chunk
+    _entrada['model']
+
+
+def _score_chunk(df):
+    return df['paciente_id'].to_numpy(), scoring.predict_proba(_entrada, df), perf.peak_rss_mb()
+
+
+def score_file(input_path, output_path, model_name='XGBoost', artifacts_dir=artifacts.ARTIFACTS_DIR,
+               chunksize=200_000, workers=1, version=None):
+
+    features = scoring.load_model(model_name, artifacts_dir)['features']
+    chunks = read_chunks(input_path, ['paciente_id'] + features, chunksize, version)
+    qtd_linhas = 0
+    pico_workers = 0.0
+
+    with perf.timer() as tempo, pq.ParquetWriter(output_path, OUTPUT_SCHEMA) as writer:
+
+        def write(ids, proba):
+            writer.write_table(pa.table({'paciente_id': ids, 'pred_proba': proba}, schema=OUTPUT_SCHEMA))
+
+        if workers <= 1:
+            _init_worker(artifacts_dir, model_name)
+            for df in chunks:
+                ids, proba, _ = _score_chunk(df)
+                write(ids, proba)
+                qtd_linhas += len(ids)
+        else:
+            # No máximo 2 chunks por worker em trânsito, escritos na ordem de leitura
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(artifacts_dir, model_name)) as pool:
+                pendentes = []
+                for df in chunks:
+                    pendentes.append(pool.apply_async(_score_chunk, (df,)))
+                    while len(pendentes) >= 2 * workers or (pendentes and pendentes[0].ready()):
+                        ids, proba, pico = pendentes.pop(0).get()
+                        write(ids, proba)
+                        qtd_linhas += len(ids)
+                        pico_workers = max(pico_workers, pico)
+                for pendente in pendentes:
+                    ids, proba, pico = pendente.get()
+                    write(ids, proba)
+                    qtd_linhas += len(ids)
+                    pico_workers = max(pico_workers, pico)
+
+    perf.report_throughput(f'Escoragem em lote ({workers} worker(s))', qtd_linhas, tempo['segundos'])
+    if workers > 1:
+        print(f'Pico de RSS por worker: {pico_workers:.1f} MB')
+
+    return qtd_linhas
+
+
+def verify(input_path, output_path, model_name='XGBoost', artifacts_dir=artifacts.ARTIFACTS_DIR, version=None):
+
+    # Compara com o caminho em memória de predict.py (predict_proba em tudo de uma vez)
+    entrada = scoring.load_model(model_name, artifacts_dir)
+    df = pd.concat(read_chunks(input_path, ['paciente_id'] + entrada['features'], chunksize=10**9, version=version))
+    esperado = scoring.predict_proba(entrada, df)
+    obtido = pq.read_table(output_path)
+
+    iguais = np.array_equal(obtido['paciente_id'].to_numpy(), df['paciente_id'].to_numpy()) and \
+        np.array_equal(obtido['pred_proba'].to_numpy(), esperado)
+    print(f'Resultado idêntico ao caminho em memória: {iguais}')
+
+    return iguais
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Escoragem em lote out-of-core')
+    parser.add_argument('--entrada', required=True, help='CSV processado ou diretório do store')
+    parser.add_argument('--versao', type=int, default=None, help='versão do store (padrão: a última)')
+    parser.add_argument('--saida', required=True, help='arquivo Parquet de saída (paciente_id, pred_proba)')
+    parser.add_argument('--modelo', default='XGBoost')
+    parser.add_argument('--artefatos', default=artifacts.ARTIFACTS_DIR)
+    parser.add_argument('--chunksize', type=int, default=200_000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--verificar', action='store_true', help='compara com o predict_proba em memória (entradas pequenas)')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    score_file(args.entrada, args.saida, args.modelo, args.artefatos, args.chunksize, args.workers, args.versao)
+
+    if args.verificar:
+        verify(args.entrada, args.saida, args.modelo, args.artefatos, args.versao)
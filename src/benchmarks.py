@@ -0,0 +1,620 @@
+# Benchmarks de desempenho do projeto.
+# Uso: python benchmarks.py <benchmark> [opções]   (ex.: python benchmarks.py store --linhas 70000 1000000)
+import argparse
+import multiprocessing
+import os
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from sklearn import metrics, model_selection
+
+import artifacts
+import checkpoint
+import compiled
+import contingency
+import fast_metrics
+import ingest
+import modeling
+import perf
+import plots
+import processing
+import scoring
+import search
+import store
+import tree_export
+
+BENCH_DIR = '../data/bench'
+TARGET = 'flag_doenca_cardiaca'
+
+
+def make_synthetic_processed(n, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    idade = rng.integers(30, 65, n)
+    altura = rng.integers(145, 200, n)
+    peso = np.round(rng.normal(74, 14, n), 1)
+    sistolica = rng.integers(90, 180, n)
+    logit = (idade - 50) / 10 + (sistolica - 130) / 20 + rng.normal(0, 1, n)
+
+    df = pd.DataFrame({
+        'paciente_id': np.arange(seed * n, (seed + 1) * n),
+        'nr_anos_idade': idade,
+        'vlr_altura': altura,
+        'vlr_peso': peso,
+        'vlr_imc': peso / (altura / 100) ** 2,
+        'vlr_pressao_sistolica': sistolica,
+        'vlr_pressao_diastolica': rng.integers(60, 110, n),
+        'flag_fumante': rng.integers(0, 2, n),
+        'flag_consumo_alcool': rng.integers(0, 2, n),
+        'flag_atividade_fisica': rng.integers(0, 2, n),
+        TARGET: (logit > 0).astype('int64')
+    })
+    for col, dtype in processing.CATEGORY_DTYPES.items():
+        df[col] = pd.Categorical.from_codes(rng.integers(0, len(dtype.categories) - (col == 'cat_pressao_arterial'), n), dtype=dtype)
+
+    return df[processing.PROCESSED_COLUMNS]
+
+
+def write_synthetic(n, diretorio, tamanho_chunk=1_000_000):
+
+    # Gera o dataset sintético em chunks para não materializar 10M+ linhas de uma vez
+    os.makedirs(diretorio, exist_ok=True)
+    csv_path = os.path.join(diretorio, 'processed_cardio_data.csv')
+    store_dir = os.path.join(diretorio, 'store')
+    shutil.rmtree(store_dir, ignore_errors=True)
+
+    with store.StoreWriter(store_dir, source='benchmark') as writer:
+        for i, inicio in enumerate(range(0, n, tamanho_chunk)):
+            df = make_synthetic_processed(min(tamanho_chunk, n - inicio), seed=i)
+            df.to_csv(csv_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            writer.write(df)
+
+    return csv_path, store_dir
+
+
+def make_synthetic_raw(df):
+
+    # Volta o dataset processado ao formato do raw_cardio_data.csv (entrada do ingest.py)
+    df = df.copy()
+    for col, mapa in processing.CATEGORY_MAPS.items():
+        df[col] = df[col].map({processado: bruto for bruto, processado in mapa.items()}).astype(object)
+    df = df.rename(columns={processado: bruto for bruto, processado in processing.RENAME_COLUMNS.items()})
+    df['age'] = df['age_years'] * 365
+    df['bp_category_encoded'] = 0
+
+    return df
+
+
+def _measure(func, args, fila):
+
+    rss_base = perf.peak_rss_mb()
+    with perf.timer() as tempo:
+        func(*args)
+    fila.put((tempo['segundos'], perf.peak_rss_mb() - rss_base))
+
+
+def measure_isolated(func, *args):
+
+    # Cada medição roda em um interpretador novo para que o pico de RSS não
+    # seja contaminado pelas medições anteriores
+    ctx = multiprocessing.get_context('spawn')
+    fila = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(func, args, fila))
+    proc.start()
+    segundos, rss_mb = fila.get()
+    proc.join()
+
+    return segundos, rss_mb
+
+
+def _touch(df):
+    # Percorre os valores para que páginas mapeadas em memória entrem na medição
+    for _, serie in df.items():
+        valores = serie.cat.codes if isinstance(serie.dtype, pd.CategoricalDtype) else serie
+        valores.to_numpy().sum()
+
+
+def _load_csv(csv_path, columns=None):
+    _touch(processing.read_processed_csv(csv_path, usecols=columns))
+
+
+def _load_store(store_dir, columns=None):
+    _touch(store.read_processed(columns=columns, store_dir=store_dir))
+
+
+def bench_store(args):
+
+    features = [col for col in processing.PROCESSED_COLUMNS if col not in ('paciente_id', TARGET)]
+    resultados = []
+
+    for n in args.linhas:
+        csv_path, store_dir = write_synthetic(n, os.path.join(BENCH_DIR, f'store_{n}'))
+
+        cenarios = {
+            'csv (todas as colunas)': (_load_csv, csv_path),
+            'csv (features do modelo)': (_load_csv, csv_path, features),
+            'store (todas as colunas)': (_load_store, store_dir),
+            'store (features do modelo)': (_load_store, store_dir, features),
+            'store (1 coluna)': (_load_store, store_dir, [TARGET])
+        }
+        for nome, (func, *func_args) in cenarios.items():
+            segundos, rss_mb = measure_isolated(func, *func_args)
+            resultados.append({'linhas': n, 'leitura': nome, 'segundos': segundos, 'rss_mb': rss_mb})
+            print(f'{n:>10} linhas | {nome:<28} | {segundos:7.3f}s | +{rss_mb:8.1f} MB')
+
+    return pd.DataFrame(resultados)
+
+
+def bench_cache(args):
+
+    # Compara, por família de modelo, a busca que o train.py roda
+    # (search.build_search com checkpoint, ou seja, o FoldCachedSearchCV) sem e
+    # com o cache em disco das matrizes de cada fold. As famílias com cache
+    # rodam em sequência sobre o mesmo diretório, como em train.py: a primeira
+    # grava as matrizes e as demais as reaproveitam.
+    df = make_synthetic_processed(args.linhas[0])
+    cat_features, num_features, features = modeling.split_features(df)
+    preprocessor = modeling.build_preprocessor(num_features, cat_features)
+    cache_dir = os.path.join(BENCH_DIR, 'cache_preprocessor')
+    checkpoint_dir = os.path.join(BENCH_DIR, 'cache_checkpoints')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    memory = modeling.preprocessor_memory(cache_dir)
+    config = dict(search.SEARCH_CONFIG, strategy='random', n_iter=args.n_iter)
+
+    resultados = []
+    for model_name, (model, param_grid) in modeling.build_models().items():
+        tempos = {}
+        for modo, mem in [('sem cache', None), ('com cache', memory)]:
+            # Checkpoint novo a cada busca: nada é retomado entre os modos
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+            os.makedirs(checkpoint_dir)
+            busca = search.build_search(
+                modeling.build_pipeline(preprocessor, model, memory=mem),
+                param_grid,
+                config=config,
+                checkpoint_path=checkpoint.candidates_path(checkpoint_dir, model_name),
+                n_jobs=-1,
+                verbose=0,
+                random_state=modeling.SEED
+            )
+            with perf.timer() as tempo:
+                busca.fit(df[features], df[modeling.TARGET])
+            tempos[modo] = tempo['segundos']
+
+        economia = tempos['sem cache'] - tempos['com cache']
+        resultados.append({'modelo': model_name, **tempos, 'economia_s': economia})
+        print(f'{model_name:<20} | sem cache {tempos["sem cache"]:8.1f}s | com cache {tempos["com cache"]:8.1f}s | '
+              f'economia {economia:7.1f}s ({100 * economia / tempos["sem cache"]:.0f}%)')
+
+    memory.clear(warn=False)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    return pd.DataFrame(resultados)
+
+
+def _latencies_us(func, records):
+
+    tempos = np.empty(len(records))
+    for i, record in enumerate(records):
+        inicio = time.perf_counter()
+        func(record)
+        tempos[i] = time.perf_counter() - inicio
+
+    return tempos * 1e6
+
+
+def bench_compiled(args):
+
+    # Latência de um paciente por vez: pipeline do sklearn (DataFrame de 1
+    # linha + ColumnTransformer + predict_proba) vs. caminho compilado
+    entrada = artifacts.load_artifacts()[args.modelo]
+    pipeline = entrada['model']
+    features = entrada['features']
+    scorer = compiled.CompiledScorer(pipeline)
+
+    df = store.read_processed(columns=features)
+    records = df.sample(min(args.registros, len(df)), random_state=modeling.SEED).to_dict('records')
+
+    esperado = pipeline.predict_proba(pd.DataFrame(records)[features])[:, 1]
+    obtido = np.array([scorer.predict_proba(record) for record in records])
+    print(f'Diferença máxima entre os caminhos: {np.abs(esperado - obtido).max():.2e}')
+
+    cenarios = {
+        'pipeline.predict_proba': lambda record: pipeline.predict_proba(pd.DataFrame([record])[features])[:, 1],
+        'compilado': scorer.predict_proba
+    }
+    resultados = []
+    for nome, func in cenarios.items():
+        func(records[0])
+        tempos = _latencies_us(func, records)
+        p50, p99 = np.percentile(tempos, [50, 99])
+        resultados.append({'caminho': nome, 'p50_us': p50, 'p99_us': p99})
+        print(f'{args.modelo} | {nome:<24} | p50 {p50:9.1f} us | p99 {p99:9.1f} us')
+
+    return pd.DataFrame(resultados)
+
+
+def _sklearn_metrics(y_true, y_score, cutoffs):
+
+    # Uma chamada por métrica e por corte, como o report_metrics original
+    auc = metrics.roc_auc_score(y_true, y_score)
+    resultado = {'accuracy': [], 'precision': [], 'recall': [], 'f1_score': []}
+    for cutoff in cutoffs:
+        y_pred = (y_score > cutoff).astype(int)
+        resultado['accuracy'].append(metrics.accuracy_score(y_true, y_pred))
+        resultado['precision'].append(metrics.precision_score(y_true, y_pred, zero_division=0))
+        resultado['recall'].append(metrics.recall_score(y_true, y_pred))
+        resultado['f1_score'].append(metrics.f1_score(y_true, y_pred))
+
+    return {'auc': auc, **{k: np.array(v) for k, v in resultado.items()}}
+
+
+def bench_metrics(args):
+
+    # AUC + accuracy/precision/recall/F1 em 1 e em --cortes pontos de corte:
+    # sklearn (uma varredura por métrica e corte) vs. fast_metrics (uma ordenação)
+    rng = np.random.default_rng(modeling.SEED)
+    resultados = []
+
+    for n in args.linhas:
+        y_true = rng.integers(0, 2, n)
+        # float32 como o predict_proba dos boosters, com empates entre scores
+        y_score = np.clip(0.3 * y_true + rng.normal(0.35, 0.2, n), 0, 1).astype(np.float32).astype(np.float64)
+
+        for qtd_cortes in [1, args.cortes]:
+            cutoffs = [0.5] if qtd_cortes == 1 else np.linspace(0.01, 0.99, qtd_cortes)
+            with perf.timer() as tempo_sklearn:
+                esperado = _sklearn_metrics(y_true, y_score, cutoffs)
+            with perf.timer() as tempo_rapido:
+                obtido = fast_metrics.confusion_metrics(y_true, y_score, cutoffs)
+
+            diferenca = max(np.abs(np.asarray(esperado[k]) - np.asarray(obtido[k])).max() for k in esperado)
+            resultados.append({'linhas': n, 'cortes': qtd_cortes, 'sklearn_s': tempo_sklearn['segundos'],
+                               'fast_metrics_s': tempo_rapido['segundos'], 'diferenca_max': diferenca})
+            print(f'{n:>10} linhas | {qtd_cortes:>3} corte(s) | sklearn {tempo_sklearn["segundos"]:8.3f}s | '
+                  f'fast_metrics {tempo_rapido["segundos"]:7.3f}s | '
+                  f'{tempo_sklearn["segundos"] / tempo_rapido["segundos"]:6.1f}x | diferença máx. {diferenca:.1e}')
+
+    return pd.DataFrame(resultados)
+
+
+def _loop_chi2(df, cat_features, target):
+    # Caminho original do eda.py: um groupby + chi2_contingency por feature
+    from scipy.stats import chi2_contingency
+    return {cat: chi2_contingency(df.groupby(cat, observed=True)[target].value_counts().unstack(fill_value=0))[1]
+            for cat in cat_features}
+
+
+def bench_contingency(args):
+
+    # Tabelas de contingência + qui-quadrado de --features variáveis categóricas
+    rng = np.random.default_rng(modeling.SEED)
+    resultados = []
+
+    for n in args.linhas:
+        df = pd.DataFrame({
+            f'cat_{i}': pd.Categorical.from_codes(rng.integers(0, 2 + i % 6, n), categories=[f'v{j}' for j in range(2 + i % 6)])
+            for i in range(args.features)
+        })
+        df[TARGET] = rng.integers(0, 2, n)
+        cat_features = list(df.columns[:-1])
+
+        with perf.timer() as tempo_loop:
+            esperado = _loop_chi2(df, cat_features, TARGET)
+        with perf.timer() as tempo_rapido:
+            testes = contingency.chi2_tests(contingency.contingency_tables(df, cat_features, TARGET))
+
+        diferenca = max(abs(esperado[cat] - testes.loc[cat, 'pvalue']) for cat in cat_features)
+        resultados.append({'linhas': n, 'features': args.features, 'loop_s': tempo_loop['segundos'],
+                           'contingency_s': tempo_rapido['segundos'], 'diferenca_max': diferenca})
+        print(f'{n:>10} linhas x {args.features} features | loop {tempo_loop["segundos"]:8.2f}s | '
+              f'contingency {tempo_rapido["segundos"]:7.2f}s | diferença máx. p-valor {diferenca:.1e}')
+
+    return pd.DataFrame(resultados)
+
+
+def _seaborn_distribution(df, var, target):
+
+    # Caminho original do eda.py: histplot(kde=True) + boxplot sobre as linhas
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+    sns.histplot(data=df, x=var, hue=target, kde=True, bins=30, palette=plots.CLASS_COLORS,
+                 hue_order=[0, 1], ax=axes[0], legend=False)
+    sns.boxplot(data=df, y=df[target].astype('category'), x=var,
+                palette={'0': '#377eb8', '1': '#e41a1c'}, ax=axes[1])
+
+    return fig
+
+
+def _savefig(fig):
+
+    import io
+    import matplotlib.pyplot as plt
+
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close(fig)
+
+
+def bench_plots(args):
+
+    # Tempo da figura de distribuição (histograma + KDE + boxplot) de uma
+    # variável numérica: seaborn sobre as linhas vs. resumo agregado + desenho.
+    # O desenho a partir do resumo deve ficar constante com o número de linhas.
+    import matplotlib
+    matplotlib.use('Agg')
+
+    var = 'vlr_pressao_sistolica'
+    resultados = []
+
+    for n in args.linhas:
+        df = make_synthetic_processed(n)[[var, TARGET]]
+
+        with perf.timer() as tempo_seaborn:
+            _savefig(_seaborn_distribution(df, var, TARGET))
+        with perf.timer() as tempo_resumo:
+            resumo = plots.numeric_summary(df, var, TARGET)
+        with perf.timer() as tempo_desenho:
+            _savefig(plots.numeric_distribution(resumo, var, TARGET))
+
+        resultados.append({'linhas': n, 'seaborn_s': tempo_seaborn['segundos'], 'resumo_s': tempo_resumo['segundos'],
+                           'desenho_s': tempo_desenho['segundos']})
+        print(f'{n:>10} linhas | seaborn {tempo_seaborn["segundos"]:8.2f}s | resumo {tempo_resumo["segundos"]:6.2f}s | '
+              f'desenho {tempo_desenho["segundos"]:5.2f}s')
+
+    return pd.DataFrame(resultados)
+
+
+def bench_native(args):
+
+    # XGBoost e LightGBM em um fold (80/20) com --n-iter candidatos do espaço
+    # de busca: fit do sklearn (reconstrói o dataset a cada candidato) vs.
+    # datasets nativos construídos uma vez e treino pela API nativa
+    models = modeling.build_models()
+    resultados = []
+
+    for n in args.linhas:
+        df = make_synthetic_processed(n)
+        cat_features, num_features, features = modeling.split_features(df)
+        corte = int(0.8 * n)
+        preprocessor = modeling.build_preprocessor(num_features, cat_features)
+        X_train = np.asarray(preprocessor.fit_transform(df[features].iloc[:corte]), dtype=np.float64)
+        X_val = np.asarray(preprocessor.transform(df[features].iloc[corte:]), dtype=np.float64)
+        fold = (X_train, df[TARGET].to_numpy()[:corte], X_val, df[TARGET].to_numpy()[corte:])
+
+        for model_name in ['XGBoost', 'LightGBM']:
+            model, param_grid = models[model_name]
+            candidatos = list(model_selection.ParameterSampler(param_grid, args.n_iter, random_state=modeling.SEED))
+            rounds = search.SEARCH_CONFIG['early_stopping_rounds']
+
+            with perf.timer() as tempo_sklearn:
+                esperado = [search._fit_candidate(model, params, *fold, rounds) for params in candidatos]
+            with perf.timer() as tempo_nativo:
+                cache = {}
+                obtido = [search._fit_native_candidate(model, params, cache, fold, rounds) for params in candidatos]
+            del cache
+
+            construcao = sum(r['dataset_time'] for r in obtido)
+            diferenca = max(np.abs(e['proba'] - o['proba']).max() for e, o in zip(esperado, obtido))
+            resultados.append({'linhas': n, 'modelo': model_name, 'candidatos': len(candidatos),
+                               'sklearn_s': tempo_sklearn['segundos'], 'nativo_s': tempo_nativo['segundos'],
+                               'construcao_s': construcao, 'boosting_s': sum(r['fit_time'] for r in obtido),
+                               'diferenca_max': diferenca})
+            print(f'{n:>10} linhas | {model_name:<8} x {len(candidatos)} candidatos | sklearn {tempo_sklearn["segundos"]:8.1f}s | '
+                  f'nativo {tempo_nativo["segundos"]:8.1f}s (construção {construcao:6.2f}s, '
+                  f'boosting {resultados[-1]["boosting_s"]:8.1f}s) | diferença máx. {diferenca:.1e}')
+
+    return pd.DataFrame(resultados)
+
+
+def bench_ingest(args):
+
+    # Ingestão diária de um lote de --registros linhas (10% delas atualizando
+    # pacientes já gravados) sobre stores de --linhas linhas: partição nova
+    # (ingest.py) vs. reprocessar e regravar o dataset inteiro
+    resultados = []
+
+    for n in args.linhas:
+        _, store_dir = write_synthetic(n, os.path.join(BENCH_DIR, f'ingest_{n}'))
+        novos = make_synthetic_processed(args.registros, seed=n // args.registros + 1)
+        atualizados = store.read_processed(store_dir=store_dir).sample(args.registros // 10, random_state=0)
+        atualizados['vlr_peso'] += 1
+        lote = pd.concat([novos.iloc[:args.registros - len(atualizados)], atualizados])
+        raw_path = os.path.join(BENCH_DIR, f'ingest_{n}', 'lote.csv')
+        make_synthetic_raw(lote).to_csv(raw_path, index=False)
+
+        # Primeira ingestão constrói o índice da partição base (custo único)
+        with perf.timer() as tempo_indice:
+            store.load_index(os.path.join(store.version_dir(None, store_dir), store.DATA_FILE))
+        with perf.timer() as tempo_ingestao:
+            ingest.ingest(raw_path, store_dir)
+        with perf.timer() as tempo_completo:
+            df = store.read_processed(store_dir=store_dir, version=1)
+            delta, _ = processing.process_raw(processing.read_raw_csv(raw_path))
+            df = pd.concat([df, delta.astype(store.PROCESSED_DTYPES)]).drop_duplicates('paciente_id', keep='last')
+            store.write_processed(df, store_dir, source='benchmark')
+
+        esperado = df.sort_values('paciente_id').reset_index(drop=True)
+        obtido = store.read_processed(store_dir=store_dir, version=2).sort_values('paciente_id').reset_index(drop=True)
+        resultados.append({'linhas': n, 'lote': len(lote), 'indice_s': tempo_indice['segundos'],
+                           'ingestao_s': tempo_ingestao['segundos'], 'completo_s': tempo_completo['segundos'],
+                           'iguais': esperado.equals(obtido)})
+        print(f'{n:>10} linhas | lote de {len(lote)} | índice (uma vez) {tempo_indice["segundos"]:6.2f}s | '
+              f'ingestão {tempo_ingestao["segundos"]:6.2f}s | reprocessamento completo {tempo_completo["segundos"]:7.2f}s | '
+              f'mesmo resultado: {resultados[-1]["iguais"]}')
+
+    return pd.DataFrame(resultados)
+
+
+def _median_seconds(func, repeticoes):
+
+    tempos = []
+    for _ in range(repeticoes):
+        with perf.timer() as tempo:
+            resultado = func()
+        tempos.append(tempo['segundos'])
+
+    return statistics.median(tempos), resultado
+
+
+def bench_trees(args):
+
+    # Modelos de árvores salvos + uma floresta sintética de --arvores árvores:
+    # tamanho do arquivo, tempo de leitura e linhas/s do classificador da
+    # biblioteca vs. a exportação em arrays (tree_export.py), e a diferença
+    # máxima entre as probabilidades
+    registry = artifacts.load_artifacts()
+    df = make_synthetic_processed(args.registros, seed=1)
+    cenarios = []
+    for model_name, entrada in registry.items():
+        diretorio = os.path.join(registry.artifacts_dir, entrada['artifact']['dir'])
+        formato = entrada['artifact']['format']
+        pipeline = entrada['model']
+        if type(pipeline.named_steps['classifier']).__name__ == 'LogisticRegression':
+            continue
+        X = np.asarray(pipeline.named_steps['preprocessor'].transform(df[entrada['features']]), dtype=np.float64)
+        cenarios.append((model_name, os.path.join(diretorio, artifacts.CLASSIFIER_FILES[formato]), formato, X))
+
+    if args.arvores:
+        from sklearn.ensemble import RandomForestClassifier
+        treino = make_synthetic_processed(20_000)
+        cat_features, num_features, features = modeling.split_features(treino)
+        preprocessor = modeling.build_preprocessor(num_features, cat_features)
+        floresta = RandomForestClassifier(args.arvores, min_samples_leaf=5, random_state=modeling.SEED, n_jobs=-1)
+        floresta.fit(preprocessor.fit_transform(treino[features]), treino[TARGET])
+        path = os.path.join(BENCH_DIR, 'trees', f'random_forest_{args.arvores}.joblib')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        artifacts.save_classifier(floresta, path, 'joblib')
+        X = np.asarray(preprocessor.transform(df[features]), dtype=np.float64)
+        cenarios.append((f'Random Forest ({args.arvores} árvores)', path, 'joblib', X))
+
+    resultados = []
+    for nome, path, formato, X in cenarios:
+        npz_path = os.path.splitext(path)[0] + '.npz'
+        classifier = artifacts.load_classifier(path, formato)
+        tree_export.export_classifier(classifier).save(npz_path)
+
+        leitura_s, classifier = _median_seconds(lambda: artifacts.load_classifier(path, formato), args.repeticoes)
+        leitura_npz_s, ensemble = _median_seconds(lambda: tree_export.load(npz_path), args.repeticoes)
+        predicao_s, esperado = _median_seconds(lambda: classifier.predict_proba(X)[:, 1], args.repeticoes)
+        predicao_npz_s, obtido = _median_seconds(lambda: ensemble.predict_proba(X)[:, 1], args.repeticoes)
+        latencia_s, _ = _median_seconds(lambda: classifier.predict_proba(X[:1]), 50)
+        latencia_npz_s, _ = _median_seconds(lambda: ensemble.predict_proba(X[:1]), 50)
+
+        resultados.append({'modelo': nome, 'arvores': ensemble.n_trees,
+                           'arquivo_mb': os.path.getsize(path) / 1e6, 'npz_mb': os.path.getsize(npz_path) / 1e6,
+                           'leitura_s': leitura_s, 'leitura_npz_s': leitura_npz_s,
+                           'linhas_s': len(X) / predicao_s, 'linhas_s_npz': len(X) / predicao_npz_s,
+                           'latencia_ms': latencia_s * 1000, 'latencia_npz_ms': latencia_npz_s * 1000,
+                           'diferenca_max': np.abs(esperado - obtido).max()})
+        r = resultados[-1]
+        print(f'{nome:<28} | {r["arvores"]:>5} árvores | arquivo {r["arquivo_mb"]:7.2f} MB -> {r["npz_mb"]:7.2f} MB | '
+              f'leitura {leitura_s * 1000:8.1f} ms -> {leitura_npz_s * 1000:6.1f} ms | '
+              f'{r["linhas_s"]:>9,.0f} -> {r["linhas_s_npz"]:>9,.0f} linhas/s | '
+              f'1 linha {r["latencia_ms"]:7.2f} -> {r["latencia_npz_ms"]:6.2f} ms | diferença máx. {r["diferenca_max"]:.1e}')
+
+    return pd.DataFrame(resultados)
+
+
+# Processo novo que importa os módulos do cenário, carrega o modelo e escora
+# um paciente; devolve os tempos e quais módulos pesados foram carregados
+STARTUP_SCRIPT = '''
+import json, sys, time
+inicio = time.perf_counter()
+{imports}
+importado = time.perf_counter()
+import pandas as pd
+import scoring
+entrada = scoring.load_model({modelo!r})
+scoring.predict_proba(entrada, pd.DataFrame([json.loads(sys.argv[1])]))
+fim = time.perf_counter()
+print(json.dumps({{
+    'import_s': importado - inicio,
+    'primeira_predicao_s': fim - importado,
+    'pesados': [m for m in scoring.HEAVY_MODULES if m in sys.modules]
+}}))
+'''
+
+STARTUP_SCENARIOS = {
+    'scoring.py': 'import scoring',
+    'imports do predict.py': 'import config, explain, figures, plots, scoring, store, thresholds; config.set_plot_style()'
+}
+
+
+def bench_startup(args):
+
+    # Partida a frio de um processo de escoragem: tempo de import e tempo até
+    # a primeira predição, em interpretadores novos (mediana de --repeticoes).
+    # Falha (código de saída 1) se o scoring.py passar de --limite-s ou se
+    # carregar algum dos módulos de scoring.HEAVY_MODULES.
+    entrada = scoring.load_model(args.modelo)
+    registro = store.read_processed(columns=entrada['features']).iloc[0]
+    registro = json.dumps({col: valor.item() if hasattr(valor, 'item') else valor for col, valor in registro.items()})
+
+    resultados = []
+    for nome, imports in STARTUP_SCENARIOS.items():
+        script = STARTUP_SCRIPT.format(imports=imports, modelo=args.modelo)
+        medicoes = []
+        for _ in range(args.repeticoes):
+            saida = subprocess.run([sys.executable, '-c', script, registro], capture_output=True, text=True, check=True)
+            medicoes.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+
+        resultado = {
+            'cenario': nome,
+            'import_s': statistics.median(m['import_s'] for m in medicoes),
+            'primeira_predicao_s': statistics.median(m['primeira_predicao_s'] for m in medicoes),
+            'pesados': ','.join(medicoes[0]['pesados'])
+        }
+        resultado['total_s'] = resultado['import_s'] + resultado['primeira_predicao_s']
+        resultados.append(resultado)
+        print(f'{nome:<22} | import {resultado["import_s"]:6.2f}s | primeira predição {resultado["primeira_predicao_s"]:6.2f}s | '
+              f'total {resultado["total_s"]:6.2f}s | módulos pesados: {resultado["pesados"] or "nenhum"}')
+
+    resultados = pd.DataFrame(resultados)
+    enxuto = resultados.iloc[0]
+    if enxuto['pesados'] or enxuto['total_s'] > args.limite_s:
+        print(f'Regressão na partida do scoring.py (limite {args.limite_s:.2f}s, sem módulos pesados)')
+        raise SystemExit(1)
+
+    return resultados
+
+
+BENCHMARKS = {
+    'store': bench_store,
+    'cache': bench_cache,
+    'compiled': bench_compiled,
+    'metrics': bench_metrics,
+    'contingency': bench_contingency,
+    'plots': bench_plots,
+    'startup': bench_startup,
+    'native': bench_native,
+    'ingest': bench_ingest,
+    'trees': bench_trees
+}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmarks de desempenho')
+    parser.add_argument('benchmark', choices=list(BENCHMARKS))
+    parser.add_argument('--linhas', type=int, nargs='+', default=[70_000, 1_000_000, 10_000_000])
+    parser.add_argument('--n-iter', type=int, default=10)
+    parser.add_argument('--modelo', default='XGBoost')
+    parser.add_argument('--registros', type=int, default=2000)
+    parser.add_argument('--cortes', type=int, default=99)
+    parser.add_argument('--features', type=int, default=100)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--arvores', type=int, default=2000, help='árvores da floresta sintética (benchmark trees; 0 desativa)')
+    parser.add_argument('--limite-s', type=float, default=4.0, help='limite de partida do scoring.py (benchmark startup)')
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](args)
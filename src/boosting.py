@@ -0,0 +1,112 @@
+import time
+
+import lightgbm
+import numpy as np
+import xgboost
+from lightgbm import LGBMClassifier
+from xgboost import XGBClassifier
+
+# Treino dos boosters da busca sobre datasets nativos por fold. O fit do
+# sklearn reconstrói a cada candidato o QuantileDMatrix (XGBoost) ou o
+# lightgbm.Dataset (LightGBM) do fold, com o sketch de quantis e a
+# discretização das features; aqui eles são construídos uma vez por tarefa da
+# busca (um bloco de candidatos de um fold) e compartilhados pelos candidatos
+# do bloco cujos parâmetros não mudam os bins. O cache é um dict da tarefa,
+# descartado quando ela termina: nada fica retido nos workers persistentes do
+# loky. O resultado é o mesmo do fit com eval_set do sklearn.
+
+# Parâmetros que mudam a discretização de cada biblioteca: candidatos com os
+# mesmos valores compartilham os datasets do fold
+XGB_BINNING_PARAMS = ('max_bin',)
+LGBM_BINNING_PARAMS = ('max_bin', 'min_data_in_bin', 'subsample_for_bin', 'random_state')
+
+# Parâmetros do LGBMClassifier que não são do treino nativo
+LGBM_WRAPPER_PARAMS = ('n_estimators', 'class_weight', 'importance_type', 'boosting_type', 'objective')
+
+def supports(estimator):
+    return isinstance(estimator, (XGBClassifier, LGBMClassifier))
+
+
+def _binning_params(estimator):
+
+    params = estimator.get_params()
+    nomes = XGB_BINNING_PARAMS if isinstance(estimator, XGBClassifier) else LGBM_BINNING_PARAMS
+
+    return {nome: params[nome] for nome in nomes if params.get(nome) is not None}
+
+
+def fold_datasets(cache, estimator, fold):
+
+    # Datasets (treino, validação) do fold no formato nativo da família do
+    # estimador, guardados em cache (dict da tarefa) pelos parâmetros de
+    # binning; devolve também o tempo de construção (0 quando reaproveitados)
+    binning = _binning_params(estimator)
+    chave = (type(estimator).__name__, tuple(sorted(binning.items())))
+    if chave in cache:
+        return cache[chave], 0.0
+
+    X_train, y_train, X_val, y_val = fold
+    n_jobs = estimator.get_params().get('n_jobs')
+
+    inicio = time.perf_counter()
+    if isinstance(estimator, XGBClassifier):
+        dtrain = xgboost.QuantileDMatrix(X_train, y_train, nthread=n_jobs, **binning)
+        dval = xgboost.QuantileDMatrix(X_val, y_val, ref=dtrain, nthread=n_jobs)
+    else:
+        # Sem o pré-filtro de features, min_child_samples pode variar entre candidatos
+        params = {**binning, 'feature_pre_filter': False}
+        if n_jobs is not None:
+            params['n_jobs'] = n_jobs
+        if 'verbose' in estimator.get_params():
+            params['verbose'] = estimator.get_params()['verbose']
+        dtrain = lightgbm.Dataset(X_train, y_train, params=params, free_raw_data=False).construct()
+        dval = lightgbm.Dataset(X_val, y_val, reference=dtrain, params=params, free_raw_data=False).construct()
+    cache[chave] = (dtrain, dval)
+
+    return cache[chave], time.perf_counter() - inicio
+
+
+def lgbm_params(estimator):
+
+    # Parâmetros do lightgbm.train equivalentes aos do LGBMClassifier (usados também pelo retrain.py)
+    params = {key: value for key, value in estimator.get_params().items()
+              if key not in LGBM_WRAPPER_PARAMS and value is not None}
+    params['objective'] = estimator.objective or 'binary'
+    params['boosting'] = estimator.boosting_type
+    params['feature_pre_filter'] = False
+
+    return params
+
+
+def fit_predict(estimator, datasets, X_val, early_stopping_rounds=None):
+
+    # Treina o candidato com a API nativa sobre os datasets do fold e devolve
+    # as probabilidades de validação, a melhor iteração (NaN sem early
+    # stopping, como no caminho do sklearn) e o booster
+    dtrain, dval = datasets
+    n_estimators = estimator.n_estimators
+
+    if isinstance(estimator, XGBClassifier):
+        params = {key: value for key, value in estimator.get_xgb_params().items() if value is not None}
+        booster = xgboost.train(
+            params, dtrain,
+            num_boost_round=n_estimators,
+            evals=[(dval, 'validation_0')] if early_stopping_rounds else (),
+            early_stopping_rounds=early_stopping_rounds,
+            verbose_eval=False
+        )
+        iteracoes = booster.best_iteration + 1 if early_stopping_rounds else n_estimators
+        proba = booster.inplace_predict(X_val, iteration_range=(0, iteracoes))
+    else:
+        booster = lightgbm.train(
+            lgbm_params(estimator), dtrain,
+            num_boost_round=n_estimators,
+            valid_sets=[dval] if early_stopping_rounds else None,
+            callbacks=[lightgbm.early_stopping(early_stopping_rounds, verbose=False)] if early_stopping_rounds else None
+        )
+        iteracoes = (booster.best_iteration or n_estimators) if early_stopping_rounds else n_estimators
+        proba = booster.predict(X_val, num_iteration=iteracoes)
+
+    best_iteration = iteracoes if early_stopping_rounds else np.nan
+
+    return np.asarray(proba), best_iteration, booster
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+CHECKPOINT_DIR = '../data/predicted/checkpoints'
+
+
+def run_dir(identidade, checkpoint_dir=CHECKPOINT_DIR):
+
+    # Checkpoints só são reaproveitados por execuções com os mesmos dados,
+    # configuração de busca, seed, features, estimadores e espaços de busca
+    chave = json.dumps(identidade, sort_keys=True, default=str)
+    diretorio = os.path.join(checkpoint_dir, hashlib.sha256(chave.encode()).hexdigest()[:16])
+    os.makedirs(diretorio, exist_ok=True)
+
+    with open(os.path.join(diretorio, 'run.json'), 'w') as f:
+        f.write(chave)
+
+    return diretorio
+
+
+def describe_models(models):
+
+    # Estimadores e espaços de busca em forma estável para a identidade da
+    # execução: distribuições do scipy viram nome + argumentos (o repr delas
+    # traz o endereço de memória)
+    def espaco(valor):
+        if hasattr(valor, 'dist'):
+            return {'dist': valor.dist.name, 'args': list(valor.args), 'kwds': valor.kwds}
+        return valor
+
+    return {
+        nome: {
+            'estimador': type(model).__name__,
+            'params': model.get_params(deep=False),
+            'espaco': {param: espaco(valor) for param, valor in param_grid.items()}
+        }
+        for nome, (model, param_grid) in models.items()
+    }
+
+
+def _slug(model_name):
+    return model_name.lower().replace(' ', '_')
+
+
+def family_path(diretorio, model_name):
+    return os.path.join(diretorio, f'{_slug(model_name)}.pkl')
+
+
+def candidates_path(diretorio, model_name):
+    return os.path.join(diretorio, f'{_slug(model_name)}.candidates.jsonl')
+
+
+def save_family(diretorio, model_name, result):
+
+    # Escrita atômica: um checkpoint interrompido no meio nunca é lido como válido
+    path = family_path(diretorio, model_name)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(result, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_family(diretorio, model_name):
+
+    path = family_path(diretorio, model_name)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def params_key(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class CandidateLog:
+
+    # Registro append-only das avaliações (candidato, fold) já concluídas de
+    # uma busca. Uma linha truncada por queda do processo é removida no load,
+    # que roda antes de qualquer append da execução (os workers só anexam).
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+
+        concluidos = {}
+        if self.path is None or not os.path.exists(self.path):
+            return concluidos
+
+        with open(self.path, 'rb+') as f:
+            conteudo = f.read()
+            fim = conteudo.rfind(b'\n') + 1
+            if fim < len(conteudo):
+                f.truncate(fim)
+
+        for linha in conteudo[:fim].splitlines():
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                continue
+            concluidos[(registro['params_key'], registro['fold'])] = registro
+
+        return concluidos
+
+    def append(self, registro):
+
+        if self.path is None:
+            return
+
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(registro, default=_to_json) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _to_json(value):
+
+    # Escalares do numpy mantêm o tipo (inteiros continuam inteiros)
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError(f'Tipo não serializável no checkpoint: {type(value)}')
@@ -0,0 +1,88 @@
+import copy
+
+import numpy as np
+
+import artifacts
+
+
+class CompiledScorer:
+
+    # Versão "compilada" de um pipeline ajustado (ColumnTransformer + classificador)
+    # para escorar um paciente por vez. O StandardScaler vira dois vetores
+    # (média e escala) e o OneHotEncoder(drop='first') vira uma tabela
+    # categoria -> posição na saída. A linha resultante vai direto para o
+    # predict nativo do booster, sem DataFrame e sem validações do sklearn.
+    def __init__(self, pipeline):
+
+        preprocessor = pipeline.named_steps['preprocessor']
+        classifier = pipeline.named_steps['classifier']
+        transformers = {name: (transformer, columns) for name, transformer, columns in preprocessor.transformers_}
+
+        scaler, self.num_features = transformers['num']
+        encoder, self.cat_features = transformers['cat']
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+        # Categoria descartada (drop='first') e categorias desconhecidas
+        # (handle_unknown='ignore') não têm posição: a linha fica toda em zero
+        self.positions = []
+        posicao = len(self.num_features)
+        for categorias, drop_idx in zip(encoder.categories_, encoder.drop_idx_):
+            tabela = {}
+            for idx, categoria in enumerate(categorias):
+                if idx == drop_idx:
+                    continue
+                tabela[categoria.item() if isinstance(categoria, np.generic) else categoria] = posicao
+                posicao += 1
+            self.positions.append(tabela)
+        self.n_outputs = posicao
+
+        self._predict = self._native_predict(classifier)
+
+    @staticmethod
+    def _native_predict(classifier):
+
+        nome = type(classifier).__name__
+        if nome == 'XGBClassifier':
+            booster = classifier.get_booster()
+            return lambda X: booster.inplace_predict(X, validate_features=False)
+        if nome == 'LGBMBoosterClassifier':
+            return classifier.booster.predict
+        if nome == 'LGBMClassifier':
+            return classifier.booster_.predict
+
+        # Estimadores do sklearn: cópia rasa sem feature_names_in_, já que a
+        # entrada compilada é um array e não um DataFrame
+        classifier = copy.copy(classifier)
+        if hasattr(classifier, 'feature_names_in_'):
+            del classifier.feature_names_in_
+
+        return lambda X: classifier.predict_proba(X)[:, 1]
+
+    def transform(self, records):
+
+        X = np.zeros((len(records), self.n_outputs), dtype=np.float64)
+        n_num = len(self.num_features)
+
+        for i, record in enumerate(records):
+            X[i, :n_num] = [record[col] for col in self.num_features]
+            for col, tabela in zip(self.cat_features, self.positions):
+                posicao = tabela.get(record[col])
+                if posicao is not None:
+                    X[i, posicao] = 1.0
+
+        X[:, :n_num] -= self.mean
+        X[:, :n_num] /= self.scale
+
+        return X
+
+    def predict_proba(self, record):
+        # Um paciente (dict coluna -> valor) -> probabilidade de doença cardíaca
+        return float(self._predict(self.transform([record]))[0])
+
+    def predict_proba_many(self, records):
+        return np.asarray(self._predict(self.transform(records)), dtype=np.float64)
+
+
+def compile_model(model_name='XGBoost', artifacts_dir=artifacts.ARTIFACTS_DIR):
+    return CompiledScorer(artifacts.load_artifacts(artifacts_dir)[model_name]['model'])
@@ -1,8 +1,10 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
 def set_plot_style():
 
+    # matplotlib só é importado quando o estilo é aplicado (nas figuras), não ao importar config
+    import matplotlib.pyplot as plt
+
     plt.rcParams.update({
         'axes.grid': False,  # Sem linhas de grade
         'axes.linewidth': 1.5,  # Largura da linha dos eixos
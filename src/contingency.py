@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2
+
+# Linhas por bloco da contagem (limita os temporários de cada coluna)
+BLOCK_ROWS = 2_000_000
+
+
+def _codes(serie):
+
+    # Códigos inteiros (-1 para nulos) e rótulos de cada valor
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    codes, categorias = pd.factorize(serie, sort=True)
+    return codes, categorias
+
+
+def contingency_tables(df, cat_features, target):
+
+    # Todas as tabelas feature x alvo em uma única passada pelos dados: por
+    # bloco de linhas, cada feature vira o índice (código + 1) * classes + alvo
+    # e é contada com um bincount direto no seu trecho de um vetor único de
+    # contagens (o código -1 dos nulos cai no slot 0, descartado). Retorna a
+    # tabela longa (variavel, valor, uma coluna por classe do alvo), sem as
+    # categorias sem nenhuma observação.
+    codes_alvo, classes = _codes(df[target])
+    n_classes = len(classes)
+    validos = codes_alvo >= 0
+    codes_alvo = codes_alvo[validos].astype(np.int64)
+
+    codigos, rotulos = [], []
+    for var in cat_features:
+        codes, categorias = _codes(df[var])
+        codigos.append(codes if validos.all() else codes[validos])
+        rotulos.append(categorias)
+
+    tamanhos = np.array([(len(r) + 1) * n_classes for r in rotulos], dtype=np.int64)
+    fins = np.cumsum(tamanhos)
+    contagem = np.zeros(int(fins[-1]) if len(fins) else 0, dtype=np.int64)
+
+    for inicio in range(0, len(codes_alvo), BLOCK_ROWS):
+        alvo = codes_alvo[inicio:inicio + BLOCK_ROWS]
+        for codes, fim, tamanho in zip(codigos, fins, tamanhos):
+            indices = (codes[inicio:inicio + BLOCK_ROWS].astype(np.int64) + 1) * n_classes + alvo
+            contagem[fim - tamanho:fim] += np.bincount(indices, minlength=tamanho)
+
+    # Remove o slot dos nulos de cada feature
+    partes = np.split(contagem.reshape(-1, n_classes), np.cumsum(tamanhos // n_classes)[:-1])
+    tabela = pd.DataFrame(np.vstack([parte[1:] for parte in partes]), columns=list(classes))
+    tabela.insert(0, 'variavel', np.repeat(cat_features, [len(r) for r in rotulos]))
+    tabela.insert(1, 'valor', pd.Index(np.concatenate([np.asarray(r, dtype=object) for r in rotulos])))
+
+    return tabela[tabela[list(classes)].sum(axis=1) > 0].reset_index(drop=True)
+
+
+def frequency_table(tabela, nomes={0: 'sem_doenca', 1: 'com_doenca'}):
+
+    # Contagens e percentuais por categoria (linhas somam 100%)
+    classes = [col for col in tabela.columns if col not in ('variavel', 'valor')]
+    total = tabela[classes].sum(axis=1)
+
+    freq = tabela[['variavel', 'valor']].copy()
+    for classe in classes:
+        freq[f'contage_{nomes.get(classe, classe)}'] = tabela[classe]
+        freq[f'%_{nomes.get(classe, classe)}'] = 100 * tabela[classe] / total
+
+    return freq
+
+
+def chi2_tests(tabela):
+
+    # Qui-quadrado de independência de todas as features de uma vez, com o
+    # mesmo resultado do scipy.stats.chi2_contingency (inclusive a correção
+    # de Yates quando há 1 grau de liberdade)
+    classes = [col for col in tabela.columns if col not in ('variavel', 'valor')]
+    observado = tabela[classes].to_numpy(dtype=np.float64)
+    variaveis, inicios, qtd_linhas = np.unique(tabela['variavel'].to_numpy(), return_index=True, return_counts=True)
+    ordem = np.argsort(inicios)
+    variaveis, inicios, qtd_linhas = variaveis[ordem], inicios[ordem], qtd_linhas[ordem]
+
+    total_linha = observado.sum(axis=1, keepdims=True)
+    total_coluna = np.add.reduceat(observado, inicios, axis=0)
+    n = total_coluna.sum(axis=1, keepdims=True)
+    grupo = np.repeat(np.arange(len(variaveis)), qtd_linhas)
+    esperado = total_linha * total_coluna[grupo] / n[grupo]
+
+    gl = (qtd_linhas - 1) * ((total_coluna > 0).sum(axis=1) - 1)
+    yates = (gl == 1)[grupo][:, None]
+    diferenca = esperado - observado
+    observado = np.where(yates, observado + np.sign(diferenca) * np.minimum(0.5, np.abs(diferenca)), observado)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        termos = np.where(esperado > 0, (observado - esperado) ** 2 / esperado, 0.0)
+    estatistica = np.add.reduceat(termos.sum(axis=1), inicios)
+    pvalue = np.where(gl > 0, chi2.sf(estatistica, np.maximum(gl, 1)), 1.0)
+    estatistica = np.where(gl > 0, estatistica, 0.0)
+
+    return pd.DataFrame({'chi2': estatistica, 'dof': gl, 'pvalue': pvalue}, index=pd.Index(variaveis, name='variavel'))
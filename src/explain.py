@@ -0,0 +1,150 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+import artifacts
+
+EXPLAIN_CACHE_DIR = '../data/cache/shap'
+TARGET = 'flag_doenca_cardiaca'
+
+# Classificadores que o shap.TreeExplainer aceita (o LightGBM salvo pelo seu
+# Booster); Regressão Logística e AdaBoost não têm explicação por árvores
+SHAP_CLASSIFIERS = ('DecisionTreeClassifier', 'RandomForestClassifier', 'XGBClassifier',
+                    'LGBMClassifier', 'LGBMBoosterClassifier')
+
+
+def supports(pipeline):
+    return type(pipeline.named_steps['classifier']).__name__ in SHAP_CLASSIFIERS
+
+
+def _tree_model(classifier):
+    # O adaptador do LightGBM não é reconhecido pelo SHAP; o Booster nativo é
+    return classifier.booster if isinstance(classifier, artifacts.LGBMBoosterClassifier) else classifier
+
+
+def model_hash(entry):
+
+    # Identidade do modelo: hashes do pré-processador e do classificador salvos
+    sha256 = entry['artifact']['sha256']
+    arquivos = [artifacts.PREPROCESSOR_FILE, artifacts.CLASSIFIER_FILES[entry['artifact']['format']]]
+
+    return hashlib.sha256(json.dumps([sha256[arquivo] for arquivo in arquivos]).encode()).hexdigest()[:16]
+
+
+def row_hashes(df, features):
+    # Hash de cada linha pelos valores das features: linhas iguais compartilham os SHAP values
+    return pd.util.hash_pandas_object(df[features], index=False).to_numpy()
+
+
+def stratified_sample(df, sample_size, target=TARGET, seed=0):
+
+    # Amostra com a mesma proporção do alvo da base completa
+    if sample_size is None or sample_size >= len(df):
+        return df
+
+    return df.groupby(target, group_keys=False, observed=True).sample(frac=sample_size / len(df), random_state=seed)
+
+
+@functools.lru_cache(maxsize=4)
+def _explainer(artifacts_dir, model_name, hash_modelo):
+
+    # Um explainer por worker: o modelo é lido do artefato uma vez por
+    # processo, em vez de serializado a cada chunk. O hash do modelo entra na
+    # chave: um worker que sobrevive a um novo treino relê o artefato
+    import shap
+
+    entry = artifacts.load_artifacts(artifacts_dir)[model_name]
+    if model_hash(entry) != hash_modelo:
+        raise ValueError(f'O artefato de {model_name} mudou durante a explicação (esperado {hash_modelo})')
+    pipeline = entry['model']
+
+    if not supports(pipeline):
+        raise ValueError(f"{model_name}: {type(pipeline.named_steps['classifier']).__name__} não é suportado pelo "
+                         f"shap.TreeExplainer (modelos aceitos: {', '.join(SHAP_CLASSIFIERS)})")
+
+    return pipeline.named_steps['preprocessor'], shap.TreeExplainer(_tree_model(pipeline.named_steps['classifier']))
+
+
+def _shap_chunk(artifacts_dir, model_name, hash_modelo, X):
+
+    preprocessor, explainer = _explainer(artifacts_dir, model_name, hash_modelo)
+    valores = explainer.shap_values(preprocessor.transform(X))
+
+    # Classificadores do sklearn devolvem uma matriz por classe: fica a da classe positiva
+    if isinstance(valores, list):
+        valores = valores[1]
+    elif valores.ndim == 3:
+        valores = valores[:, :, 1]
+
+    return np.asarray(valores, dtype=np.float32)
+
+
+def _load_cache(diretorio, hashes):
+
+    # O .npz lê cada array sob demanda: de cada chunk só os hashes são lidos,
+    # e os SHAP values vêm apenas dos chunks com linhas pedidas (só dessas linhas)
+    em_cache, valores = [], []
+    for path in sorted(glob.glob(os.path.join(diretorio, '*.npz'))):
+        with np.load(path) as chunk:
+            hashes_chunk = chunk['hashes']
+            pedidas = np.isin(hashes_chunk, hashes)
+            if pedidas.any():
+                em_cache.append(hashes_chunk[pedidas])
+                valores.append(chunk['shap'][pedidas])
+
+    if not em_cache:
+        return np.array([], dtype=np.uint64), None
+
+    return np.concatenate(em_cache), np.concatenate(valores)
+
+
+def explain(model_series, model_name, df, sample_size=None, chunksize=5_000, n_jobs=-1,
+            cache_dir=EXPLAIN_CACHE_DIR, seed=0):
+
+    # SHAP values do modelo para as linhas de df (ou para uma amostra
+    # estratificada delas). O cache guarda, por modelo, os valores de cada
+    # linha já explicada; só as linhas que faltam são calculadas, em chunks
+    # distribuídos entre processos. Retorna as features transformadas (para
+    # os gráficos) e a matriz de SHAP values na mesma ordem.
+    entry = model_series[model_name]
+    features = entry['features']
+    df = stratified_sample(df, sample_size, seed=seed)
+
+    hash_modelo = model_hash(entry)
+    diretorio = os.path.join(cache_dir, hash_modelo)
+    os.makedirs(diretorio, exist_ok=True)
+
+    hashes = row_hashes(df, features)
+    em_cache, valores_cache = _load_cache(diretorio, hashes)
+    faltantes = np.flatnonzero(~np.isin(hashes, em_cache))
+    print(f'SHAP: {len(df) - len(faltantes)} linhas no cache, {len(faltantes)} a calcular')
+    faltantes = faltantes[np.unique(hashes[faltantes], return_index=True)[1]]
+
+    if len(faltantes):
+        chunks = [faltantes[i:i + chunksize] for i in range(0, len(faltantes), chunksize)]
+        novos = Parallel(n_jobs=n_jobs)(
+            delayed(_shap_chunk)(model_series.artifacts_dir, model_name, hash_modelo, df[features].iloc[idx])
+            for idx in chunks
+        )
+        for idx, valores in zip(chunks, novos):
+            path = os.path.join(diretorio, f'{uuid.uuid4().hex}.npz')
+            with open(path + '.tmp', 'wb') as f:
+                np.savez(f, hashes=hashes[idx], shap=valores)
+            os.replace(path + '.tmp', path)
+
+        em_cache = np.concatenate([em_cache, hashes[faltantes]])
+        novos = np.concatenate(novos)
+        valores_cache = novos if valores_cache is None else np.concatenate([valores_cache, novos])
+
+    ordem = np.argsort(em_cache, kind='stable')
+    posicoes = ordem[np.searchsorted(em_cache, hashes, sorter=ordem)]
+    X_shap = entry['model'].named_steps['preprocessor'].transform(df[features])
+
+    return X_shap, valores_cache[posicoes]
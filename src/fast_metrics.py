@@ -0,0 +1,70 @@
+import numpy as np
+
+
+def _sorted_labels(y_true, y_score):
+
+    y_score = np.asarray(y_score, dtype=np.float64).ravel()
+    y_true = np.asarray(y_true).ravel().astype(np.int64)
+    order = np.argsort(y_score)
+
+    return y_score[order], y_true[order]
+
+
+def _auc_sorted(scores, y, positivos, negativos):
+
+    # Mann-Whitney por grupo de scores iguais: cada positivo ganha dos
+    # negativos com score menor e empata (meio ponto) com os do mesmo grupo
+    inicios = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+    pos = np.add.reduceat(y, inicios)
+    neg = np.diff(np.r_[inicios, len(y)]) - pos
+    neg_abaixo = np.cumsum(neg) - neg
+
+    return float((pos * (neg_abaixo + neg / 2)).sum() / (positivos * negativos))
+
+
+def confusion_metrics(y_true, y_score, cutoffs=(0.5,)):
+
+    # Uma ordenação dos scores: a AUC sai dos grupos de empates e a matriz de
+    # confusão de cada corte (positivo se score > corte, como no
+    # report_metrics) sai de um searchsorted sobre os positivos acumulados
+    scores, y = _sorted_labels(y_true, y_score)
+    cutoffs = np.atleast_1d(np.asarray(cutoffs, dtype=np.float64))
+
+    n = len(y)
+    acumulado = np.r_[0, np.cumsum(y)]
+    positivos = int(acumulado[-1])
+    negativos = n - positivos
+
+    idx = np.searchsorted(scores, cutoffs, side='right')
+    preditos = n - idx
+    tp = positivos - acumulado[idx]
+    fp = preditos - tp
+    fn = positivos - tp
+    tn = negativos - fp
+
+    # Divisões por zero valem 0, como o zero_division padrão do sklearn
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(preditos > 0, tp / preditos, 0.0)
+        recall = np.where(positivos > 0, tp / positivos, 0.0)
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+
+    return {
+        'cutoffs': cutoffs,
+        'tp': tp, 'fp': fp, 'tn': tn, 'fn': fn,
+        'accuracy': (tp + tn) / n,
+        'auc': _auc_sorted(scores, y, positivos, negativos),
+        'precision': precision,
+        'recall': recall,
+        'f1_score': f1
+    }
+
+
+def roc_auc(y_true, y_score):
+    scores, y = _sorted_labels(y_true, y_score)
+    positivos = int(y.sum())
+    return _auc_sorted(scores, y, positivos, len(y) - positivos)
+
+
+def auc_scorer(estimator, X, y):
+    # Mesma assinatura de um scorer do sklearn (scoring= da busca)
+    return roc_auc(y, estimator.predict_proba(X)[:, 1])
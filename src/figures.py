@@ -0,0 +1,143 @@
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import as_completed
+
+import numpy as np
+import pandas as pd
+from joblib.externals import loky
+
+FIGURES_DIR = '../figures'
+FIGURES_CACHE_PATH = '../data/cache/figures.json'
+
+
+def _update_hash(h, valor):
+
+    # Hash do conteúdo dos dados de entrada (e não do objeto): DataFrames e
+    # arrays pelos valores, o resto pela representação JSON
+    if isinstance(valor, pd.DataFrame):
+        h.update(json.dumps([list(map(str, valor.columns)), list(map(str, valor.dtypes))]).encode())
+        h.update(pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes())
+    elif isinstance(valor, pd.Series):
+        h.update(str(valor.name).encode())
+        h.update(pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes())
+    elif isinstance(valor, np.ndarray):
+        h.update(str((valor.dtype, valor.shape)).encode())
+        h.update(np.ascontiguousarray(valor).tobytes())
+    elif isinstance(valor, (list, tuple)):
+        h.update(b'[')
+        for item in valor:
+            _update_hash(h, item)
+        h.update(b']')
+    elif isinstance(valor, dict):
+        for chave in sorted(valor, key=str):
+            h.update(str(chave).encode())
+            _update_hash(h, valor[chave])
+    else:
+        h.update(json.dumps(valor, default=str).encode())
+
+
+def task_key(func, args, params):
+
+    # A chave inclui o código do módulo da função de desenho (ela e os
+    # auxiliares que chama): mudar o gráfico também o redesenha
+    h = hashlib.sha256()
+    h.update(inspect.getsource(inspect.getmodule(func)).encode())
+    _update_hash(h, list(args))
+    _update_hash(h, params)
+
+    return h.hexdigest()[:16]
+
+
+def _init_worker():
+
+    # Renderização sem janela, com o estilo do projeto
+    import matplotlib
+    matplotlib.use('Agg')
+
+    import config
+    config.set_plot_style()
+
+
+def _render(func, args, params, path):
+
+    import matplotlib.pyplot as plt
+
+    inicio = time.perf_counter()
+    fig = func(*args, **params)
+    fig.savefig(path)
+    plt.close(fig)
+
+    return time.perf_counter() - inicio
+
+
+class FigurePipeline:
+
+    # Registro de figuras: cada tarefa é (nome do arquivo, função do plots.py,
+    # dados, parâmetros) e tem como chave o hash desses dados e parâmetros.
+    # render() pula as figuras cuja chave não mudou desde a última execução
+    # (e cujo arquivo existe) e desenha as demais em paralelo, em processos.
+    def __init__(self, figures_dir=FIGURES_DIR, cache_path=FIGURES_CACHE_PATH, n_jobs=None):
+        self.figures_dir = figures_dir
+        self.cache_path = cache_path
+        self.n_jobs = n_jobs or os.cpu_count()
+        self.tasks = {}
+
+    def add(self, nome, func, *args, **params):
+        self.tasks[nome] = (func, args, params)
+
+    def _load_cache(self):
+
+        if not os.path.exists(self.cache_path):
+            return {}
+        with open(self.cache_path) as f:
+            return json.load(f)
+
+    def _save_cache(self, cache):
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path + '.tmp', 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(self.cache_path + '.tmp', self.cache_path)
+
+    def render(self):
+
+        os.makedirs(self.figures_dir, exist_ok=True)
+        cache = self._load_cache()
+        relatorio = []
+        pendentes = {}
+
+        inicio = time.perf_counter()
+        for nome, (func, args, params) in self.tasks.items():
+            chave = task_key(func, args, params)
+            path = os.path.join(self.figures_dir, f'{nome}.png')
+            if cache.get(nome) == chave and os.path.exists(path):
+                relatorio.append({'figura': nome, 'status': 'sem mudança', 'segundos': 0.0})
+            else:
+                pendentes[nome] = (chave, path)
+        segundos_hash = time.perf_counter() - inicio
+
+        if pendentes:
+            # Executor do loky, como no scheduler: processos novos (fork + exec,
+            # sem herdar threads de XGBoost/SHAP já carregados no script) que
+            # não reexecutam o script (eda.py / predict.py)
+            with loky.ProcessPoolExecutor(max_workers=min(self.n_jobs, len(pendentes)),
+                                          initializer=_init_worker) as pool:
+                futures = {
+                    pool.submit(_render, *self.tasks[nome], path): nome
+                    for nome, (_, path) in pendentes.items()
+                }
+                for future in as_completed(futures):
+                    nome = futures[future]
+                    relatorio.append({'figura': nome, 'status': 'renderizada', 'segundos': future.result()})
+                    cache[nome] = pendentes[nome][0]
+                    self._save_cache(cache)
+
+        relatorio = pd.DataFrame(relatorio).sort_values('segundos', ascending=False).reset_index(drop=True)
+        print(f'Figuras: {(relatorio["status"] == "renderizada").sum()} renderizadas, '
+              f'{(relatorio["status"] == "sem mudança").sum()} sem mudança (hash das entradas em {segundos_hash:.2f}s)')
+        print(relatorio.round(2).to_string(index=False))
+
+        return relatorio
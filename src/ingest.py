@@ -0,0 +1,211 @@
+# Ingestão incremental: um novo arquivo bruto (no formato do raw_cardio_data.csv)
+# é processado e anexado ao store como uma partição nova, sem reprocessar nem
+# regravar o dataset acumulado.
+# Uso: python ingest.py <arquivo_bruto.csv> [--compactar]
+#   - linhas com valor faltante em colunas inteiras são rejeitadas (e
+#     gravadas em <arquivo>.rejeitadas.csv) antes da conversão de tipos;
+#   - dentro do lote, a última ocorrência de cada paciente_id vence;
+#   - ids já conhecidos são localizados pelos índices .npy das partições
+#     (memory map + busca binária): linhas idênticas são ignoradas e as
+#     alteradas substituem a anterior (upsert), que entra no vetor de
+#     exclusões da sua partição;
+#   - o custo depende do tamanho do lote, não do dataset acumulado. A
+#     compactação (uma partição só, sem exclusões) roda quando há partições
+#     ou linhas excluídas demais, ou com --compactar.
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+from pyarrow import feather
+
+import perf
+import processing
+import store
+
+INGEST_CONFIG = {
+    'max_particoes': 32,
+    'fracao_excluida_max': 0.3
+}
+
+
+def _same_rows(a, b):
+
+    # Comparação linha a linha (NaN == NaN) de dois frames com as mesmas
+    # colunas; floats com tolerância para as diferenças de parse do CSV
+    iguais = np.ones(len(a), dtype=bool)
+    for col in a.columns:
+        if pd.api.types.is_float_dtype(a[col]):
+            iguais &= np.isclose(a[col].to_numpy(), b[col].to_numpy(), rtol=1e-12, atol=0, equal_nan=True)
+            continue
+        x, y = a[col].to_numpy(dtype=object), b[col].to_numpy(dtype=object)
+        iguais &= (x == y) | (pd.isna(x) & pd.isna(y))
+
+    return iguais
+
+
+def reject_invalid(delta, raw_path):
+
+    # Linhas com faltantes em colunas inteiras saem do lote e vão para um CSV
+    # ao lado do arquivo de entrada
+    delta, rejeitadas = store.split_invalid(delta)
+    if len(rejeitadas):
+        store.save_rejected(rejeitadas, f'{raw_path}.rejeitadas.csv')
+
+    return delta, len(rejeitadas)
+
+
+def match_known(delta, particoes, store_dir=store.STORE_DIR):
+
+    # Para cada partição, as linhas vivas com ids do lote e se o lote as
+    # repete sem alteração; devolve as exclusões por partição e a máscara das
+    # linhas do lote que já estão gravadas
+    ids = delta['paciente_id'].to_numpy()
+    encontrados = np.zeros(len(delta), dtype=bool)
+    alterados = np.zeros(len(delta), dtype=bool)
+    pares = {}
+
+    for i, particao in enumerate(particoes):
+        path = os.path.join(store_dir, particao['path'])
+        linhas, posicoes = store.lookup(store.load_index(path), ids)
+        vivas = ~np.isin(posicoes, store.deleted_positions(particao, store_dir))
+        linhas, posicoes = linhas[vivas], posicoes[vivas]
+        if not len(linhas):
+            continue
+
+        # Só as linhas encontradas são lidas da partição mapeada
+        anteriores = feather.read_table(path, memory_map=True).take(posicoes).to_pandas()
+        mesmas = _same_rows(delta.iloc[linhas], anteriores)
+        encontrados[linhas] = True
+        alterados[linhas[~mesmas]] = True
+        pares[i] = (linhas, posicoes)
+
+    iguais = encontrados & ~alterados
+    exclusoes = {i: posicoes[~iguais[linhas]] for i, (linhas, posicoes) in pares.items()}
+
+    return {i: posicoes for i, posicoes in exclusoes.items() if len(posicoes)}, encontrados, iguais
+
+
+def ingest(raw_path, store_dir=store.STORE_DIR, source='ingestao', config=INGEST_CONFIG):
+
+    with perf.timer() as tempo:
+        delta, nao_mapeados = processing.process_raw(processing.read_raw_csv(raw_path))
+        processing.report_unmapped(nao_mapeados)
+        linhas_lidas = len(delta)
+        delta, qtd_rejeitadas = reject_invalid(delta, raw_path)
+
+        qtd_duplicatas = int(delta['paciente_id'].duplicated().sum())
+        print(f'Quantidade de duplicatas no lote: {qtd_duplicatas}')
+        delta = delta.drop_duplicates('paciente_id', keep='last').astype(store.PROCESSED_DTYPES).reset_index(drop=True)
+
+        if not store.list_versions(store_dir):
+            # Store vazio (sem manifest): o lote inteiro vira a versão 1, uma
+            # partição única com o índice de paciente_id, como na compactação
+            versao = store.write_processed(delta, store_dir, source)
+            store.build_index(os.path.join(store.version_dir(versao, store_dir), store.DATA_FILE),
+                              delta['paciente_id'].to_numpy())
+            novo_manifest = store.read_manifest(versao, store_dir)
+            novo_manifest['ingestao'] = {
+                'arquivo': raw_path,
+                'linhas_lidas': linhas_lidas,
+                'novas': len(delta),
+                'atualizadas': 0,
+                'iguais': 0,
+                'rejeitadas': qtd_rejeitadas,
+                'duplicatas_no_lote': qtd_duplicatas
+            }
+            store.write_manifest(versao, novo_manifest, store_dir)
+            print(f'Store vazio em {store_dir}: versão {versao} criada com {len(delta)} pacientes de {raw_path}')
+            return novo_manifest
+
+        manifest = store.read_manifest(store_dir=store_dir)
+        particoes = [dict(p) for p in store.partitions(manifest)]
+        exclusoes, encontrados, iguais = match_known(delta, particoes, store_dir)
+
+        novos = delta[~iguais]
+        if novos.empty:
+            print(f'Nenhum paciente novo ou alterado em {raw_path}')
+            return None
+
+        versao = manifest['version'] + 1
+        os.makedirs(os.path.join(store_dir, store.PARTITIONS_DIR), exist_ok=True)
+        for i, posicoes in exclusoes.items():
+            particao = particoes[i]
+            excluidas = np.union1d(store.deleted_positions(particao, store_dir), posicoes)
+            nome = particao['path'].replace(os.sep, '_') + f'.del-v{versao:04d}.npy'
+            particao['deleted'] = os.path.join(store.PARTITIONS_DIR, nome)
+            np.save(os.path.join(store_dir, particao['deleted']), excluidas)
+            particao['deleted_sha256'] = store.file_sha256(os.path.join(store_dir, particao['deleted']))
+            particao['deleted_rows'] = len(excluidas)
+
+        path = os.path.join(store.PARTITIONS_DIR, f'part-v{versao:04d}.arrow')
+        particoes.append({
+            'path': path,
+            'rows': len(novos),
+            'sha256': store.write_partition(novos, os.path.join(store_dir, path)),
+            'deleted': None,
+            'deleted_sha256': None,
+            'deleted_rows': 0
+        })
+
+        qtd_excluidas = sum(len(posicoes) for posicoes in exclusoes.values())
+        resumo = {
+            'arquivo': raw_path,
+            'linhas_lidas': linhas_lidas,
+            'novas': int((~encontrados).sum()),
+            'atualizadas': int((encontrados & ~iguais).sum()),
+            'iguais': int(iguais.sum()),
+            'rejeitadas': qtd_rejeitadas,
+            'duplicatas_no_lote': qtd_duplicatas
+        }
+        novo_manifest = {
+            'version': versao,
+            'source': source,
+            'created_at': datetime.datetime.now().isoformat(),
+            'rows': manifest['rows'] - qtd_excluidas + len(novos),
+            'dtypes': manifest['dtypes'],
+            'categories': manifest['categories'],
+            'sha256': store.partitions_sha256(particoes),
+            'partitions': particoes,
+            'ingestao': resumo
+        }
+        store.write_manifest(versao, novo_manifest, store_dir)
+
+    print(f"Versão {versao}: {resumo['novas']} pacientes novos, {resumo['atualizadas']} atualizados, "
+          f"{resumo['iguais']} sem alteração | {novo_manifest['rows']} linhas em {len(particoes)} partições")
+    perf.report_throughput('Ingestão incremental', linhas_lidas, tempo['segundos'])
+
+    excluidas = sum(p['deleted_rows'] for p in particoes) / sum(p['rows'] for p in particoes)
+    if len(particoes) > config['max_particoes'] or excluidas > config['fracao_excluida_max']:
+        compact(store_dir)
+
+    return novo_manifest
+
+
+def compact(store_dir=store.STORE_DIR):
+
+    # Regrava as linhas vivas da versão atual como uma partição única (nova
+    # versão do StoreWriter); as versões anteriores continuam legíveis
+    with perf.timer() as tempo:
+        df = store.read_processed(store_dir=store_dir)
+        versao = store.write_processed(df, store_dir, source='compactacao')
+        store.build_index(os.path.join(store.version_dir(versao, store_dir), store.DATA_FILE), df['paciente_id'].to_numpy())
+
+    perf.report_throughput('Compactação', len(df), tempo['segundos'])
+
+    return versao
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Ingestão incremental de um novo arquivo bruto no store')
+    parser.add_argument('arquivo', nargs='?', help='arquivo bruto no formato do raw_cardio_data.csv')
+    parser.add_argument('--store', default=store.STORE_DIR)
+    parser.add_argument('--compactar', action='store_true', help='compacta as partições da versão atual')
+    args = parser.parse_args()
+
+    if args.arquivo:
+        ingest(args.arquivo, args.store)
+    if args.compactar:
+        compact(args.store)
@@ -0,0 +1,133 @@
+from joblib import Memory
+from scipy.stats import randint, uniform, loguniform
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
+from xgboost import XGBClassifier
+from lightgbm import LGBMClassifier
+
+import fast_metrics
+
+SEED = 22
+TARGET = 'flag_doenca_cardiaca'
+PREPROCESSOR_CACHE_DIR = '../data/cache/preprocessor'
+
+
+def split_features(df, target=TARGET):
+
+    cat_features = [col for col in df.select_dtypes(include=['object', 'category']).columns if col != 'paciente_id'] + \
+                   [col for col in df.select_dtypes(include=['int64', 'float64']).columns if col.startswith('flag_') and col not in ['paciente_id', target]]
+    num_features = [col for col in df.select_dtypes(include=['int64', 'float64']).columns if not col.startswith('flag_') and col not in ['paciente_id', target]]
+
+    # Ordem fixa (e não via set) para que as matrizes de cada fold sejam as
+    # mesmas entre execuções e o cache do pré-processamento seja reaproveitado
+    features = cat_features + num_features
+
+    return cat_features, num_features, features
+
+
+def build_preprocessor(num_features, cat_features):
+
+    categorical_transformer = OneHotEncoder(handle_unknown='ignore', drop='first', sparse_output=False)
+    numerical_transformer = StandardScaler()
+
+    return ColumnTransformer([
+        ('num', numerical_transformer, num_features),
+        ('cat', categorical_transformer, cat_features)
+    ]).set_output(transform="pandas")
+
+
+def preprocessor_memory(cache_dir=PREPROCESSOR_CACHE_DIR):
+    return Memory(cache_dir, verbose=0)
+
+
+def build_pipeline(preprocessor, model, memory=None):
+
+    # Com memory, o fit_transform do pré-processador é cacheado em disco pela
+    # chave (parâmetros, X, y): cada fold é transformado uma única vez e
+    # reaproveitado por todos os candidatos e por todas as famílias de modelo.
+    return Pipeline([
+        ('preprocessor', preprocessor),
+        ('classifier', model)
+    ], memory=memory)
+
+
+def build_models(seed=SEED):
+
+    return {
+        'Logistic Regression': (
+            LogisticRegression(max_iter=1000, random_state=seed),
+            {
+                'classifier__C': loguniform(1e-4, 1e3),
+                'classifier__penalty': ['l2'],
+                'classifier__solver': ['liblinear', 'saga']
+            }
+        ),
+        'Decision Tree': (
+            DecisionTreeClassifier(random_state=seed),
+            {
+                'classifier__max_depth': randint(2, 100),
+                'classifier__min_samples_leaf': randint(1, 1000),
+                'classifier__criterion': ['gini', 'entropy', 'log_loss']
+            }
+        ),
+        'Random Forest': (
+            RandomForestClassifier(random_state=seed),
+            {
+                'classifier__n_estimators': randint(100, 2000),
+                'classifier__max_depth': randint(2, 100),
+                'classifier__min_samples_leaf': randint(1, 1000),
+                'classifier__criterion': ['gini', 'entropy', 'log_loss']
+            }
+        ),
+        'XGBoost': (
+            XGBClassifier(eval_metric='logloss', random_state=seed),
+            {
+                'classifier__n_estimators': randint(100, 2000),
+                'classifier__max_depth': randint(3, 30),
+                'classifier__learning_rate': loguniform(1e-4, 0.5),
+                'classifier__colsample_bytree': uniform(0.3, 0.7),
+                'classifier__reg_alpha': loguniform(1e-4, 10),
+                'classifier__reg_lambda': loguniform(1e-4, 10)
+            }
+        ),
+        'AdaBoost': (
+            AdaBoostClassifier(random_state=seed),
+            {
+                'classifier__n_estimators': randint(50, 1000),
+                'classifier__learning_rate': loguniform(1e-4, 1.0)
+            }
+        ),
+        'LightGBM': (
+            LGBMClassifier(random_state=seed),
+            {
+                'classifier__n_estimators': randint(100, 2000),
+                'classifier__max_depth': randint(3, 50),
+                'classifier__learning_rate': loguniform(1e-4, 0.5),
+                'classifier__num_leaves': randint(20, 512),
+                'classifier__colsample_bytree': uniform(0.3, 0.7),
+                'classifier__reg_alpha': loguniform(1e-4, 10),
+                'classifier__reg_lambda': loguniform(1e-4, 10)
+            }
+        )
+    }
+
+
+def report_metrics(y_true, y_proba, cohort=0.5):
+
+    # AUC e métricas no ponto de corte em uma única ordenação (ver fast_metrics.py)
+    resultado = fast_metrics.confusion_metrics(y_true, y_proba[:, 1], [cohort])
+
+    error_metrics = {
+        'accuracy': float(resultado['accuracy'][0]),
+        'auc': resultado['auc'],
+        'precision': float(resultado['precision'][0]),
+        'recall': float(resultado['recall'][0]),
+        'f1_score': float(resultado['f1_score'][0])
+    }
+
+    return error_metrics
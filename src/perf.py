@@ -0,0 +1,37 @@
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+
+def peak_rss_mb():
+
+    # No Linux o VmHWM é do espaço de endereçamento atual; o ru_maxrss é
+    # herdado através do exec e contaminaria processos filhos recém-criados
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+@contextmanager
+def timer():
+    tempo = {}
+    inicio = time.perf_counter()
+    try:
+        yield tempo
+    finally:
+        tempo['segundos'] = time.perf_counter() - inicio
+
+
+def report_throughput(etapa, qtd_linhas, segundos):
+    linhas_seg = qtd_linhas / segundos if segundos > 0 else float('inf')
+    print(f'{etapa}: {qtd_linhas} linhas em {segundos:.2f}s '
+          f'({linhas_seg:,.0f} linhas/s) | pico de RSS: {peak_rss_mb():.1f} MB')
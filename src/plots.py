@@ -0,0 +1,309 @@
+# Funções de desenho dos gráficos do eda.py e do predict.py. Cada uma recebe
+# só os dados (ou resumos) de que precisa, desenha em uma figura nova e a
+# devolve; quem salva e decide se precisa redesenhar é o figures.py.
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+from matplotlib.patches import Patch
+
+CLASS_COLORS = {0: '#377eb8', 1: '#e41a1c'}
+
+
+def correlation_heatmap(corr_table):
+
+    mask = np.triu(np.ones_like(corr_table, dtype=bool))
+
+    fig = plt.figure(figsize=(10, 8))
+    ax = sns.heatmap(
+        corr_table,
+        mask=mask,
+        vmin=-1,
+        vmax=1,
+        cmap="RdBu",
+        annot=True,
+        fmt='.2f',
+        annot_kws={"fontsize": 8, "color": "k"},
+        cbar_kws={"format": '%.2f'}
+    )
+
+    # Números decimais com vírgula
+    for t in ax.texts:
+        t.set_text(t.get_text().replace('.', ','))
+
+    cbar = ax.collections[0].colorbar
+    tick_labels = [label.get_text().replace('.', ',') for label in cbar.ax.get_yticklabels()]
+    cbar.ax.set_yticklabels(tick_labels)
+
+    plt.tight_layout()
+
+    return fig
+
+
+# Agregação antes do desenho: os gráficos abaixo recebem resumos compactos
+# (contagens por bin, densidades em grade, quantis, médias por grupo) em vez
+# das linhas, de modo que o custo de desenhar (e de serializar/hashear as
+# entradas no figures.py) não cresce com o tamanho da base.
+MAX_FLIERS = 2_000
+
+
+def binned_kde(values, grid_min=None, grid_max=None, cut=3, gridsize=200, bins=2048):
+
+    # KDE gaussiana com banda de Scott (a mesma do seaborn/scipy), calculada
+    # por binning linear em uma grade fina e convolução com o kernel via FFT
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) < 2 or np.isclose(values.var(), 0):
+        return None
+
+    bw = values.std(ddof=1) * len(values) ** (-1 / 5)
+    lo = values.min() - cut * bw if grid_min is None else grid_min
+    hi = values.max() + cut * bw if grid_max is None else grid_max
+
+    # Binning linear: cada valor é dividido entre os dois pontos vizinhos da grade
+    grade = np.linspace(lo, hi, bins)
+    dx = grade[1] - grade[0]
+    posicao = np.clip((values - lo) / dx, 0, bins - 1)
+    esquerda = np.minimum(np.floor(posicao).astype(np.int64), bins - 2)
+    peso_direita = posicao - esquerda
+    contagem = np.bincount(esquerda, 1 - peso_direita, minlength=bins) + \
+        np.bincount(esquerda + 1, peso_direita, minlength=bins)
+
+    deslocamentos = np.arange(-(bins - 1), bins) * dx
+    kernel = np.exp(-0.5 * (deslocamentos / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+    tamanho = int(2 ** np.ceil(np.log2(len(contagem) + len(kernel) - 1)))
+    convolucao = np.fft.irfft(np.fft.rfft(contagem, tamanho) * np.fft.rfft(kernel, tamanho), tamanho)
+    densidade = convolucao[bins - 1:2 * bins - 1] / len(values)
+
+    x = np.linspace(lo, hi, gridsize)
+
+    return x, np.interp(x, grade, densidade)
+
+
+def box_summary(values):
+
+    # Estatísticas do boxplot do matplotlib (whiskers em 1,5 IQR). Os outliers
+    # são reduzidos aos valores distintos, limitados a MAX_FLIERS. Classe sem
+    # valores (ex.: após um filtro) -> None, e a caixa não é desenhada
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    whislo = values[values >= q1 - 1.5 * iqr].min()
+    whishi = values[values <= q3 + 1.5 * iqr].max()
+
+    fliers = np.unique(values[(values < whislo) | (values > whishi)])
+    if len(fliers) > MAX_FLIERS:
+        fliers = fliers[np.linspace(0, len(fliers) - 1, MAX_FLIERS).astype(np.int64)]
+
+    return {'med': med, 'q1': q1, 'q3': q3, 'whislo': whislo, 'whishi': whishi, 'fliers': fliers}
+
+
+def numeric_summary(df, var, target, bins=30):
+
+    # Histograma (bins comuns às classes), KDE na escala de contagem (como o
+    # histplot(kde=True): grade do mínimo ao máximo, cut=0) e boxplot por classe
+    valores = df[var].to_numpy(dtype=np.float64)
+    classes = df[target].to_numpy()
+    edges = np.histogram_bin_edges(valores[~np.isnan(valores)], bins=bins)
+    largura = edges[1] - edges[0]
+
+    resumo = {'edges': edges, 'counts': {}, 'kde': {}, 'box': {}}
+    for classe in [0, 1]:
+        v = valores[classes == classe]
+        resumo['counts'][classe] = np.histogram(v, bins=edges)[0]
+        kde = binned_kde(v, grid_min=edges[0], grid_max=edges[-1], cut=0)
+        resumo['kde'][classe] = None if kde is None else (kde[0], kde[1] * len(v) * largura)
+        resumo['box'][classe] = box_summary(v)
+
+    return resumo
+
+
+def box_summaries(df, variables, target):
+
+    classes = df[target].to_numpy()
+    return {
+        var: {classe: box_summary(df[var].to_numpy()[classes == classe]) for classe in [0, 1]}
+        for var in variables
+    }
+
+
+def grouped_means(df, var, target, z=1.96):
+
+    # Média do alvo por categoria com IC normal (média ± z * erro padrão) e a
+    # contagem de cada categoria, em um único groupby
+    grupos = df.groupby(var, observed=True)[target].agg(['mean', 'std', 'count']).sort_index()
+    erro = z * grupos['std'].fillna(0) / np.sqrt(grupos['count'])
+
+    return {
+        'categorias': [str(c) for c in grupos.index],
+        'media': grupos['mean'].to_numpy(),
+        'ic_inferior': (grupos['mean'] - erro).to_numpy(),
+        'ic_superior': (grupos['mean'] + erro).to_numpy(),
+        'contagem': grupos['count'].to_numpy()
+    }
+
+
+def class_kdes(df, var, target):
+
+    # Densidade de cada classe com a grade própria (cut=3), como o kdeplot com common_norm=False
+    return {classe: binned_kde(df.loc[df[target] == classe, var]) for classe in [0, 1]}
+
+
+def _boxplot(caixas, var, ax):
+
+    # Mesmo visual do sns.boxplot: cores com saturação 0,75 e linhas cinza
+    cores = [sns.desaturate(CLASS_COLORS[0], 0.75), sns.desaturate(CLASS_COLORS[1], 0.75)]
+    linhas = {'color': '#3f3f3f'}
+    classes = [classe for classe in [0, 1] if caixas[classe] is not None]
+    bp = ax.bxp([caixas[classe] for classe in classes], positions=classes, orientation='horizontal', widths=0.8,
+                patch_artist=True, boxprops={'edgecolor': '#3f3f3f'}, medianprops=linhas,
+                whiskerprops=linhas, capprops=linhas,
+                flierprops={'marker': 'o', 'markerfacecolor': 'none', 'markeredgecolor': '#3f3f3f'})
+    for caixa, classe in zip(bp['boxes'], classes):
+        caixa.set_facecolor(cores[classe])
+    ax.set_yticks([0, 1], ['0', '1'])
+    ax.invert_yaxis()
+    ax.set_xlabel(var)
+    ax.set_ylabel('Target')
+    ax.legend(handles=[Patch(facecolor=cor) for cor in cores],
+              loc='upper right', labels=['Ausência de Doença Cardíaca', 'Presença de Doença Cardíaca'])
+
+
+def numeric_distribution(resumo, var, target):
+
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+
+    for classe in [0, 1]:
+        axes[0].stairs(resumo['counts'][classe], resumo['edges'], fill=True, alpha=0.5, color=CLASS_COLORS[classe])
+        axes[0].stairs(resumo['counts'][classe], resumo['edges'], color=CLASS_COLORS[classe], linewidth=0.5)
+        if resumo['kde'][classe] is not None:
+            axes[0].plot(*resumo['kde'][classe], color=CLASS_COLORS[classe])
+    axes[0].set_title(f'Distribuição de {var} em relação à {target}', fontsize=14)
+    axes[0].set_xlabel(var)
+    axes[0].set_ylabel('Frequência')
+
+    _boxplot(resumo['box'], var, axes[1])
+    axes[1].set_title(f'Análise de {var} em relação à target', fontsize=14)
+
+    plt.tight_layout()
+
+    return fig
+
+
+def boxplots(resumos, variables, target):
+
+    fig, axes = plt.subplots(1, len(variables), figsize=(18, 8))
+
+    for ax, var in zip(np.atleast_1d(axes), variables):
+        _boxplot(resumos[var], var, ax)
+
+    plt.tight_layout()
+
+    return fig
+
+
+def _pointplot_count(resumo, var, target, ax):
+
+    posicoes = np.arange(len(resumo['categorias']))
+    espessura = plt.rcParams['lines.linewidth'] * 1.8
+
+    ax.errorbar(posicoes, resumo['media'],
+                yerr=[resumo['media'] - resumo['ic_inferior'], resumo['ic_superior'] - resumo['media']],
+                color='#e41a1c', marker='o', linewidth=espessura, elinewidth=espessura,
+                capsize=8, capthick=espessura, zorder=3)
+    ax.set_ylim(0, 1)
+    ax.set_xticks(posicoes, resumo['categorias'])
+    ax.set_xlabel(var)
+    ax.set_ylabel(target)
+
+    ax2 = ax.twinx()
+    ax2.bar(posicoes, resumo['contagem'], width=0.8, color='#377eb8', alpha=0.3)
+    ax2.set_ylabel('Frequência')
+    ax2.tick_params(axis='y')
+
+
+def pointplot(resumo, var, target):
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    _pointplot_count(resumo, var, target, ax)
+
+    return fig
+
+
+def pointplots(resumos, variables, target):
+
+    fig, axes = plt.subplots(1, len(variables), figsize=(18, 8))
+
+    for ax, var in zip(np.atleast_1d(axes), variables):
+        _pointplot_count(resumos[var], var, target, ax)
+        ax.set_title(var.replace('_', ' ').title())
+        ax.set_xlabel('')
+        ax.set_ylabel('Probabilidade de Doença Cardíaca')
+
+    plt.tight_layout()
+
+    return fig
+
+
+def kde_pred_proba(kdes, target):
+
+    # Mesmas cores do palette='Set1' com hue 0/1 e common_norm=False
+    cores = {0: '#e41a1c', 1: '#377eb8'}
+
+    fig = plt.figure(figsize=(10, 6))
+    for classe, rotulo in [(0, 'Não'), (1, 'Sim')]:
+        if kdes[classe] is None:
+            continue
+        x, densidade = kdes[classe]
+        plt.fill_between(x, densidade, color=cores[classe], alpha=0.5, label=rotulo)
+        plt.plot(x, densidade, color=cores[classe])
+    plt.ylim(bottom=0)
+    plt.xlabel('Probabilidade Predita')
+    plt.ylabel('Densidade')
+    plt.legend(title='Doença Cardíaca')
+    plt.grid(visible=False)
+    plt.tight_layout()
+
+    return fig
+
+
+def precision_recall_curve(cutoffs, recall, precision, best_threshold_metrics):
+
+    fig = plt.figure(figsize=(10, 6))
+    plt.plot(cutoffs, recall, label='Recall', color='#8ecae6', zorder=1)
+    plt.plot(cutoffs, precision, label='Precision', color='#ffb3b3', zorder=1)
+
+    plt.scatter(
+        best_threshold_metrics['thresholds'],
+        best_threshold_metrics['recall'],
+        color='#023047',
+        marker='D',
+        s=50,
+        label=f"Threshold Ideal (Recall = {best_threshold_metrics['recall']:.2f})",
+        zorder=2
+    )
+    plt.xlabel('Threshold')
+    plt.ylabel('Score')
+    plt.legend()
+    plt.grid(visible=False)
+    plt.tight_layout()
+
+    return fig
+
+
+def shap_summary(shap_values, X_shap, feature_names, plot_type='bar'):
+
+    import shap
+
+    plt.figure()
+    if plot_type == 'bar':
+        shap.summary_plot(shap_values, X_shap, plot_type='bar', feature_names=feature_names, color='#377eb8', show=False)
+        plt.xlabel('Importância Média do SHAP')
+    else:
+        shap.summary_plot(shap_values, X_shap, plot_type='dot', feature_names=feature_names, cmap='coolwarm', show=False)
+        plt.xlabel('Valores de SHAP - Impacto no Modelo')
+    plt.tight_layout()
+
+    return plt.gcf()
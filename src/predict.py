@@ -1,15 +1,16 @@
 # %% 
 import pandas as pd 
-import matplotlib.pyplot as plt
-from sklearn import metrics
-import seaborn as sns
-import shap
 
-import config
-config.set_plot_style()
+import artifacts
+import explain
+import figures
+import plots
+import scoring
+import store
+import thresholds
 # %%
-model_series = pd.read_pickle("../data/predicted/model_series.pkl")
-df_processed = pd.read_csv("../data/processed/processed_cardio_data.csv")
+# Métricas e parâmetros vêm do manifest; cada modelo só é carregado no primeiro acesso a ["model"]
+model_series = artifacts.load_artifacts("../data/predicted/models")
 # %%
 all_data = []
 
@@ -37,76 +38,70 @@ df_metrics = df_raw_metrics.groupby(['Tipo de Métrica', 'Métrica']).sum().rese
 df_metrics
 
 # %%
-model_name = 'XGBoost'
+# XGBoost quando passou pela triagem do train.py; senão, entre os modelos
+# salvos que o SHAP explica, o de melhor AUC de CV da busca (best_score): a
+# escolha não olha o conjunto de teste
+model_name = 'XGBoost' if 'XGBoost' in model_series else max(
+    [nome for nome in model_series if explain.supports(model_series[nome]['model'])],
+    key=lambda nome: model_series[nome]['best_score'],
+    default=None
+)
+if model_name is None:
+    raise ValueError(f'Nenhum modelo salvo é explicável pelo SHAP ({", ".join(model_series)}): mantenha uma '
+                     f'família de árvores em screening.SCREENING_CONFIG["sempre_manter"]')
 best_model = model_series[model_name]
 
 print(f'Modelo: {model_name}')
 
 # %%
-df_processed['pred_proba'] = best_model["model"].predict_proba(df_processed[best_model["features"]])[:, 1]
+# Projeção de colunas: só as features do modelo, o id e o alvo são lidos do store
+df_processed = store.read_processed(
+    columns=['paciente_id'] + best_model["features"] + ['flag_doenca_cardiaca']
+)
 
 # %%
-plt.figure(figsize=(10,6))
-sns.kdeplot(
-    data=df_processed, 
-    x='pred_proba', 
-    hue='flag_doenca_cardiaca', 
-    fill=True, 
-    common_norm=False,
-    alpha=0.5,
-    palette='Set1'
-)
-plt.xlabel('Probabilidade Predita')
-plt.ylabel('Densidade')
-plt.legend(title='Doença Cardíaca', labels=['Não', 'Sim'])
-plt.grid(visible=False)  
-plt.tight_layout()
-plt.savefig('../figures/kde_plot_pred_proba.png')
-plt.show()
+df_processed['pred_proba'] = scoring.predict_proba(best_model, df_processed)
 
 # %%
-precision, recall, thresholds = metrics.precision_recall_curve(df_processed['flag_doenca_cardiaca'], df_processed['pred_proba'])
+# Figuras: só as que tiveram entradas alteradas são redesenhadas, em
+# paralelo e sem janela (ver figures.py e plots.py). As densidades são
+# calculadas aqui, e a figura recebe só a grade de cada classe
+figuras = figures.FigurePipeline()
 
-df_threshold = pd.DataFrame({
-    'precision': precision[:-1],
-    'recall': recall[:-1],
-    'thresholds': thresholds
-})
+kdes_pred_proba = plots.class_kdes(df_processed, 'pred_proba', 'flag_doenca_cardiaca')
+figuras.add('kde_plot_pred_proba', plots.kde_pred_proba, kdes_pred_proba, 'flag_doenca_cardiaca')
 
-df_threshold_filtered = df_threshold[df_threshold["recall"] <= 0.81]
-best_threshold_metrics = df_threshold_filtered.loc[df_threshold_filtered["recall"].idxmax()]
+# %%
+# Ponto de corte escolhido no treino (critério em thresholds.THRESHOLD_CONFIG) e
+# curvas de precisão/recall de todos os cortes em uma única varredura
+threshold = best_model['threshold']
+varredura = thresholds.sweep(df_processed['flag_doenca_cardiaca'], df_processed['pred_proba'])
+curvas = thresholds.curve_metrics(varredura)
+
+idx = thresholds.cutoff_index(varredura, threshold['valor'])
+best_threshold_metrics = pd.Series({
+    'precision': curvas['precision'][0, idx],
+    'recall': curvas['recall'][0, idx],
+    'thresholds': threshold['valor']
+})
 
 best_threshold_metrics
 
 # %%
-plt.figure(figsize=(10,6))
-plt.plot(thresholds, recall[:-1], label='Recall', color='#8ecae6', zorder=1)     
-plt.plot(thresholds, precision[:-1], label='Precision', color='#ffb3b3', zorder=1) 
-
-plt.scatter(
-    best_threshold_metrics['thresholds'],
-    best_threshold_metrics['recall'],
-    color='#023047',  
-    marker='D',  
-    s=50,
-    label='Threshold Ideal (Recall = 0.81)',
-    zorder=2
+figuras.add(
+    'precision_recall_curve',
+    plots.precision_recall_curve,
+    # Sem o primeiro corte (acima do maior score), em que nenhum paciente é positivo
+    varredura['cutoffs'][1:], curvas['recall'][0, 1:], curvas['precision'][0, 1:], best_threshold_metrics.to_dict()
 )
-plt.xlabel('Threshold')
-plt.ylabel('Score')
-plt.legend()
-plt.grid(visible=False)  
-plt.tight_layout()
-plt.savefig('../figures/precision_recall_curve.png')
-plt.show()
 
 # %%
-X_shap = best_model["model"].named_steps['preprocessor'].transform(df_processed[best_model["features"]]) 
-
-underlying_model = best_model["model"].named_steps["classifier"] if hasattr(best_model["model"], "named_steps") else best_model["model"]
+# SHAP em chunks paralelos, com cache em disco por modelo e por linha: só o
+# que ainda não foi explicado é calculado (ver explain.py). Com
+# shap_sample_size, uma amostra estratificada pelo alvo é explicada.
+shap_sample_size = None
 
-explainer = shap.TreeExplainer(underlying_model)
-shap_values = explainer.shap_values(X_shap)
+X_shap, shap_values = explain.explain(model_series, model_name, df_processed, sample_size=shap_sample_size)
 
 # %%
 feature_names = [
@@ -124,29 +119,8 @@ feature_names = [
     'Atividade fisica'
 ]
 # %%
-ax = shap.summary_plot(
-    shap_values, 
-    X_shap, 
-    plot_type='bar', 
-    feature_names=feature_names, 
-    color='#377eb8',
-    show=False
-)
-plt.xlabel('Importância Média do SHAP')
-plt.tight_layout()
-plt.savefig('../figures/shap_summary_bar.png')
-plt.show()
+figuras.add('shap_summary_bar', plots.shap_summary, shap_values, X_shap, feature_names, plot_type='bar')
+figuras.add('shap_summary_dot', plots.shap_summary, shap_values, X_shap, feature_names, plot_type='dot')
 
 # %%
-shap.summary_plot(
-    shap_values, 
-    X_shap, 
-    plot_type='dot', 
-    feature_names=feature_names, 
-    cmap='coolwarm',
-    show=False
-)
-plt.xlabel('Valores de SHAP - Impacto no Modelo')
-plt.tight_layout()
-plt.savefig('../figures/shap_summary_dot.png')
-plt.show()
+relatorio_figuras = figuras.render()
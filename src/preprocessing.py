@@ -1,113 +1,38 @@
 # %%
-import pandas as pd
-import numpy as np
-
-# %%
-df_raw = pd.read_csv('../data/raw/raw_cardio_data.csv')	
-
-df_raw.drop(columns=['age', 'bp_category_encoded'], inplace=True)
-
-df_raw.rename(
-    columns={
-        'id': 'paciente_id', 
-        'gender': 'cat_genero', 
-        'height': 'vlr_altura', 
-        'weight': 'vlr_peso', 
-        'ap_hi': 'vlr_pressao_sistolica', 
-        'ap_lo': 'vlr_pressao_diastolica', 
-        'cholesterol': 'cat_colesterol',
-        'gluc': 'cat_glicose', 
-        'smoke': 'flag_fumante', 
-        'alco': 'flag_consumo_alcool', 
-        'active': 'flag_atividade_fisica', 
-        'cardio': 'flag_doenca_cardiaca', 
-        'age_years': 'nr_anos_idade', 
-        'bmi': 'vlr_imc',
-        'bp_category': 'cat_pressao_arterial'
-    }, 
-    inplace=True
-)
-
-# %%
-qtd_duplicatas = sum(df_raw['paciente_id'].duplicated())
-print(f'Quantidade de duplicatas: {qtd_duplicatas}')
-
-# %%
-
-cat_hipertensao_condicoes = [
-    df_raw['cat_pressao_arterial'] == 'Hypertension Stage 1',
-    df_raw['cat_pressao_arterial'] == 'Hypertension Stage 2',
-    df_raw['cat_pressao_arterial'] == 'Normal',
-    df_raw['cat_pressao_arterial'] == 'Elevated',
-    df_raw['cat_pressao_arterial'] == 'Hypertensive Crisis'
-]
-
-novos_valores_cat_hipertensao = [ '0.pressao_normal', '1.pressao_elevada', '2.hipertensao_nivel_1', '3.hipertensao_nivel_2', '4.crise_hipertensiva']
-
-df_raw['cat_pressao_arterial'] = np.select(cat_hipertensao_condicoes, novos_valores_cat_hipertensao, default='Checar')
-
-# %%
-
-cat_genero_condicoes = [
-    df_raw['cat_genero'] == 1,
-    df_raw['cat_genero'] == 2
-]
-novos_valores_cat_genero = ['feminino', 'masculino']
-
-df_raw['cat_genero'] = np.select(cat_genero_condicoes, novos_valores_cat_genero, default='Checar')
-
-# %%
-
-cat_colesterol_condicoes = [
-    df_raw['cat_colesterol'] == 1,
-    df_raw['cat_colesterol'] == 2,
-    df_raw['cat_colesterol'] == 3
-]
-novos_valores_cat_colesterol = ['0.colesterol_normal', '1.colesterol_acima_do_normal', '2.colesterol_muito_acima_do_normal']
-
-df_raw['cat_colesterol'] = np.select(cat_colesterol_condicoes, novos_valores_cat_colesterol, default='Checar')
-
-# %%
-
-cat_glicose_condicoes = [
-    df_raw['cat_glicose'] == 1,
-    df_raw['cat_glicose'] == 2,
-    df_raw['cat_glicose'] == 3
-]
-novos_valores_cat_glicose = ['0.glicose_normal', '1.glicose_acima_do_normal', '2.glicose_muito_acima_do_normal']
-
-df_raw['cat_glicose'] = np.select(cat_glicose_condicoes, novos_valores_cat_glicose, default='Checar')
-# %%
-
-df_raw = df_raw.astype(
-    {'cat_genero': 'object',
-     'cat_colesterol': 'object',
-     'cat_glicose': 'object'}
-)
-
-df_processed = df_raw.reindex(
-    columns=[
-        'paciente_id',
-        'nr_anos_idade', 
-        'cat_genero', 
-        'vlr_altura', 
-        'vlr_peso', 
-        'vlr_imc', 
-        'vlr_pressao_sistolica', 
-        'vlr_pressao_diastolica', 
-        'cat_pressao_arterial',
-        'cat_colesterol', 
-        'cat_glicose', 
-        'flag_fumante', 
-        'flag_consumo_alcool', 
-        'flag_atividade_fisica', 
-        'flag_doenca_cardiaca'
-    ]
-)
-
-# %%
-
-df_processed.to_csv(
-    '../data/processed/processed_cardio_data.csv', 
-    index=False
-)
\ No newline at end of file
+import ingest
+import processing
+import store
+
+# %%
+# Modo streaming: lê o arquivo bruto em chunks de tamanho fixo e anexa cada
+# chunk processado ao CSV de saída, mantendo o uso de memória constante.
+modo_streaming = False
+tamanho_chunk = 500_000
+
+# Modo ingestão: só o novo arquivo bruto é processado e anexado ao store como
+# uma partição (upsert por paciente_id, ver ingest.py); o CSV de saída e o
+# dataset acumulado não são regravados.
+modo_ingestao = False
+arquivo_ingestao = '../data/raw/novos_pacientes.csv'
+
+# %%
+# Além do CSV, cada execução grava uma nova versão do store colunar
+# (Arrow IPC) lido por train.py, predict.py e eda.py.
+if modo_ingestao:
+    ingest.ingest(arquivo_ingestao)
+else:
+    rejeitadas_path = f'{processing.RAW_PATH}.rejeitadas.csv'
+    with store.StoreWriter(source='preprocessing', rejeitadas_path=rejeitadas_path) as store_writer:
+        if modo_streaming:
+            processing.process_streaming(
+                processing.RAW_PATH,
+                processing.PROCESSED_PATH,
+                chunksize=tamanho_chunk,
+                store_writer=store_writer
+            )
+        else:
+            df_processed = processing.process_batch(
+                processing.RAW_PATH,
+                processing.PROCESSED_PATH,
+                store_writer=store_writer
+            )
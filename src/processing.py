@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+
+import perf
+
+RAW_PATH = '../data/raw/raw_cardio_data.csv'
+PROCESSED_PATH = '../data/processed/processed_cardio_data.csv'
+
+RENAME_COLUMNS = {
+    'id': 'paciente_id',
+    'gender': 'cat_genero',
+    'height': 'vlr_altura',
+    'weight': 'vlr_peso',
+    'ap_hi': 'vlr_pressao_sistolica',
+    'ap_lo': 'vlr_pressao_diastolica',
+    'cholesterol': 'cat_colesterol',
+    'gluc': 'cat_glicose',
+    'smoke': 'flag_fumante',
+    'alco': 'flag_consumo_alcool',
+    'active': 'flag_atividade_fisica',
+    'cardio': 'flag_doenca_cardiaca',
+    'age_years': 'nr_anos_idade',
+    'bmi': 'vlr_imc',
+    'bp_category': 'cat_pressao_arterial'
+}
+
+# Tabela de mapeamento por coluna: valor bruto -> categoria processada.
+# A ordem das entradas define a ordem (ordered=True) das categorias.
+CATEGORY_MAPS = {
+    # Rótulos alinhados à categoria de origem (a versão anterior trocava
+    # Normal/Elevated com os níveis de hipertensão): modelos treinados com
+    # os rótulos antigos precisam ser retreinados.
+    'cat_pressao_arterial': {
+        'Normal': '0.pressao_normal',
+        'Elevated': '1.pressao_elevada',
+        'Hypertension Stage 1': '2.hipertensao_nivel_1',
+        'Hypertension Stage 2': '3.hipertensao_nivel_2',
+        'Hypertensive Crisis': '4.crise_hipertensiva'
+    },
+    'cat_genero': {
+        1: 'feminino',
+        2: 'masculino'
+    },
+    'cat_colesterol': {
+        1: '0.colesterol_normal',
+        2: '1.colesterol_acima_do_normal',
+        3: '2.colesterol_muito_acima_do_normal'
+    },
+    'cat_glicose': {
+        1: '0.glicose_normal',
+        2: '1.glicose_acima_do_normal',
+        3: '2.glicose_muito_acima_do_normal'
+    }
+}
+
+CATEGORY_DTYPES = {
+    col: pd.CategoricalDtype(list(mapa.values()), ordered=True)
+    for col, mapa in CATEGORY_MAPS.items()
+}
+
+# Tipos explícitos do arquivo bruto: sem eles o pandas infere os tipos a cada
+# chunk (um valor vazio vira float só no chunk em que aparece) e o CSV do modo
+# streaming deixaria de ser idêntico ao do modo batch. Inteiros anuláveis
+# mantêm "90" como inteiro e gravam o vazio como vazio.
+RAW_DTYPES = {
+    'id': 'Int64',
+    'age': 'Int64',
+    'gender': 'Int64',
+    'height': 'Int64',
+    'weight': 'float64',
+    'ap_hi': 'Int64',
+    'ap_lo': 'Int64',
+    'cholesterol': 'Int64',
+    'gluc': 'Int64',
+    'smoke': 'Int64',
+    'alco': 'Int64',
+    'active': 'Int64',
+    'cardio': 'Int64',
+    'age_years': 'Int64',
+    'bmi': 'float64',
+    'bp_category': 'str',
+    'bp_category_encoded': 'Int64'
+}
+
+PROCESSED_COLUMNS = [
+    'paciente_id',
+    'nr_anos_idade',
+    'cat_genero',
+    'vlr_altura',
+    'vlr_peso',
+    'vlr_imc',
+    'vlr_pressao_sistolica',
+    'vlr_pressao_diastolica',
+    'cat_pressao_arterial',
+    'cat_colesterol',
+    'cat_glicose',
+    'flag_fumante',
+    'flag_consumo_alcool',
+    'flag_atividade_fisica',
+    'flag_doenca_cardiaca'
+]
+
+
+def map_categories(df):
+
+    # Uma única busca vetorizada por coluna: o valor bruto vira o código
+    # inteiro da categoria (-1 quando não mapeado, que resulta em NaN).
+    nao_mapeados = {}
+    for col, mapa in CATEGORY_MAPS.items():
+        codes = pd.Index(list(mapa.keys())).get_indexer(df[col])
+        nao_mapeados[col] = int((codes == -1).sum())
+        df[col] = pd.Categorical.from_codes(codes, dtype=CATEGORY_DTYPES[col])
+
+    return df, nao_mapeados
+
+
+def report_unmapped(nao_mapeados):
+
+    for col, qtd in nao_mapeados.items():
+        if qtd > 0:
+            print(f'Valores não mapeados em {col}: {qtd}')
+
+
+def read_raw_csv(path=RAW_PATH, **kwargs):
+    return pd.read_csv(path, dtype=RAW_DTYPES, **kwargs)
+
+
+def read_processed_csv(path=PROCESSED_PATH, **kwargs):
+    return pd.read_csv(path, dtype=CATEGORY_DTYPES, **kwargs)
+
+
+def process_raw(df_raw):
+
+    df_raw = df_raw.drop(columns=['age', 'bp_category_encoded']).rename(columns=RENAME_COLUMNS)
+
+    df_raw, nao_mapeados = map_categories(df_raw)
+
+    return df_raw.reindex(columns=PROCESSED_COLUMNS), nao_mapeados
+
+
+def process_batch(raw_path=RAW_PATH, processed_path=PROCESSED_PATH, store_writer=None):
+
+    with perf.timer() as tempo:
+        df_raw = read_raw_csv(raw_path)
+
+        qtd_duplicatas = sum(df_raw['id'].duplicated())
+        print(f'Quantidade de duplicatas: {qtd_duplicatas}')
+
+        df_processed, nao_mapeados = process_raw(df_raw)
+        report_unmapped(nao_mapeados)
+        if store_writer is not None:
+            # O store não aceita faltantes nas colunas inteiras: essas linhas
+            # saem antes de qualquer escrita, para o CSV e o store coincidirem
+            df_processed = store_writer.reject_invalid(df_processed)
+        df_processed.to_csv(processed_path, index=False)
+        if store_writer is not None:
+            store_writer.write(df_processed)
+
+    perf.report_throughput('Pré-processamento (batch)', len(df_processed), tempo['segundos'])
+
+    return df_processed
+
+
+def process_streaming(raw_path=RAW_PATH, processed_path=PROCESSED_PATH, chunksize=500_000, store_writer=None):
+
+    # Cada chunk passa pela mesma transformação do modo batch e é anexado ao
+    # CSV de saída; só o cabeçalho do primeiro chunk é escrito, de modo que o
+    # arquivo final é idêntico byte a byte ao gerado por process_batch.
+    qtd_linhas = 0
+    ids = []
+    nao_mapeados = dict.fromkeys(CATEGORY_MAPS, 0)
+
+    with perf.timer() as tempo:
+        with read_raw_csv(raw_path, chunksize=chunksize) as reader:
+            for i, chunk in enumerate(reader):
+                df_chunk, nao_mapeados_chunk = process_raw(chunk)
+                for col, qtd in nao_mapeados_chunk.items():
+                    nao_mapeados[col] += qtd
+                if store_writer is not None:
+                    df_chunk = store_writer.reject_invalid(df_chunk)
+                df_chunk.to_csv(
+                    processed_path,
+                    mode='w' if i == 0 else 'a',
+                    header=i == 0,
+                    index=False
+                )
+                if store_writer is not None:
+                    store_writer.write(df_chunk)
+                ids.append(df_chunk['paciente_id'].to_numpy())
+                qtd_linhas += len(df_chunk)
+
+        # Apenas os ids ficam em memória (8 bytes por linha) para a checagem de duplicatas
+        ids = np.concatenate(ids) if ids else np.array([], dtype=np.int64)
+        qtd_duplicatas = len(ids) - len(np.unique(ids))
+        print(f'Quantidade de duplicatas: {qtd_duplicatas}')
+        report_unmapped(nao_mapeados)
+
+    perf.report_throughput(f'Pré-processamento (streaming, chunks de {chunksize})', qtd_linhas, tempo['segundos'])
+
+    return qtd_linhas
@@ -0,0 +1,265 @@
+# Retreino incremental: absorve os pacientes que chegaram ao store depois do
+# treino dos modelos salvos, sem refazer a busca de hiperparâmetros.
+# Uso: python retrain.py [--queda-auc-max 0.01] [--sem-busca-completa]
+#   - os hiperparâmetros são os best_params da última busca completa;
+#   - XGBoost e LightGBM continuam o boosting do modelo salvo só com os
+#     pacientes novos; o Random Forest ganha árvores treinadas nos novos;
+#   - a Regressão Logística é reajustada partindo dos coeficientes salvos,
+#     com o solver original, nos novos mais uma amostra limitada do treino
+#     anterior (replay);
+#   - o AdaBoost continua o boosting (SAMME) nos novos, partindo dos pesos
+#     que o ensemble salvo daria a esses pacientes;
+#   - a Decision Tree não tem atualização incremental e é mantida.
+# Os pacientes novos são divididos em treino/holdout como no train.py e o
+# holdout cresce junto. Se o AUC do holdout de algum modelo cair mais que
+# queda_auc_max em relação ao AUC da busca completa, o train.py é executado.
+import argparse
+import copy
+import datetime
+import subprocess
+import sys
+import time
+
+import lightgbm
+import numpy as np
+import pandas as pd
+from sklearn import model_selection
+from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from xgboost import XGBClassifier
+
+import artifacts
+import boosting
+import fast_metrics
+import modeling
+import store
+
+RETRAIN_CONFIG = {
+    'queda_auc_max': 0.01,
+    'arvores_min': 10,
+    'holdout_size': 0.2,
+    'replay_max': 50_000
+}
+
+
+def new_patients(entrada, df):
+
+    # Pacientes do store atual que não estavam na versão usada pelo modelo
+    anteriores = store.read_processed(columns=['paciente_id'], version=entrada['dataset']['versao'])['paciente_id']
+
+    return df[~df['paciente_id'].isin(anteriores.to_numpy())]
+
+
+def split_new(novos, target=modeling.TARGET, holdout_size=RETRAIN_CONFIG['holdout_size']):
+
+    # Mesma divisão do train.py; estratificada quando as duas classes têm exemplos suficientes
+    if len(novos) < 2:
+        return novos, novos.iloc[:0]
+    estratos = novos[target] if novos[target].value_counts().min() >= 2 else None
+
+    return model_selection.train_test_split(novos, test_size=holdout_size, random_state=42, stratify=estratos)
+
+
+def _new_trees(n_atual, linhas_novas, linhas_anteriores, arvores_min):
+    # Árvores/rodadas novas proporcionais à fração de pacientes novos
+    return max(arvores_min, int(round(n_atual * linhas_novas / max(linhas_anteriores, 1))))
+
+
+def _family_estimator(model_name, best_params):
+    # Estimador da família com os hiperparâmetros escolhidos na última busca completa
+    estimator = modeling.build_models()[model_name][0]
+    return estimator.set_params(**{key.removeprefix('classifier__'): value for key, value in best_params.items()})
+
+
+def update_classifier(model_name, classifier, best_params, X_novo, y_novo, historico,
+                      linhas_anteriores, config=RETRAIN_CONFIG):
+
+    # Devolve o classificador atualizado e a forma de atualização, ou
+    # (classifier, 'mantido') quando a família não tem atualização incremental.
+    # historico(n) devolve (X, y) de uma amostra de até n linhas do treino
+    # anterior: só a Regressão Logística o usa, e o custo de todas as famílias
+    # é limitado pelos novos (mais replay_max linhas)
+    if len(np.unique(y_novo)) < 2 and not isinstance(classifier, LogisticRegression):
+        return classifier, 'mantido (pacientes novos de uma só classe)'
+
+    if isinstance(classifier, XGBClassifier):
+        booster = classifier.get_booster()
+        rodadas = _new_trees(booster.num_boosted_rounds(), len(y_novo), linhas_anteriores, config['arvores_min'])
+        novo = _family_estimator(model_name, best_params).set_params(n_estimators=rodadas)
+        novo.fit(X_novo, y_novo, xgb_model=booster)
+        return novo, f'boosting continuado (+{rodadas} rodadas)'
+
+    if isinstance(classifier, artifacts.LGBMBoosterClassifier):
+        rodadas = _new_trees(classifier.booster.current_iteration(), len(y_novo), linhas_anteriores, config['arvores_min'])
+        params = boosting.lgbm_params(_family_estimator(model_name, best_params))
+        dataset = lightgbm.Dataset(X_novo, y_novo, params={'feature_pre_filter': False})
+        booster = lightgbm.train(params, dataset, num_boost_round=rodadas, init_model=classifier.booster)
+        return artifacts.LGBMBoosterClassifier(booster), f'boosting continuado (+{rodadas} rodadas)'
+
+    if isinstance(classifier, RandomForestClassifier):
+        arvores = _new_trees(classifier.n_estimators, len(y_novo), linhas_anteriores, config['arvores_min'])
+        novo = copy.deepcopy(classifier).set_params(warm_start=True, n_estimators=classifier.n_estimators + arvores)
+        novo.fit(X_novo, y_novo)
+        return novo.set_params(warm_start=False), f'+{arvores} árvores'
+
+    if isinstance(classifier, LogisticRegression):
+        # Solver original (o modelo não muda de formulação) sobre os novos e o
+        # replay; o peso do replay (linhas anteriores / tamanho da amostra)
+        # preserva a proporção entre histórico e novos na função objetivo. O
+        # liblinear ignora o warm start e reajusta do zero nesse mesmo conjunto.
+        X_replay, y_replay = historico(config['replay_max'])
+        pesos = np.r_[np.ones(len(y_novo)), np.full(len(y_replay), linhas_anteriores / max(len(y_replay), 1))]
+        novo = copy.deepcopy(classifier).set_params(warm_start=True)
+        novo.fit(pd.concat([X_novo, X_replay]), np.r_[y_novo, y_replay], sample_weight=pesos)
+        forma = 'reajuste' if novo.solver == 'liblinear' else 'warm start'
+        return novo.set_params(warm_start=False), f'{forma} ({novo.solver}, replay de {len(y_replay)} linhas, {novo.n_iter_.max()} iterações)'
+
+    if isinstance(classifier, AdaBoostClassifier):
+        # SAMME continuado: cada paciente novo começa com o peso que teria
+        # depois das rodadas salvas (exp da soma dos alphas dos estimadores
+        # que o erram); um AdaBoost com esses pesos iniciais faz as rodadas
+        # seguintes, que são anexadas ao ensemble
+        n_atual = len(classifier.estimators_)
+        alphas = classifier.estimator_weights_[:n_atual]
+        # (os estimadores internos são ajustados sobre arrays, sem nomes de colunas)
+        X_array = np.asarray(X_novo)
+        erros = np.column_stack([estimador.predict(X_array) != y_novo for estimador in classifier.estimators_])
+        pesos = np.exp(erros @ alphas)
+        rodadas = _new_trees(n_atual, len(y_novo), linhas_anteriores, config['arvores_min'])
+        extra = _family_estimator(model_name, best_params).set_params(n_estimators=rodadas)
+        extra.fit(X_novo, y_novo, sample_weight=pesos / pesos.sum())
+        n_extra = len(extra.estimators_)
+        novo = copy.deepcopy(classifier).set_params(n_estimators=n_atual + n_extra)
+        novo.estimators_ = [*novo.estimators_, *extra.estimators_]
+        novo.estimator_weights_ = np.r_[alphas, extra.estimator_weights_[:n_extra]]
+        novo.estimator_errors_ = np.r_[classifier.estimator_errors_[:n_atual], extra.estimator_errors_[:n_extra]]
+        return novo, f'boosting continuado (+{n_extra} rodadas)'
+
+    return classifier, 'mantido (sem atualização incremental)'
+
+
+def replay_sample(anteriores, n, preprocessor, features, target=modeling.TARGET):
+
+    # Amostra de até n linhas do treino anterior, já pré-processada
+    amostra = anteriores.sample(min(n, len(anteriores)), random_state=42)
+
+    return preprocessor.transform(amostra[features]), amostra[target].to_numpy()
+
+
+def holdout_auc(pipeline, features, df_holdout, target=modeling.TARGET):
+    return fast_metrics.roc_auc(df_holdout[target].to_numpy(), pipeline.predict_proba(df_holdout[features])[:, 1])
+
+
+def retrain(args):
+
+    registry = artifacts.load_artifacts(args.artefatos)
+    referencia = registry[next(iter(registry))]
+    if 'dataset' not in referencia:
+        print('Modelos salvos sem a versão do dataset de treino: é preciso rodar o train.py')
+        return run_full_search(args)
+
+    # Uma leitura do manifest: os dados e a versão registrada nos modelos são
+    # os mesmos mesmo que o ingest.py grave uma versão durante o retreino
+    manifest = store.read_manifest()
+    df = store.read_processed(version=manifest['version'])
+    target = modeling.TARGET
+
+    inicio_total = time.perf_counter()
+    novos = new_patients(referencia, df)
+    if novos.empty:
+        print(f"Nenhum paciente novo desde a versão {referencia['dataset']['versao']} do dataset")
+        return None
+
+    novos_treino, novos_holdout = split_new(novos, target, args.holdout_size)
+    holdout_ids = np.concatenate([referencia['holdout']['paciente_id'].to_numpy(), novos_holdout['paciente_id'].to_numpy()])
+    no_holdout = df['paciente_id'].isin(holdout_ids)
+    df_holdout = df[no_holdout]
+    linhas_anteriores = int((~no_holdout).sum()) - len(novos_treino)
+
+    print(f"Versão {referencia['dataset']['versao']} -> {manifest['version']}: {len(novos)} pacientes novos "
+          f"({len(novos_treino)} treino, {len(novos_holdout)} holdout) | {linhas_anteriores} já no treino")
+
+    anteriores = df[~no_holdout & ~df['paciente_id'].isin(novos_treino['paciente_id'].to_numpy())]
+
+    results, relatorio = {}, []
+    for model_name, entrada in registry.items():
+        inicio = time.perf_counter()
+        features = entrada['features']
+        pipeline = entrada['model']
+        preprocessor = pipeline.named_steps['preprocessor']
+
+        # O pré-processador ajustado é mantido: o espaço de features do modelo não muda
+        classifier, acao = update_classifier(
+            model_name,
+            pipeline.named_steps['classifier'],
+            entrada['best_params'],
+            preprocessor.transform(novos_treino[features]),
+            novos_treino[target].to_numpy(),
+            lambda n: replay_sample(anteriores, n, preprocessor, features, target),
+            linhas_anteriores,
+            dict(RETRAIN_CONFIG, arvores_min=args.arvores_min)
+        )
+        atualizado = artifacts.loaded_pipeline(preprocessor, classifier)
+        segundos = time.perf_counter() - inicio
+
+        auc_antes = holdout_auc(pipeline, features, df_holdout, target)
+        auc_depois = holdout_auc(atualizado, features, df_holdout, target)
+        relatorio.append({
+            'modelo': model_name,
+            'acao': acao,
+            'segundos': segundos,
+            'auc_referencia': entrada['auc_referencia'],
+            'auc_holdout_antes': auc_antes,
+            'auc_holdout_depois': auc_depois,
+            'degradado': auc_depois < entrada['auc_referencia'] - args.queda_auc_max
+        })
+
+        y_proba = atualizado.predict_proba(df_holdout[features])
+        results[model_name] = {
+            **{key: entrada[key] for key in entrada},
+            'model': atualizado,
+            'test_metrics': modeling.report_metrics(df_holdout[target].to_numpy(), y_proba, cohort=entrada['threshold']['valor']),
+            'dataset': {'versao': manifest['version'], 'sha256': manifest['sha256']},
+            'holdout': df_holdout[['paciente_id', target]].reset_index(drop=True),
+            'retreino': {'tipo': 'incremental', 'acao': acao, 'linhas_novas': len(novos_treino), 'segundos': segundos},
+            'dt_training': datetime.datetime.now()
+        }
+
+    relatorio = pd.DataFrame(relatorio)
+    print(relatorio.round(4).to_string(index=False))
+    print(f'Retreino incremental em {time.perf_counter() - inicio_total:.1f}s')
+
+    if relatorio['degradado'].any():
+        print(f"AUC do holdout caiu mais de {args.queda_auc_max} em: {', '.join(relatorio.loc[relatorio['degradado'], 'modelo'])}")
+        return run_full_search(args)
+
+    artifacts.save_artifacts(results, args.artefatos)
+
+    return relatorio
+
+
+def run_full_search(args):
+
+    # Gate: a busca completa (train.py) substitui os modelos salvos
+    if args.sem_busca_completa:
+        print('Busca completa necessária (desativada por --sem-busca-completa); modelos salvos mantidos')
+        return None
+
+    print('Executando a busca completa (train.py)')
+    subprocess.run([sys.executable, 'train.py'], check=True)
+
+    return None
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Retreino incremental com os pacientes novos do store')
+    parser.add_argument('--artefatos', default=artifacts.ARTIFACTS_DIR)
+    parser.add_argument('--queda-auc-max', type=float, default=RETRAIN_CONFIG['queda_auc_max'],
+                        help='queda tolerada do AUC do holdout antes de disparar a busca completa')
+    parser.add_argument('--arvores-min', type=int, default=RETRAIN_CONFIG['arvores_min'])
+    parser.add_argument('--holdout-size', type=float, default=RETRAIN_CONFIG['holdout_size'])
+    parser.add_argument('--sem-busca-completa', action='store_true', help='só relata quando a busca completa seria necessária')
+    args = parser.parse_args()
+
+    retrain(args)
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import as_completed
+
+import pandas as pd
+from joblib import parallel_config
+from joblib.externals import loky
+from threadpoolctl import threadpool_limits
+
+import checkpoint
+import fast_metrics
+
+TIMELINE_PATH = '../data/predicted/training_timeline.jsonl'
+TIMELINE_CSV_PATH = '../data/predicted/training_timeline.csv'
+SEARCH_LOG_PATH = '../data/predicted/search_log.csv'
+
+# Parâmetro de threads internas dos estimadores multi-thread
+THREAD_PARAMS = {
+    'XGBClassifier': 'n_jobs',
+    'LGBMClassifier': 'n_jobs',
+    'RandomForestClassifier': 'n_jobs'
+}
+
+
+def _log_event(path, evento):
+    # Linhas curtas com O_APPEND: escritas concorrentes de vários processos não se intercalam
+    with open(path, 'a') as f:
+        f.write(json.dumps(evento, default=str) + '\n')
+
+
+class TimelineScorer:
+
+    # Scorer de AUC que registra, para cada candidato/fold avaliado, a família,
+    # o processo que o executou e o instante de término
+    def __init__(self, family, path=TIMELINE_PATH):
+        self.family = family
+        self.path = path
+
+    def __call__(self, estimator, X, y):
+        return self.score_proba(estimator, y, estimator.predict_proba(X)[:, 1])
+
+    def score_proba(self, estimator, y, proba):
+
+        score = fast_metrics.roc_auc(y, proba)
+
+        classifier = estimator.named_steps['classifier'] if hasattr(estimator, 'named_steps') else estimator
+        params = json.dumps(classifier.get_params(), sort_keys=True, default=str)
+        _log_event(self.path, {
+            'tipo': 'candidato',
+            'familia': self.family,
+            'candidato': hashlib.sha1(params.encode()).hexdigest()[:10],
+            'pid': os.getpid(),
+            'fim': time.time(),
+            'score': score
+        })
+
+        return score
+
+
+def _estimated_cost(models, search_log_path=SEARCH_LOG_PATH):
+
+    # Famílias mais caras na última execução registrada começam primeiro
+    if not os.path.exists(search_log_path):
+        return {name: 0.0 for name in models}
+
+    log = pd.read_csv(search_log_path).groupby('modelo')['tempo_busca_s'].last()
+
+    return {name: float(log.get(name, 0.0)) for name in models}
+
+
+def plan_cores(models, core_budget=None, max_concurrent=None, estimator_threads=4):
+
+    # O orçamento é dividido igualmente entre as famílias que rodam ao mesmo
+    # tempo; dentro de cada uma, os núcleos são repartidos entre workers da
+    # busca e threads internas do estimador, sem ultrapassar o orçamento.
+    core_budget = core_budget or os.cpu_count()
+    n_slots = max(1, min(len(models), max_concurrent or len(models), core_budget))
+    cores_slot = max(1, core_budget // n_slots)
+
+    plano = {}
+    for name, (model, _) in models.items():
+        threads = min(estimator_threads, cores_slot) if type(model).__name__ in THREAD_PARAMS else 1
+        plano[name] = {
+            'nucleos': cores_slot,
+            'search_jobs': max(1, cores_slot // threads),
+            'estimator_threads': threads
+        }
+
+    return plano, n_slots
+
+
+def family_log_path(search_log_path, model_name):
+    return f"{search_log_path}.{model_name.lower().replace(' ', '_')}"
+
+
+def merge_search_logs(model_names, search_log_path=SEARCH_LOG_PATH):
+
+    # Os processos das famílias gravam logs separados (sem disputa pelo
+    # cabeçalho); o processo principal os anexa ao log único
+    for model_name in model_names:
+        path = family_log_path(search_log_path, model_name)
+        if os.path.exists(path):
+            log = pd.read_csv(path)
+            log.to_csv(search_log_path, mode='a', header=not os.path.exists(search_log_path), index=False)
+            os.remove(path)
+
+
+def _run_family(train_fn, model_name, model, param_grid, plano, timeline_path, checkpoint_dir, search_log_path):
+
+    threads = plano['estimator_threads']
+    thread_param = THREAD_PARAMS.get(type(model).__name__)
+    if thread_param:
+        model.set_params(**{thread_param: threads})
+
+    inicio = time.time()
+    with threadpool_limits(limits=threads), parallel_config(backend='loky', inner_max_num_threads=threads):
+        result = train_fn(
+            model_name, model, param_grid,
+            search_jobs=plano['search_jobs'],
+            scoring=TimelineScorer(model_name, timeline_path),
+            checkpoint_path=checkpoint.candidates_path(checkpoint_dir, model_name) if checkpoint_dir else None,
+            search_log_path=family_log_path(search_log_path, model_name)
+        )
+
+    if checkpoint_dir:
+        checkpoint.save_family(checkpoint_dir, model_name, result)
+
+    _log_event(timeline_path, {
+        'tipo': 'familia',
+        'familia': model_name,
+        'pid': os.getpid(),
+        'inicio': inicio,
+        'fim': time.time(),
+        **plano
+    })
+
+    return model_name, result
+
+
+def run_families(train_fn, models, core_budget=None, max_concurrent=None, estimator_threads=4,
+                 timeline_path=TIMELINE_PATH, checkpoint_dir=None, search_log_path=SEARCH_LOG_PATH):
+
+    # Cada família roda em um processo próprio e abre seus próprios workers
+    # de busca. Os processos são interpretadores novos (loky: fork + exec),
+    # não cópias por fork do principal, que a essa altura já inicializou o
+    # OpenMP do XGBoost/LightGBM na triagem; train_fn segue por cloudpickle.
+    # Com checkpoint_dir, famílias já concluídas em uma execução anterior
+    # são carregadas do disco em vez de treinadas novamente.
+    results = {}
+    if checkpoint_dir:
+        for name in models:
+            result = checkpoint.load_family(checkpoint_dir, name)
+            if result is not None:
+                print(f'Retomado do checkpoint: {name}')
+                results[name] = result
+
+    pendentes = {name: spec for name, spec in models.items() if name not in results}
+    if not pendentes:
+        return {name: results[name] for name in models}
+
+    plano, n_slots = plan_cores(pendentes, core_budget, max_concurrent, estimator_threads)
+    custo = _estimated_cost(pendentes)
+    ordem = sorted(pendentes, key=lambda name: -custo[name])
+
+    if os.path.exists(timeline_path):
+        os.remove(timeline_path)
+
+    print(f'Orçamento de {core_budget or os.cpu_count()} núcleos, {n_slots} famílias simultâneas')
+    for name in ordem:
+        print(f"  {name}: {plano[name]['search_jobs']} workers x {plano[name]['estimator_threads']} threads")
+
+    with loky.ProcessPoolExecutor(max_workers=n_slots) as pool:
+        futures = [
+            pool.submit(_run_family, train_fn, name, models[name][0], models[name][1], plano[name],
+                        timeline_path, checkpoint_dir, search_log_path)
+            for name in ordem
+        ]
+        for future in as_completed(futures):
+            model_name, result = future.result()
+            print(f'Concluído: {model_name}')
+            results[model_name] = result
+            merge_search_logs([model_name], search_log_path)
+
+    write_timeline(timeline_path)
+
+    return {name: results[name] for name in models}
+
+
+def write_timeline(timeline_path=TIMELINE_PATH, csv_path=TIMELINE_CSV_PATH):
+
+    with open(timeline_path) as f:
+        eventos = pd.DataFrame([json.loads(linha) for linha in f])
+
+    familias = eventos[eventos['tipo'] == 'familia'].set_index('familia')
+    candidatos = eventos[eventos['tipo'] == 'candidato'].sort_values('fim').copy()
+
+    # Cada worker executa seus ajustes em sequência: o início de uma avaliação
+    # é o fim da anterior no mesmo processo (ou o início da família)
+    candidatos['inicio'] = candidatos.groupby(['familia', 'pid'])['fim'].shift()
+    candidatos['inicio'] = candidatos['inicio'].fillna(candidatos['familia'].map(familias['inicio']))
+
+    timeline = pd.concat([familias.reset_index(), candidatos], ignore_index=True)
+    t0 = timeline['inicio'].min()
+    timeline['inicio'] -= t0
+    timeline['fim'] -= t0
+    timeline = timeline.sort_values(['inicio', 'familia'])
+    timeline.to_csv(csv_path, index=False)
+
+    print(familias.assign(inicio=familias['inicio'] - t0, fim=familias['fim'] - t0)
+          [['pid', 'nucleos', 'search_jobs', 'estimator_threads', 'inicio', 'fim']].round(1))
+
+    return timeline
@@ -0,0 +1,34 @@
+# Ponto de entrada enxuto para escorar pacientes com os modelos salvos por
+# train.py. Importa só o que a inferência usa (numpy, pandas, o manifest e o
+# formato nativo do classificador): matplotlib, seaborn, shap e os módulos de
+# treino não são carregados. O caminho compilado só é importado se pedido.
+# Uso: import scoring; modelo = scoring.load_model('XGBoost'); scoring.predict_proba(modelo, df)
+import pandas as pd
+
+import artifacts
+
+# Módulos que um processo de escoragem não deve carregar (verificado por benchmarks.py startup)
+HEAVY_MODULES = ('matplotlib', 'seaborn', 'shap', 'modeling', 'plots', 'explain', 'figures', 'store')
+
+
+def load_model(model_name='XGBoost', artifacts_dir=artifacts.ARTIFACTS_DIR):
+
+    # Entrada do manifest (features, threshold, métricas); o pipeline é lido
+    # do disco no primeiro acesso a ['model']
+    return artifacts.load_artifacts(artifacts_dir)[model_name]
+
+
+def predict_proba(entrada, df):
+    return entrada['model'].predict_proba(df[entrada['features']])[:, 1]
+
+
+def records_score_fn(entrada, use_compiled=False):
+
+    # Função registros (lista de dicts) -> probabilidades, para o server.py
+    if use_compiled:
+        import compiled
+        return compiled.CompiledScorer(entrada['model']).predict_proba_many
+
+    pipeline, features = entrada['model'], entrada['features']
+
+    return lambda records: pipeline.predict_proba(pd.DataFrame(records)[features])[:, 1]
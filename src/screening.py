@@ -0,0 +1,141 @@
+# Triagem das famílias de modelo antes da busca completa do train.py: cada
+# família avalia poucos candidatos (os primeiros da mesma amostragem da busca
+# completa) em poucos folds sobre uma subamostra estratificada do treino. As
+# famílias são ordenadas pelo AUC médio de CV do melhor candidato, com
+# intervalo de confiança pelos folds; só as que alcançam a margem do líder vão
+# para a busca completa. As decisões e o tempo economizado estimado ficam em
+# SCREENING_LOG_PATH.
+import datetime
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn import model_selection
+from sklearn.base import clone
+
+import modeling
+import search as search_strategies
+
+SCREENING_LOG_PATH = '../data/predicted/screening_log.csv'
+
+# Uma família segue para a busca completa se o limite superior do seu AUC
+# (média + z * erro padrão entre folds) for >= AUC médio do líder - margem_auc.
+# As de sempre_manter (usadas pelo predict.py, batch_score.py e server.py)
+# seguem mesmo fora da margem. Com até amostra_max linhas de treino a triagem
+# não roda (não haveria subamostra)
+SCREENING_CONFIG = {
+    'ativa': True,
+    'sempre_manter': ['XGBoost'],
+    'amostra_max': 20_000,
+    'n_iter': 8,
+    'cv': 3,
+    'margem_auc': 0.01,
+    'z': 1.96
+}
+
+
+def stratified_sample(X, y, amostra_max, seed=modeling.SEED):
+
+    if len(X) <= amostra_max:
+        return X, y
+    X_amostra, _, y_amostra, _ = model_selection.train_test_split(
+        X, y, train_size=amostra_max, stratify=y, random_state=seed
+    )
+
+    return X_amostra, y_amostra
+
+
+def _full_search_estimate(model_name, segundos, fator, n_iter, search_log_path=search_strategies.SEARCH_LOG_PATH):
+
+    # Última busca registrada da família, escalada para n_iter candidatos;
+    # sem histórico, a triagem extrapolada pela razão de avaliações x linhas
+    if os.path.exists(search_log_path):
+        log = pd.read_csv(search_log_path)
+        historico = log[log['modelo'] == model_name]
+        if not historico.empty:
+            ultima = historico.iloc[-1]
+            return float(ultima['tempo_busca_s'] * n_iter / ultima['qtd_avaliacoes']), 'histórico'
+
+    return segundos * fator, 'extrapolado'
+
+
+def rank_families(models, preprocessor, X, y, config=SCREENING_CONFIG,
+                  search_config=search_strategies.SEARCH_CONFIG, seed=modeling.SEED):
+
+    # Sem early stopping: com ele, XGBoost e LightGBM parariam no mesmo fold
+    # em que são avaliados e sairiam favorecidos no ranking
+    X_amostra, y_amostra = stratified_sample(X, y, config['amostra_max'], seed)
+    triagem_config = dict(search_config, strategy='random', n_iter=config['n_iter'], cv=config['cv'],
+                          early_stopping_rounds=None)
+    fator = (search_config['n_iter'] * search_config['cv'] * len(X)) / (config['n_iter'] * config['cv'] * len(X_amostra))
+
+    print(f"Triagem: {config['n_iter']} candidatos x {config['cv']} folds em {len(X_amostra)} linhas por família")
+
+    ranking = []
+    for model_name, (model, param_grid) in models.items():
+        pipeline = modeling.build_pipeline(clone(preprocessor), clone(model))
+        search = search_strategies.build_search(pipeline, param_grid, config=triagem_config, verbose=0, random_state=seed)
+
+        inicio = time.perf_counter()
+        search.fit(X_amostra, y_amostra)
+        segundos = time.perf_counter() - inicio
+
+        folds = np.array([search.cv_results_[f'split{k}_test_score'][search.best_index_] for k in range(config['cv'])])
+        erro = folds.std(ddof=1) / np.sqrt(len(folds))
+        estimativa, origem = _full_search_estimate(model_name, segundos, fator, search_config['n_iter'])
+        ranking.append({
+            'modelo': model_name,
+            'auc_medio': folds.mean(),
+            'erro_padrao': erro,
+            'limite_inferior': folds.mean() - config['z'] * erro,
+            'limite_superior': folds.mean() + config['z'] * erro,
+            'segundos_triagem': segundos,
+            'busca_completa_estimada_s': estimativa,
+            'origem_estimativa': origem
+        })
+
+    ranking = pd.DataFrame(ranking).sort_values('auc_medio', ascending=False).reset_index(drop=True)
+    lider = ranking['auc_medio'].iloc[0]
+    ranking['distancia_lider'] = lider - ranking['auc_medio']
+    na_margem = ranking['limite_superior'] >= lider - config['margem_auc']
+    ranking['decisao'] = np.where(na_margem, 'margem', np.where(ranking['modelo'].isin(config['sempre_manter']), 'sempre_manter', 'podada'))
+    ranking['mantida'] = ranking['decisao'] != 'podada'
+
+    return ranking
+
+
+def log_screening(ranking, config=SCREENING_CONFIG, path=SCREENING_LOG_PATH):
+
+    podadas = ranking[~ranking['mantida']]
+    triagem_s = ranking['segundos_triagem'].sum()
+    economizado = podadas['busca_completa_estimada_s'].sum() - triagem_s
+
+    print(ranking[['modelo', 'auc_medio', 'limite_inferior', 'limite_superior', 'distancia_lider',
+                   'segundos_triagem', 'decisao']].round(4).to_string(index=False))
+    for _, linha in podadas.iterrows():
+        print(f"Podada: {linha['modelo']} (AUC {linha['auc_medio']:.4f}, limite superior {linha['limite_superior']:.4f} "
+              f"< líder - margem {ranking['auc_medio'].iloc[0] - config['margem_auc']:.4f}) | busca completa evitada "
+              f"~{linha['busca_completa_estimada_s']:.0f}s ({linha['origem_estimativa']})")
+    print(f'Triagem em {triagem_s:.1f}s | {len(podadas)} de {len(ranking)} famílias podadas | '
+          f'tempo economizado estimado: {economizado:.0f}s')
+
+    registro = ranking.assign(data=datetime.datetime.now().isoformat(), margem_auc=config['margem_auc'])
+    registro.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+
+def screen_families(models, preprocessor, X, y, config=SCREENING_CONFIG,
+                    search_config=search_strategies.SEARCH_CONFIG, seed=modeling.SEED):
+
+    # Devolve o subconjunto de models que segue para a busca completa. Com o
+    # treino já dentro de amostra_max, a triagem rodaria sobre os mesmos dados
+    # da busca completa e custaria quase tanto quanto ela: todas seguem
+    if len(X) <= config['amostra_max']:
+        print(f"Triagem pulada: {len(X)} linhas <= amostra_max ({config['amostra_max']}); todas as famílias seguem")
+        return models
+
+    ranking = rank_families(models, preprocessor, X, y, config, search_config, seed)
+    log_screening(ranking, config)
+    mantidas = set(ranking.loc[ranking['mantida'], 'modelo'])
+
+    return {model_name: spec for model_name, spec in models.items() if model_name in mantidas}
@@ -0,0 +1,447 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import lightgbm
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn import model_selection
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.utils.validation import check_memory
+from xgboost import XGBClassifier
+from lightgbm import LGBMClassifier
+
+import boosting
+import checkpoint
+import fast_metrics
+
+SEARCH_LOG_PATH = '../data/predicted/search_log.csv'
+
+# Estratégias de busca de hiperparâmetros:
+#   'random'  -> RandomizedSearchCV com orçamento fixo (n_iter candidatos x cv folds)
+#   'halving' -> HalvingRandomSearchCV: todos os candidatos começam com pouco
+#                recurso e só o melhor 1/factor é promovido à rodada seguinte.
+#                O recurso é o n_estimators quando a família o tem no espaço de
+#                busca e o número de amostras nos demais casos.
+# Na estratégia 'random', o FoldCachedSearchCV substitui o RandomizedSearchCV
+# quando há early stopping (XGBoost e LightGBM, com early_stopping_rounds
+# definido) ou checkpoint por candidato; sem nenhum dos dois, a busca
+# original é usada. Com native_datasets, o FoldCachedSearchCV treina XGBoost
+# e LightGBM pela API nativa sobre datasets construídos uma vez por bloco de
+# candidatos de cada fold (ver boosting.py).
+SEARCH_CONFIG = {
+    'strategy': 'random',
+    'n_iter': 100,
+    'cv': 5,
+    'factor': 3,
+    'min_estimators': 100,
+    'early_stopping_rounds': 50,
+    'native_datasets': True
+}
+
+BOOSTED_CLASSIFIERS = (XGBClassifier, LGBMClassifier)
+
+
+def _classifier_params(params):
+    return {key.removeprefix('classifier__'): value for key, value in params.items()}
+
+
+def _fit_candidate(estimator, params, X_train, y_train, X_val, y_val, early_stopping_rounds=None, scoring=None):
+
+    estimator = clone(estimator).set_params(**_classifier_params(params))
+    best_iteration = np.nan
+
+    # Com early stopping, o fold de validação é o eval set: o treino para
+    # quando a log-loss não melhora por early_stopping_rounds iterações
+    inicio = time.perf_counter()
+    if early_stopping_rounds and isinstance(estimator, LGBMClassifier):
+        estimator.fit(
+            X_train, y_train,
+            eval_set=[(X_val, y_val)],
+            callbacks=[lightgbm.early_stopping(early_stopping_rounds, verbose=False)]
+        )
+        best_iteration = estimator.best_iteration_ or estimator.n_estimators
+    elif early_stopping_rounds and isinstance(estimator, XGBClassifier):
+        estimator.set_params(early_stopping_rounds=early_stopping_rounds)
+        estimator.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+        best_iteration = estimator.best_iteration + 1
+    else:
+        estimator.fit(X_train, y_train)
+    fit_time = time.perf_counter() - inicio
+
+    # As probabilidades do fold de validação são calculadas uma vez: servem
+    # ao score e viram as predições out-of-fold do candidato vencedor.
+    # Scorers com score_proba (ex.: scheduler.TimelineScorer) as reaproveitam.
+    inicio = time.perf_counter()
+    proba = estimator.predict_proba(X_val)[:, 1]
+    score = _score(scoring, estimator, X_val, y_val, proba)
+    score_time = time.perf_counter() - inicio
+
+    # A construção do dataset da biblioteca fica dentro do fit_time
+    return {'score': score, 'best_iteration': best_iteration, 'fit_time': fit_time, 'score_time': score_time,
+            'dataset_time': np.nan, 'proba': proba.astype(np.float32)}
+
+
+def _score(scoring, estimator, X_val, y_val, proba):
+
+    if scoring is None or scoring is fast_metrics.auc_scorer:
+        return fast_metrics.roc_auc(y_val, proba)
+    if hasattr(scoring, 'score_proba'):
+        return scoring.score_proba(estimator, y_val, proba)
+
+    return scoring(estimator, X_val, y_val)
+
+
+def _scores_from_proba(scoring):
+    # O treino nativo não produz um estimador do sklearn ajustado: só serve a scorers que partem das probabilidades
+    return scoring is None or scoring is fast_metrics.auc_scorer or hasattr(scoring, 'score_proba')
+
+
+def _fit_native_candidate(estimator, params, cache, fold, early_stopping_rounds=None, scoring=None):
+
+    # Mesmo registro do _fit_candidate, treinando pela API nativa sobre os
+    # datasets do fold (construídos só na primeira avaliação do fold que usa
+    # o cache). fit_time passa a ser só o boosting; a construção vai para dataset_time
+    estimator = clone(estimator).set_params(**_classifier_params(params))
+    datasets, dataset_time = boosting.fold_datasets(cache, estimator, fold)
+    _, _, X_val, y_val = fold
+
+    inicio = time.perf_counter()
+    proba, best_iteration, _ = boosting.fit_predict(estimator, datasets, X_val, early_stopping_rounds)
+    fit_time = time.perf_counter() - inicio
+
+    # O estimador (não ajustado) só leva os parâmetros do candidato ao scorer
+    inicio = time.perf_counter()
+    score = _score(scoring, estimator, X_val, y_val, proba)
+    score_time = time.perf_counter() - inicio
+
+    return {'score': score, 'best_iteration': best_iteration, 'fit_time': fit_time, 'score_time': score_time,
+            'dataset_time': dataset_time, 'proba': proba.astype(np.float32)}
+
+
+def _transform_fold(preprocessor, X_train, y_train, X_val):
+
+    X_train_t = np.asarray(preprocessor.fit_transform(X_train, y_train), dtype=np.float64)
+    X_val_t = np.asarray(preprocessor.transform(X_val), dtype=np.float64)
+
+    return X_train_t, X_val_t
+
+
+class FoldCachedSearchCV:
+
+    # Busca aleatória equivalente ao RandomizedSearchCV (mesmos candidatos do
+    # ParameterSampler, mesmos folds, AUC) sobre um Pipeline com os passos
+    # 'preprocessor' e 'classifier':
+    #   - o pré-processamento é ajustado uma vez por fold e reaproveitado por
+    #     todos os candidatos (e, com o memory do pipeline, pelas demais
+    #     famílias, via cache em disco);
+    #   - com early_stopping_rounds, XGBoost/LightGBM param no fold de
+    #     validação e o modelo final é reajustado com a média das melhores
+    #     iterações do candidato vencedor;
+    #   - com checkpoint_path, cada avaliação (candidato, fold) concluída é
+    #     gravada em disco e uma busca interrompida retoma só o que faltou;
+    #   - as probabilidades de validação do candidato vencedor ficam em
+    #     oof_proba_ (predições out-of-fold de todo o conjunto de treino);
+    #   - com native_datasets, XGBoost/LightGBM treinam pela API nativa sobre
+    #     datasets construídos uma vez por bloco de candidatos de cada fold
+    #     (um bloco por worker, ver boosting.py); o tempo de construção vs.
+    #     boosting fica em native_report_.
+    def __init__(self, pipeline, param_distributions, n_iter=100, cv=5, early_stopping_rounds=None,
+                 scoring=None, checkpoint_path=None, native_datasets=False, n_jobs=-1, verbose=1, random_state=None):
+        self.pipeline = pipeline
+        self.param_distributions = param_distributions
+        self.n_iter = n_iter
+        self.cv = cv
+        self.early_stopping_rounds = early_stopping_rounds
+        self.scoring = scoring
+        self.checkpoint_path = checkpoint_path
+        self.native_datasets = native_datasets
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+        self.random_state = random_state
+
+    def _fold_matrices(self, X, y, splits):
+
+        # Com o memory do pipeline, as matrizes de cada fold ficam no cache em
+        # disco e são reaproveitadas pelas demais famílias de modelo (que
+        # rodam em outros processos) sobre os mesmos dados e folds
+        transform = _transform_fold
+        if self.pipeline.memory is not None:
+            transform = check_memory(self.pipeline.memory).cache(_transform_fold)
+
+        folds = []
+        for train_idx, val_idx in splits:
+            X_train, X_val = transform(
+                clone(self.pipeline.named_steps['preprocessor']),
+                X.iloc[train_idx], y.iloc[train_idx], X.iloc[val_idx]
+            )
+            folds.append((X_train, y.iloc[train_idx].to_numpy(), X_val, y.iloc[val_idx].to_numpy()))
+
+        return folds
+
+    def fit(self, X, y):
+
+        candidates = list(model_selection.ParameterSampler(
+            self.param_distributions, self.n_iter, random_state=self.random_state
+        ))
+        chaves = [checkpoint.params_key(params) for params in candidates]
+        cv = model_selection.check_cv(self.cv, y, classifier=True)
+        splits = list(cv.split(X, y))
+        self.n_splits_ = len(splits)
+
+        log = checkpoint.CandidateLog(self.checkpoint_path)
+        concluidos = log.load()
+        pendentes = [(i, k) for i in range(len(candidates)) for k in range(self.n_splits_)
+                     if (chaves[i], k) not in concluidos]
+
+        if self.verbose:
+            print(f'Fitting {self.n_splits_} folds for each of {len(candidates)} candidates, '
+                  f'totalling {self.n_splits_ * len(candidates)} fits'
+                  + (f' ({len(pendentes)} pendentes, demais retomados do checkpoint)' if len(pendentes) < self.n_splits_ * len(candidates) else ''))
+
+        folds = None
+        estimator = self.pipeline.named_steps['classifier']
+        self._native = bool(self.native_datasets) and boosting.supports(estimator) and _scores_from_proba(self.scoring)
+        probas = {}
+        registros = []
+        if pendentes:
+            folds = self._fold_matrices(X, y, splits)
+
+            saida = Parallel(n_jobs=self.n_jobs, return_as='generator_unordered')(
+                delayed(self._evaluate_block)(estimator, [(i, candidates[i], chaves[i]) for i in bloco], k, folds[k], log)
+                for k, bloco in self._blocks(pendentes)
+            )
+            for bloco in saida:
+                for registro in bloco:
+                    probas[(registro['candidato'], registro['fold'])] = registro.pop('proba')
+                    registros.append(registro)
+                    concluidos[(registro['params_key'], registro['fold'])] = registro
+
+        resultados = [concluidos[(chaves[i], k)] for i in range(len(candidates)) for k in range(self.n_splits_)]
+        self.cv_results_ = self._aggregate(candidates, resultados)
+
+        self.best_index_ = int(np.argmax(self.cv_results_['mean_test_score']))
+
+        # Folds do vencedor retomados do checkpoint não têm as probabilidades
+        # em memória: só esses são reajustados para completar o out-of-fold
+        self.oof_proba_ = np.full(len(y), np.nan)
+        for k, (_, val_idx) in enumerate(splits):
+            proba = probas.get((self.best_index_, k))
+            if proba is None:
+                folds = folds or self._fold_matrices(X, y, splits)
+                proba = self._evaluate(estimator, candidates[self.best_index_], self.best_index_, k, folds[k])['proba']
+            self.oof_proba_[val_idx] = proba
+        del probas
+
+        if self._native:
+            self.native_report_ = self._native_report(registros)
+
+        self.best_score_ = float(self.cv_results_['mean_test_score'][self.best_index_])
+        self.best_params_ = dict(candidates[self.best_index_])
+        if not np.isnan(self.cv_results_['mean_best_iteration'][self.best_index_]):
+            self.best_params_['classifier__n_estimators'] = int(round(self.cv_results_['mean_best_iteration'][self.best_index_]))
+
+        self.best_estimator_ = clone(self.pipeline).set_params(**self.best_params_)
+        self.best_estimator_.fit(X, y)
+
+        return self
+
+    def _blocks(self, pendentes):
+
+        # Uma tarefa por avaliação; no treino nativo, os candidatos pendentes
+        # de cada fold são divididos em um bloco por worker, para que os
+        # datasets do fold sejam construídos uma vez por bloco
+        if not self._native:
+            return [(k, [i]) for i, k in pendentes]
+
+        n_workers = effective_n_jobs(self.n_jobs)
+        por_fold = {}
+        for i, k in pendentes:
+            por_fold.setdefault(k, []).append(i)
+        blocos = {k: np.array_split(indices, min(n_workers, len(indices))) for k, indices in por_fold.items()}
+
+        return [(k, blocos[k][b].tolist()) for b in range(n_workers) for k in blocos if b < len(blocos[k])]
+
+    def _evaluate_block(self, estimator, bloco, k, fold, log):
+
+        # Roda no worker: o cache dos datasets nativos vive só durante a
+        # tarefa, e cada avaliação vai para o checkpoint assim que termina
+        cache = {}
+        registros = []
+        for i, params, chave in bloco:
+            registro = {**self._evaluate(estimator, params, i, k, fold, cache), 'params_key': chave}
+            log.append({campo: valor for campo, valor in registro.items() if campo != 'proba'})
+            registros.append(registro)
+
+        return registros
+
+    def _evaluate(self, estimator, params, i, k, fold, cache=None):
+
+        if self._native:
+            registro = _fit_native_candidate(estimator, params, {} if cache is None else cache, fold,
+                                             self.early_stopping_rounds, self.scoring)
+        else:
+            registro = _fit_candidate(estimator, params, *fold, self.early_stopping_rounds, self.scoring)
+
+        return {'candidato': i, 'fold': k, **registro}
+
+    def _native_report(self, registros):
+
+        # Quanto do tempo de ajuste ficou na construção dos datasets (uma vez
+        # por bloco de candidatos de cada fold) e quanto no boosting. No fit do sklearn cada
+        # avaliação reconstruiria o dataset: a construção evitada é estimada
+        # pelo custo médio de cada construção feita
+        construcoes = [r['dataset_time'] for r in registros if r['dataset_time'] > 0]
+        relatorio = {
+            'avaliacoes': len(registros),
+            'construcoes': len(construcoes),
+            'construcao_s': float(np.sum(construcoes)),
+            'boosting_s': float(np.sum([r['fit_time'] for r in registros])),
+            'construcao_evitada_s': float(np.mean(construcoes) * (len(registros) - len(construcoes))) if construcoes else 0.0
+        }
+        if self.verbose and registros:
+            print(f"Datasets nativos: {relatorio['construcoes']} construções em {relatorio['construcao_s']:.2f}s "
+                  f"para {relatorio['avaliacoes']} avaliações | boosting {relatorio['boosting_s']:.1f}s | "
+                  f"construção evitada ~{relatorio['construcao_evitada_s']:.2f}s")
+
+        return relatorio
+
+    def _aggregate(self, candidates, resultados):
+
+        # Registros de checkpoints anteriores ao treino nativo não têm dataset_time
+        n_splits = self.n_splits_
+        campos = {campo: np.array([r.get(campo, np.nan) for r in resultados], dtype=np.float64).reshape(len(candidates), n_splits)
+                  for campo in ['score', 'best_iteration', 'fit_time', 'score_time', 'dataset_time']}
+
+        cv_results = {
+            'params': candidates,
+            'mean_fit_time': campos['fit_time'].mean(axis=1),
+            'mean_score_time': campos['score_time'].mean(axis=1),
+            'mean_dataset_time': campos['dataset_time'].mean(axis=1),
+            'mean_test_score': campos['score'].mean(axis=1),
+            'std_test_score': campos['score'].std(axis=1),
+            'mean_best_iteration': campos['best_iteration'].mean(axis=1)
+        }
+        for k in range(n_splits):
+            cv_results[f'split{k}_test_score'] = campos['score'][:, k]
+            cv_results[f'split{k}_best_iteration'] = campos['best_iteration'][:, k]
+        cv_results['rank_test_score'] = pd.Series(-cv_results['mean_test_score']).rank(method='min').astype(int).to_numpy()
+
+        return cv_results
+
+    def predict_proba(self, X):
+        return self.best_estimator_.predict_proba(X)
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+
+def build_search(pipeline, param_grid, config=SEARCH_CONFIG, scoring='roc_auc', checkpoint_path=None,
+                 n_jobs=-1, verbose=1, random_state=None):
+
+    # 'roc_auc' usa a AUC de uma única ordenação (fast_metrics) em vez do scorer do sklearn
+    if scoring == 'roc_auc':
+        scoring = fast_metrics.auc_scorer
+
+    boosted = isinstance(pipeline.named_steps['classifier'], BOOSTED_CLASSIFIERS)
+    early_stopping_rounds = config.get('early_stopping_rounds') if boosted else None
+
+    if config['strategy'] == 'random' and (early_stopping_rounds or checkpoint_path):
+        return FoldCachedSearchCV(
+            pipeline,
+            param_grid,
+            n_iter=config['n_iter'],
+            cv=config['cv'],
+            early_stopping_rounds=early_stopping_rounds,
+            scoring=scoring,
+            checkpoint_path=checkpoint_path,
+            native_datasets=config.get('native_datasets', False),
+            n_jobs=n_jobs,
+            verbose=verbose,
+            random_state=random_state
+        )
+
+    if config['strategy'] == 'random':
+        return model_selection.RandomizedSearchCV(
+            pipeline,
+            param_distributions=param_grid,
+            n_iter=config['n_iter'],
+            cv=config['cv'],
+            scoring=scoring,
+            n_jobs=n_jobs,
+            verbose=verbose,
+            random_state=random_state
+        )
+
+    if config['strategy'] == 'halving':
+        param_grid = dict(param_grid)
+        if 'classifier__n_estimators' in param_grid:
+            # O limite superior da distribuição vira o recurso máximo das rodadas
+            dist = param_grid.pop('classifier__n_estimators')
+            resource = 'classifier__n_estimators'
+            max_resources = int(dist.support()[1])
+            min_resources = config['min_estimators']
+        else:
+            resource = 'n_samples'
+            max_resources = 'auto'
+            min_resources = 'smallest'
+
+        return model_selection.HalvingRandomSearchCV(
+            pipeline,
+            param_distributions=param_grid,
+            n_candidates=config['n_iter'],
+            factor=config['factor'],
+            resource=resource,
+            max_resources=max_resources,
+            min_resources=min_resources,
+            cv=config['cv'],
+            scoring=scoring,
+            n_jobs=n_jobs,
+            verbose=verbose,
+            random_state=random_state
+        )
+
+    raise ValueError(f"Estratégia de busca desconhecida: {config['strategy']}")
+
+
+def oof_predictions(search, X, y):
+
+    # Probabilidades out-of-fold do melhor candidato: o FoldCachedSearchCV já as
+    # guarda; nas buscas do sklearn (ex.: halving) o melhor estimador é
+    # reavaliado nos mesmos folds da busca com cross_val_predict
+    if hasattr(search, 'oof_proba_'):
+        return search.oof_proba_
+
+    cv = model_selection.check_cv(search.cv, y, classifier=True)
+    proba = model_selection.cross_val_predict(
+        clone(search.best_estimator_), X, y, cv=cv, method='predict_proba', n_jobs=search.n_jobs
+    )
+
+    return proba[:, 1]
+
+
+def time_to_best(search):
+
+    # Custo acumulado (ajuste + score de todos os folds, em tempo de CPU
+    # sequencial) dos candidatos avaliados até o que obteve o melhor AUC
+    cv_results = search.cv_results_
+    custo = (cv_results['mean_fit_time'] + cv_results['mean_score_time']) * search.n_splits_
+
+    return float(np.cumsum(custo)[search.best_index_])
+
+
+def log_search(model_name, search, strategy, search_seconds, path=SEARCH_LOG_PATH):
+
+    registro = pd.DataFrame([{
+        'modelo': model_name,
+        'estrategia': strategy,
+        'best_score': search.best_score_,
+        'qtd_avaliacoes': len(search.cv_results_['params']),
+        'tempo_busca_s': search_seconds,
+        'tempo_ate_melhor_s': time_to_best(search)
+    }])
+    registro.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+    print(f"{model_name} ({strategy}): melhor AUC {search.best_score_:.4f} | "
+          f"busca {search_seconds:.1f}s | tempo até o melhor AUC {registro['tempo_ate_melhor_s'].iloc[0]:.1f}s")
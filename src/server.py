@@ -0,0 +1,348 @@
+# Serviço de escoragem com micro-batching sobre asyncio e um HTTP mínimo.
+# Uso: python server.py servir [--porta 8080] [--max-batch 256] [--max-espera-ms 5]
+#      python server.py carga  [--porta 8080] [--clientes 64] [--requisicoes 5000]
+#   POST /score   {"registros": [{coluna: valor, ...}, ...]} -> {"pred_proba": [...]}
+#   GET  /metrics histogramas de latência por requisição e de tamanho de batch
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+import scoring
+
+# Limites superiores (ms) dos buckets do histograma de latência
+LATENCY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, float('inf')]
+
+# Amostras mantidas para os percentis de latência e a média de tamanho de batch
+MAX_AMOSTRAS = 100_000
+
+
+class QueueFull(Exception):
+    pass
+
+
+class LatencyHistogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = np.zeros(len(buckets), dtype=np.int64)
+        self.amostras = deque(maxlen=MAX_AMOSTRAS)
+
+    def observe(self, ms):
+        self.counts[np.searchsorted(self.buckets, ms)] += 1
+        self.amostras.append(ms)
+
+    def summary(self):
+
+        amostras = np.array(self.amostras)
+        percentis = np.percentile(amostras, [50, 90, 99]).round(3).tolist() if len(amostras) else [None] * 3
+
+        return {
+            'qtd': int(self.counts.sum()),
+            'p50_ms': percentis[0],
+            'p90_ms': percentis[1],
+            'p99_ms': percentis[2],
+            'buckets': {f'<={b}': int(c) for b, c in zip(self.buckets, self.counts)}
+        }
+
+
+class MicroBatcher:
+
+    # Requisições entram numa fila limitada (max_queue registros); um único
+    # consumidor junta registros até max_batch ou até max_wait_ms desde o
+    # primeiro da vez e escora tudo numa chamada. Com a fila cheia, submit
+    # falha na hora (QueueFull -> 503) em vez de acumular latência.
+    # Registros sem alguma das features são recusados antes de entrar na fila,
+    # para não derrubar o batch de outros clientes.
+    def __init__(self, score_fn, features=(), max_batch=256, max_wait_ms=5.0, max_queue=10_000):
+        self.score_fn = score_fn
+        self.features = list(features)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.latencias = LatencyHistogram()
+        self.tamanhos_batch = deque(maxlen=MAX_AMOSTRAS)
+        self.qtd_batches = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def validate(self, records):
+
+        if not isinstance(records, list):
+            raise TypeError('registros deve ser uma lista')
+        for i, record in enumerate(records):
+            if not isinstance(record, dict):
+                raise TypeError(f'registro {i} não é um objeto')
+            faltantes = [col for col in self.features if col not in record]
+            if faltantes:
+                raise ValueError(f'registro {i} sem as features {faltantes}')
+
+    async def submit(self, records):
+
+        self.validate(records)
+        if not records:
+            return []
+
+        inicio = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        if self.queue.maxsize - self.queue.qsize() < len(records):
+            raise QueueFull()
+        pedido = {'future': future, 'proba': [None] * len(records), 'faltam': len(records)}
+        for i, record in enumerate(records):
+            self.queue.put_nowait((record, pedido, i))
+
+        proba = await future
+        self.latencias.observe((time.perf_counter() - inicio) * 1000)
+
+        return proba
+
+    async def _run(self):
+
+        loop = asyncio.get_running_loop()
+        while True:
+            itens = [await self.queue.get()]
+            prazo = loop.time() + self.max_wait
+            while len(itens) < self.max_batch:
+                restante = prazo - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    itens.append(await asyncio.wait_for(self.queue.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+            while len(itens) < self.max_batch and not self.queue.empty():
+                itens.append(self.queue.get_nowait())
+
+            # O predict roda fora do event loop para que novas requisições
+            # continuem sendo aceitas enquanto o batch é escorado
+            self.tamanhos_batch.append(len(itens))
+            self.qtd_batches += 1
+            try:
+                proba = await loop.run_in_executor(None, self.score_fn, [item[0] for item in itens])
+            except Exception:
+                # Se o batch falha, cada requisição é escorada sozinha: só a
+                # que tem o registro inválido recebe o erro
+                for grupo in self._by_request(itens):
+                    try:
+                        proba = await loop.run_in_executor(None, self.score_fn, [item[0] for item in grupo])
+                    except Exception as erro:
+                        if not grupo[0][1]['future'].done():
+                            grupo[0][1]['future'].set_exception(erro)
+                        continue
+                    self._deliver(grupo, proba)
+                continue
+
+            self._deliver(itens, proba)
+
+    @staticmethod
+    def _by_request(itens):
+
+        grupos = {}
+        for item in itens:
+            grupos.setdefault(id(item[1]), []).append(item)
+
+        return list(grupos.values())
+
+    @staticmethod
+    def _deliver(itens, proba):
+
+        # Uma requisição com vários registros pode ser dividida entre
+        # batches; ela só é respondida quando todos foram escorados
+        for (_, pedido, i), p in zip(itens, proba):
+            if pedido['future'].done():
+                continue
+            pedido['proba'][i] = float(p)
+            pedido['faltam'] -= 1
+            if pedido['faltam'] == 0:
+                pedido['future'].set_result(pedido['proba'])
+
+    def metrics(self):
+
+        tamanhos = np.array(self.tamanhos_batch)
+
+        return {
+            'latencia_requisicao': self.latencias.summary(),
+            'batches': self.qtd_batches,
+            'tamanho_medio_batch': float(tamanhos.mean()) if len(tamanhos) else None,
+            'fila': self.queue.qsize()
+        }
+
+
+def pipeline_score_fn(model_name='XGBoost', use_compiled=False):
+
+    # Função de escoragem e features exigidas em cada registro
+    entrada = scoring.load_model(model_name)
+
+    return scoring.records_score_fn(entrada, use_compiled), entrada['features']
+
+
+async def _read_request(reader):
+
+    linha = await reader.readline()
+    if not linha:
+        return None
+    metodo, caminho, _ = linha.decode().split(' ', 2)
+
+    tamanho = 0
+    while (cabecalho := await reader.readline()) not in (b'\r\n', b'\n', b''):
+        nome, _, valor = cabecalho.decode().partition(':')
+        if nome.strip().lower() == 'content-length':
+            tamanho = int(valor)
+    corpo = await reader.readexactly(tamanho) if tamanho else b''
+
+    return metodo, caminho, corpo
+
+
+def _response(status, payload):
+
+    corpo = json.dumps(payload).encode()
+    textos = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+    cabecalho = (f'HTTP/1.1 {status} {textos[status]}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(corpo)}\r\nConnection: keep-alive\r\n\r\n')
+
+    return cabecalho.encode() + corpo
+
+
+def make_handler(batcher):
+
+    async def handle(reader, writer):
+
+        # Conexões keep-alive: várias requisições por conexão. Uma requisição
+        # malformada recebe 400 e encerra a conexão (o enquadramento se perdeu)
+        try:
+            while True:
+                try:
+                    requisicao = await _read_request(reader)
+                except ValueError as erro:
+                    writer.write(_response(400, {'erro': f'requisição malformada: {erro}'}))
+                    await writer.drain()
+                    break
+                if requisicao is None:
+                    break
+                metodo, caminho, corpo = requisicao
+                if metodo == 'POST' and caminho == '/score':
+                    try:
+                        registros = json.loads(corpo)['registros']
+                        resposta = _response(200, {'pred_proba': await batcher.submit(registros)})
+                    except QueueFull:
+                        resposta = _response(503, {'erro': 'fila cheia'})
+                    except (KeyError, ValueError, TypeError) as erro:
+                        resposta = _response(400, {'erro': str(erro)})
+                    except Exception as erro:
+                        resposta = _response(500, {'erro': f'{type(erro).__name__}: {erro}'})
+                elif metodo == 'GET' and caminho == '/metrics':
+                    resposta = _response(200, batcher.metrics())
+                else:
+                    resposta = _response(404, {'erro': caminho})
+                writer.write(resposta)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(args):
+
+    score_fn, features = pipeline_score_fn(args.modelo, args.compilado)
+    batcher = MicroBatcher(
+        score_fn,
+        features,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_espera_ms,
+        max_queue=args.max_fila
+    )
+    batcher.start()
+    server = await asyncio.start_server(make_handler(batcher), args.host, args.porta)
+    print(f'Servindo {args.modelo} em http://{args.host}:{args.porta} '
+          f'(batch máx. {args.max_batch}, espera máx. {args.max_espera_ms} ms, fila {args.max_fila})')
+
+    async with server:
+        await server.serve_forever()
+
+
+async def _client(host, porta, corpos, latencias, status):
+
+    reader, writer = await asyncio.open_connection(host, porta)
+    for corpo in corpos:
+        inicio = time.perf_counter()
+        writer.write((f'POST /score HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                      f'Content-Length: {len(corpo)}\r\n\r\n').encode() + corpo)
+        await writer.drain()
+        codigo = int((await reader.readline()).split()[1])
+        tamanho = 0
+        while (cabecalho := await reader.readline()) != b'\r\n':
+            nome, _, valor = cabecalho.decode().partition(':')
+            if nome.lower() == 'content-length':
+                tamanho = int(valor)
+        await reader.readexactly(tamanho)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        status[codigo] = status.get(codigo, 0) + 1
+    writer.close()
+
+
+async def load(args):
+
+    # Gerador de carga: N clientes concorrentes, cada um com sua conexão,
+    # enviando requisições de registros_por_req pacientes em sequência. Só o
+    # gerador de carga lê o store: o processo do servidor não o importa
+    import store
+
+    df = store.read_processed()
+    df = df.drop(columns=['flag_doenca_cardiaca']).astype({col: str for col in df.select_dtypes('category').columns})
+    registros = df.sample(min(len(df), 10_000), random_state=0).to_dict('records')
+
+    corpos = [
+        json.dumps({'registros': [registros[(i * args.registros_por_req + j) % len(registros)]
+                                  for j in range(args.registros_por_req)]}, default=int).encode()
+        for i in range(args.requisicoes)
+    ]
+    latencias, status = [], {}
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[
+        _client(args.host, args.porta, corpos[c::args.clientes], latencias, status)
+        for c in range(args.clientes)
+    ])
+    segundos = time.perf_counter() - inicio
+
+    p50, p90, p99 = np.percentile(latencias, [50, 90, 99])
+    print(f'{args.clientes} clientes | {args.requisicoes} requisições x {args.registros_por_req} registros em {segundos:.2f}s '
+          f'| {args.requisicoes / segundos:,.0f} req/s ({args.requisicoes * args.registros_por_req / segundos:,.0f} registros/s)')
+    print(f'Latência (cliente): p50 {p50:.2f} ms | p90 {p90:.2f} ms | p99 {p99:.2f} ms | status {status}')
+
+    reader, writer = await asyncio.open_connection(args.host, args.porta)
+    writer.write(f'GET /metrics HTTP/1.1\r\nHost: {args.host}\r\n\r\n'.encode())
+    await writer.drain()
+    await reader.readline()
+    while (cabecalho := await reader.readline()) != b'\r\n':
+        if cabecalho.lower().startswith(b'content-length'):
+            tamanho = int(cabecalho.split(b':')[1])
+    print('Métricas do servidor:', json.loads(await reader.readexactly(tamanho)))
+    writer.close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Serviço de escoragem com micro-batching')
+    parser.add_argument('modo', choices=['servir', 'carga'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--modelo', default='XGBoost')
+    parser.add_argument('--compilado', action='store_true', help='escora com compiled.CompiledScorer')
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-espera-ms', type=float, default=5.0)
+    parser.add_argument('--max-fila', type=int, default=10_000)
+    parser.add_argument('--clientes', type=int, default=64)
+    parser.add_argument('--requisicoes', type=int, default=5000)
+    parser.add_argument('--registros-por-req', type=int, default=1)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args) if args.modo == 'servir' else load(args))
@@ -0,0 +1,303 @@
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+import processing
+
+STORE_DIR = '../data/processed/store'
+DATA_FILE = 'processed.arrow'
+MANIFEST_FILE = 'manifest.json'
+
+# Versões incrementais (ingest.py) não regravam o dataset: o manifest lista as
+# partições (arquivos Arrow imutáveis, relativos ao store) e, para cada uma, o
+# vetor de posições excluídas por upserts posteriores. Cada partição tem um
+# índice de paciente_id (ids ordenados + posição da linha) em .npy, lido por
+# memory map e consultado por busca binária.
+PARTITIONS_DIR = 'partitions'
+INDEX_SUFFIX = '.ids.npy'
+POSITIONS_SUFFIX = '.pos.npy'
+
+# Tipos explícitos do dataset processado; as categorias vêm das tabelas de mapeamento
+PROCESSED_DTYPES = {
+    'paciente_id': 'int64',
+    'nr_anos_idade': 'int64',
+    'vlr_altura': 'int64',
+    'vlr_peso': 'float64',
+    'vlr_imc': 'float64',
+    'vlr_pressao_sistolica': 'int64',
+    'vlr_pressao_diastolica': 'int64',
+    'flag_fumante': 'int64',
+    'flag_consumo_alcool': 'int64',
+    'flag_atividade_fisica': 'int64',
+    'flag_doenca_cardiaca': 'int64',
+    **processing.CATEGORY_DTYPES
+}
+
+
+def file_sha256(path, tamanho_bloco=1 << 20):
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+
+    return h.hexdigest()
+
+
+def list_versions(store_dir=STORE_DIR):
+
+    if not os.path.isdir(store_dir):
+        return []
+
+    return sorted(int(d[1:]) for d in os.listdir(store_dir) if d.startswith('v') and d[1:].isdigit())
+
+
+def version_dir(version=None, store_dir=STORE_DIR):
+
+    if version is None:
+        versoes = list_versions(store_dir)
+        if not versoes:
+            raise FileNotFoundError(f'Nenhuma versão do dataset processado em {store_dir}')
+        version = versoes[-1]
+
+    return os.path.join(store_dir, f'v{version:04d}')
+
+
+def split_invalid(df):
+
+    # Colunas inteiras do store não aceitam faltantes: separa as linhas
+    # válidas das que têm algum faltante nessas colunas
+    inteiras = [col for col, dtype in PROCESSED_DTYPES.items() if dtype == 'int64']
+    invalidas = df[inteiras].isna().any(axis=1)
+
+    return df[~invalidas], df[invalidas]
+
+
+def save_rejected(rejeitadas, rejeitadas_path):
+
+    inteiras = [col for col, dtype in PROCESSED_DTYPES.items() if dtype == 'int64']
+    rejeitadas.to_csv(rejeitadas_path, index=False)
+    faltantes = rejeitadas[inteiras].isna().sum()
+    print(f'Linhas rejeitadas (valores faltantes): {len(rejeitadas)} -> {rejeitadas_path} | '
+          + ', '.join(f'{col}: {int(qtd)}' for col, qtd in faltantes[faltantes > 0].items()))
+
+
+def to_arrow(df):
+    return pa.Table.from_pandas(df.astype(PROCESSED_DTYPES), preserve_index=False)
+
+
+def write_manifest(version, manifest, store_dir=STORE_DIR):
+
+    diretorio = version_dir(version, store_dir)
+    os.makedirs(diretorio, exist_ok=True)
+    with open(os.path.join(diretorio, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+class StoreWriter:
+
+    # Escreve uma nova versão do store em formato Arrow IPC (Feather v2) sem
+    # compressão, o que permite leitura por memory map e projeção de colunas.
+    # Aceita o dataset inteiro ou chunks sucessivos (modo streaming); as
+    # linhas barradas por reject_invalid são gravadas em rejeitadas_path no
+    # fechamento.
+    def __init__(self, store_dir=STORE_DIR, source='preprocessing', rejeitadas_path=None):
+        versoes = list_versions(store_dir)
+        self.version = versoes[-1] + 1 if versoes else 1
+        self.store_dir = store_dir
+        self.source = source
+        self.path = os.path.join(version_dir(self.version, store_dir), DATA_FILE)
+        self.rows = 0
+        self._writer = None
+        self._tmp_path = self.path + '.tmp'
+        self.rejeitadas_path = rejeitadas_path
+        self._rejeitadas = []
+
+    def reject_invalid(self, df):
+
+        # Chamado antes de qualquer escrita (CSV ou store), para que os dois
+        # destinos recebam as mesmas linhas
+        df, rejeitadas = split_invalid(df)
+        if len(rejeitadas):
+            self._rejeitadas.append(rejeitadas)
+
+        return df
+
+    def write(self, df):
+
+        table = to_arrow(df)
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._writer = pa.ipc.new_file(self._tmp_path, table.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+
+        if self._writer is None:
+            self.write(pd.DataFrame(columns=processing.PROCESSED_COLUMNS))
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+        manifest = {
+            'version': self.version,
+            'source': self.source,
+            'created_at': datetime.datetime.now().isoformat(),
+            'rows': self.rows,
+            'dtypes': {col: str(dtype) for col, dtype in PROCESSED_DTYPES.items()},
+            'categories': {col: list(dtype.categories) for col, dtype in processing.CATEGORY_DTYPES.items()},
+            'sha256': file_sha256(self.path)
+        }
+        write_manifest(self.version, manifest, self.store_dir)
+
+        if self._rejeitadas:
+            save_rejected(pd.concat(self._rejeitadas), self.rejeitadas_path or f'{self.path}.rejeitadas.csv')
+
+        print(f'Dataset processado salvo: versão {self.version} ({self.rows} linhas, sha256 {manifest["sha256"][:12]})')
+
+        return manifest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.close()
+            os.remove(self._tmp_path)
+
+
+def write_processed(df, store_dir=STORE_DIR, source='preprocessing'):
+
+    with StoreWriter(store_dir, source) as writer:
+        writer.write(df)
+
+    return writer.version
+
+
+def read_manifest(version=None, store_dir=STORE_DIR):
+
+    with open(os.path.join(version_dir(version, store_dir), MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def partitions(manifest):
+
+    # Versões gravadas pelo StoreWriter são uma partição única, sem exclusões
+    if 'partitions' in manifest:
+        return manifest['partitions']
+
+    return [{
+        'path': os.path.join(f"v{manifest['version']:04d}", DATA_FILE),
+        'rows': manifest['rows'],
+        'sha256': manifest['sha256'],
+        'deleted': None,
+        'deleted_sha256': None,
+        'deleted_rows': 0
+    }]
+
+
+def partitions_sha256(particoes):
+
+    # Identidade de uma versão particionada: hashes das partições e dos vetores de exclusão
+    chave = json.dumps([[p['sha256'], p['deleted_sha256']] for p in particoes])
+
+    return hashlib.sha256(chave.encode()).hexdigest()
+
+
+def write_partition(df, path):
+
+    table = to_arrow(df)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with pa.ipc.new_file(path + '.tmp', table.schema) as writer:
+        writer.write_table(table)
+    os.replace(path + '.tmp', path)
+    build_index(path, df['paciente_id'].to_numpy())
+
+    return file_sha256(path)
+
+
+def build_index(path, ids=None):
+
+    if ids is None:
+        ids = feather.read_table(path, memory_map=True)['paciente_id'].to_numpy()
+    ordem = np.argsort(ids, kind='stable')
+    np.save(path + INDEX_SUFFIX, np.asarray(ids, dtype=np.int64)[ordem])
+    np.save(path + POSITIONS_SUFFIX, ordem.astype(np.int64))
+
+
+def load_index(path):
+
+    # Partições antigas ganham o índice na primeira consulta (custo único)
+    if not os.path.exists(path + POSITIONS_SUFFIX):
+        build_index(path)
+
+    return np.load(path + INDEX_SUFFIX, mmap_mode='r'), np.load(path + POSITIONS_SUFFIX, mmap_mode='r')
+
+
+def lookup(index, ids):
+
+    # Pares (posição em ids, linha na partição) de cada id encontrado. Só as
+    # páginas do índice visitadas pela busca binária são lidas do disco
+    ids_ordenados, posicoes = index
+    ids = np.asarray(ids, dtype=np.int64)
+    inicio = np.searchsorted(ids_ordenados, ids, side='left')
+    qtd = np.searchsorted(ids_ordenados, ids, side='right') - inicio
+
+    linhas = np.repeat(np.arange(len(ids)), qtd)
+    deslocamento = np.arange(qtd.sum()) - np.repeat(np.cumsum(qtd) - qtd, qtd)
+
+    return linhas, np.asarray(posicoes[np.repeat(inicio, qtd) + deslocamento], dtype=np.int64)
+
+
+def deleted_positions(particao, store_dir=STORE_DIR):
+
+    if particao['deleted'] is None:
+        return np.array([], dtype=np.int64)
+
+    return np.load(os.path.join(store_dir, particao['deleted']))
+
+
+def read_table(columns=None, version=None, store_dir=STORE_DIR, verify=False):
+
+    # Tabela Arrow das linhas vivas da versão (partições concatenadas, sem as
+    # excluídas), ainda mapeada em memória: pode ser fatiada sem materializar
+    # o dataset inteiro (ver batch_score.py)
+    manifest = read_manifest(version, store_dir)
+    particoes = partitions(manifest)
+
+    if verify:
+        for particao in particoes:
+            arquivos = [(particao['path'], particao['sha256']), (particao['deleted'], particao['deleted_sha256'])]
+            for arquivo, sha256 in arquivos:
+                if arquivo is not None and file_sha256(os.path.join(store_dir, arquivo)) != sha256:
+                    raise ValueError(f'Hash do dataset processado não confere: {arquivo}')
+
+    # A projeção é feita sobre a tabela mapeada (zero-copy); passar columns
+    # direto para feather.read_table materializa cópias das colunas lidas.
+    # Só as partições com exclusões são copiadas (filtro das linhas vivas)
+    tables = []
+    for particao in particoes:
+        table = feather.read_table(os.path.join(store_dir, particao['path']), memory_map=True)
+        if columns is not None:
+            table = table.select(columns)
+        if particao['deleted_rows']:
+            manter = np.ones(table.num_rows, dtype=bool)
+            manter[deleted_positions(particao, store_dir)] = False
+            table = table.filter(pa.array(manter))
+        tables.append(table)
+
+    return tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+
+
+def read_processed(columns=None, version=None, store_dir=STORE_DIR, verify=False):
+
+    # Leitura por memory map: apenas as páginas das colunas projetadas são tocadas
+    return read_table(columns, version, store_dir, verify).to_pandas(split_blocks=True)
@@ -0,0 +1,198 @@
+import numpy as np
+
+# Critérios de escolha do ponto de corte, todos respondidos na mesma varredura:
+#   'recall_alvo'   -> maior recall que não passa do alvo (regra original do predict.py)
+#   'precisao_alvo' -> maior recall com precisão >= alvo
+#   'f_beta'        -> maior F-beta
+#   'custo'         -> menor custo_fp * FP + custo_fn * FN
+# 'criterio' é o que vai para o manifest e para o report_metrics.
+THRESHOLD_CONFIG = {
+    'criterio': 'recall_alvo',
+    'recall_alvo': 0.81,
+    'precisao_alvo': 0.75,
+    'beta': 1.0,
+    'custo_fp': 1.0,
+    'custo_fn': 5.0,
+    'n_boot': 500,
+    'alpha': 0.05
+}
+
+CRITERIA = ['recall_alvo', 'precisao_alvo', 'f_beta', 'custo']
+
+# Bytes aproximados por célula (reamostragem x linha) de um bloco do bootstrap
+BYTES_POR_CELULA = 8 * 24
+
+
+def sweep(y_true, y_score, weights=None):
+
+    # Uma ordenação dos scores; TP/FP de todos os pontos de corte saem de somas
+    # cumulativas por grupo de scores iguais. A regra é a do report_metrics
+    # (positivo se score > corte), então o corte k classifica como positivos
+    # os grupos anteriores a ele; um último corte abaixo do mínimo pega todos.
+    # weights (B x n) avalia B reamostragens de uma vez (bootstrap).
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_score = np.asarray(y_score, dtype=np.float64)
+
+    order = np.argsort(-y_score, kind='mergesort')
+    scores = y_score[order]
+    y = y_true[order]
+    inicios = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+    cutoffs = np.r_[scores[inicios], np.nextafter(scores[-1], -np.inf)]
+
+    w = np.ones((1, len(y))) if weights is None else weights[:, order]
+    pos = np.add.reduceat(w * y, inicios, axis=1)
+    neg = np.add.reduceat(w * (1 - y), inicios, axis=1)
+
+    zeros = np.zeros((len(w), 1))
+    tp = np.hstack([zeros, np.cumsum(pos, axis=1)])
+    fp = np.hstack([zeros, np.cumsum(neg, axis=1)])
+    positivos = tp[:, -1:]
+    negativos = fp[:, -1:]
+
+    # AUC pela mesma ordenação: cada positivo ganha dos negativos com score
+    # menor e empata (meio ponto) com os do mesmo grupo
+    neg_abaixo = negativos - fp[:, 1:]
+    auc = ((pos * (neg_abaixo + neg / 2)).sum(axis=1) / (positivos * negativos)[:, 0])
+
+    return {'cutoffs': cutoffs, 'tp': tp, 'fp': fp, 'positivos': positivos, 'negativos': negativos, 'auc': auc}
+
+
+def curve_metrics(varredura, beta=1.0, custo_fp=1.0, custo_fn=1.0):
+
+    tp, fp = varredura['tp'], varredura['fp']
+    positivos, negativos = varredura['positivos'], varredura['negativos']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = tp / positivos
+        f_beta = np.where(precision + recall > 0,
+                          (1 + beta ** 2) * precision * recall / (beta ** 2 * precision + recall), 0.0)
+
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f_beta': f_beta,
+        'accuracy': (tp + negativos - fp) / (positivos + negativos),
+        'custo': custo_fp * fp + custo_fn * (positivos - tp)
+    }
+
+
+def _lexargmax(valido, primario, secundario):
+
+    # Por linha: maior primário entre os pontos válidos e, no empate, maior
+    # secundário; -1 nas linhas sem nenhum ponto válido
+    primario = np.where(valido, primario, -np.inf)
+    melhor = primario.max(axis=1, keepdims=True)
+    empate = valido & (primario == melhor)
+    idx = np.argmax(np.where(empate, secundario, -np.inf), axis=1)
+
+    return np.where(valido.any(axis=1), idx, -1)
+
+
+def select_indices(curvas, config=THRESHOLD_CONFIG):
+
+    precision, recall = curvas['precision'], curvas['recall']
+    tudo = np.ones_like(recall, dtype=bool)
+
+    return {
+        'recall_alvo': _lexargmax(recall <= config['recall_alvo'], recall, precision),
+        'precisao_alvo': _lexargmax(precision >= config['precisao_alvo'], recall, precision),
+        'f_beta': _lexargmax(tudo, curvas['f_beta'], precision),
+        'custo': _lexargmax(tudo, -curvas['custo'], precision)
+    }
+
+
+def _selected(varredura, curvas, indices):
+
+    # Sem ponto de corte válido (índice -1), o corte e as métricas ficam NaN
+    linhas = np.arange(len(next(iter(indices.values()))))
+
+    return {
+        criterio: {
+            'threshold': np.where(idx < 0, np.nan, varredura['cutoffs'][idx]),
+            **{metrica: np.where(idx < 0, np.nan, valores[linhas, idx]) for metrica, valores in curvas.items()}
+        }
+        for criterio, idx in indices.items()
+    }
+
+
+def select_thresholds(y_true, y_score, config=THRESHOLD_CONFIG):
+
+    varredura = sweep(y_true, y_score)
+    curvas = curve_metrics(varredura, config['beta'], config['custo_fp'], config['custo_fn'])
+    selecionados = _selected(varredura, curvas, select_indices(curvas, config))
+
+    # None (e não NaN) no manifest para critérios sem ponto de corte válido
+    return {
+        criterio: {k: None if np.isnan(v[0]) else float(v[0]) for k, v in valores.items()}
+        for criterio, valores in selecionados.items()
+    }
+
+
+def _interval(valores, quantis):
+
+    # Reamostragens sem ponto de corte válido (NaN) ficam fora dos quantis;
+    # sem nenhuma válida, o intervalo é None
+    valores = valores[~np.isnan(valores)]
+    if len(valores) == 0:
+        return None
+
+    return np.quantile(valores, quantis).tolist()
+
+
+def bootstrap_thresholds(y_true, y_score, config=THRESHOLD_CONFIG, tamanho_bloco=50, memoria_bloco=256 * 2 ** 20, seed=0):
+
+    # Bootstrap por pesos: cada linha de uma matriz multinomial (bloco x n) é
+    # uma reamostragem com reposição, e a varredura inteira (corte escolhido
+    # e métricas de cada critério, além da AUC) roda vetorizada sobre o bloco.
+    # A varredura cria da ordem de BYTES_POR_CELULA bytes por célula do bloco
+    # (pesos, somas cumulativas e curvas em float64), então o bloco encolhe
+    # com n para ficar perto de memoria_bloco (uma reamostragem no mínimo).
+    n = len(y_score)
+    tamanho_bloco = max(1, min(tamanho_bloco, memoria_bloco // (BYTES_POR_CELULA * max(n, 1))))
+    rng = np.random.default_rng(seed)
+    probs = np.full(n, 1 / n)
+    amostras = {criterio: {} for criterio in CRITERIA}
+    aucs = []
+
+    for inicio in range(0, config['n_boot'], tamanho_bloco):
+        pesos = rng.multinomial(n, probs, size=min(tamanho_bloco, config['n_boot'] - inicio)).astype(np.float64)
+        varredura = sweep(y_true, y_score, pesos)
+        curvas = curve_metrics(varredura, config['beta'], config['custo_fp'], config['custo_fn'])
+        for criterio, valores in _selected(varredura, curvas, select_indices(curvas, config)).items():
+            for metrica, v in valores.items():
+                amostras[criterio].setdefault(metrica, []).append(v)
+        aucs.append(varredura['auc'])
+
+    quantis = [config['alpha'] / 2, 1 - config['alpha'] / 2]
+    intervalos = {
+        criterio: {metrica: _interval(np.concatenate(v), quantis) for metrica, v in metricas.items()}
+        for criterio, metricas in amostras.items()
+    }
+    intervalos['auc'] = np.quantile(np.concatenate(aucs), quantis).tolist()
+
+    return intervalos
+
+
+def cutoff_index(varredura, threshold):
+    # Maior corte da varredura <= threshold: com a regra score > corte, os dois classificam igual
+    return int(np.searchsorted(-varredura['cutoffs'], -threshold, side='left'))
+
+
+def choose_threshold(y_true, y_score, config=THRESHOLD_CONFIG):
+
+    # Ponto de corte do critério configurado, os pontos dos demais critérios e
+    # os intervalos de confiança, no formato gravado no manifest do modelo
+    selecionados = select_thresholds(y_true, y_score, config)
+    if selecionados[config['criterio']]['threshold'] is None:
+        raise ValueError(f"Nenhum ponto de corte atende o critério '{config['criterio']}' "
+                         f"(recall_alvo={config['recall_alvo']}, precisao_alvo={config['precisao_alvo']})")
+    resultado = {
+        'criterio': config['criterio'],
+        'valor': selecionados[config['criterio']]['threshold'],
+        'criterios': selecionados
+    }
+    if config.get('n_boot'):
+        resultado['intervalos'] = bootstrap_thresholds(y_true, y_score, config)
+
+    return resultado
@@ -1,39 +1,39 @@
 # %%
-import pickle
 import datetime
-import pandas as pd
+import os
+import time
 
-from scipy.stats import randint, uniform, loguniform
+import numpy as np
+import pandas as pd
 from sklearn import model_selection
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn import metrics
-
-from sklearn.linear_model import LogisticRegression
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
-from xgboost import XGBClassifier
-from lightgbm import LGBMClassifier
-# %% 
-df_processed = pd.read_csv('../data/processed/processed_cardio_data.csv')
-target = 'flag_doenca_cardiaca'
-cat_features = [col for col in df_processed.select_dtypes(include=['object']).columns if col != 'paciente_id'] + \
-               [col for col in df_processed.select_dtypes(include=['int64', 'float64']).columns if col.startswith('flag_') and col not in ['paciente_id', target]]
-num_features = [col for col in df_processed.select_dtypes(include=['int64', 'float64']).columns if not col.startswith('flag_') and col not in ['paciente_id', target]]
-
-features = list(set(cat_features + num_features))
+
+import artifacts
+import checkpoint
+import modeling
+import scheduler
+import screening
+import search as search_strategies
+import store
+import thresholds
+# %%
+# O manifest é lido uma vez: dados, chave dos checkpoints e versão registrada
+# nos modelos são da mesma versão mesmo que o ingest.py grave outra durante o treino
+dataset_manifest = store.read_manifest()
+df_processed = store.read_processed(version=dataset_manifest['version'])
+target = modeling.TARGET
+cat_features, num_features, features = modeling.split_features(df_processed, target)
+
 print("Variáveis categóricas: ", cat_features)
 print("Variáveis numéricas: ", num_features)
 print("Variável alvo: ", target)
 # %%
-seed = 22
+seed = modeling.SEED
 
 X_train, X_test, y_train, y_test = model_selection.train_test_split(
-    df_processed[features], 
-    df_processed[target], 
-    test_size=0.2, 
-    random_state=42, 
+    df_processed[features],
+    df_processed[target],
+    test_size=0.2,
+    random_state=42,
     stratify=df_processed[target]
 )
 
@@ -41,142 +41,136 @@ print("Taxa de resposta na base de treino: ", y_train.mean())
 print("Taxa de resposta na base de teste: ", y_test.mean())
 
 # %%
-categorical_transformer = OneHotEncoder(handle_unknown='ignore', drop='first',sparse_output=False)
-numerical_transformer = StandardScaler()
-
-preprocessor = ColumnTransformer([
-    ('num', numerical_transformer, num_features),
-    ('cat', categorical_transformer, cat_features)
-]).set_output(transform="pandas") 
-
-# %%
-models = {
-    'Logistic Regression': (
-        LogisticRegression(max_iter=1000, random_state=seed),
-        {
-            'classifier__C': loguniform(1e-4, 1e3),  
-            'classifier__penalty': ['l2'],  
-            'classifier__solver': ['liblinear', 'saga']  
-        }
-    ),
-    'Decision Tree': (
-        DecisionTreeClassifier(random_state=seed),
-        {
-            'classifier__max_depth': randint(2, 100),  
-            'classifier__min_samples_leaf': randint(1, 1000),  
-            'classifier__criterion': ['gini', 'entropy', 'log_loss']  
-        }
-    ),
-    'Random Forest': (
-        RandomForestClassifier(random_state=seed),
-        {
-            'classifier__n_estimators': randint(100, 2000),  
-            'classifier__max_depth': randint(2, 100),
-            'classifier__min_samples_leaf': randint(1, 1000),
-            'classifier__criterion': ['gini', 'entropy', 'log_loss']
-        }
-    ),
-    'XGBoost': (
-        XGBClassifier(eval_metric='logloss', random_state=seed),
-        {
-            'classifier__n_estimators': randint(100, 2000),
-            'classifier__max_depth': randint(3, 30),
-            'classifier__learning_rate': loguniform(1e-4, 0.5),
-            'classifier__colsample_bytree': uniform(0.3, 0.7),  
-            'classifier__reg_alpha': loguniform(1e-4, 10),  
-            'classifier__reg_lambda': loguniform(1e-4, 10)
-        }
-    ),
-    'AdaBoost': (
-        AdaBoostClassifier(random_state=seed),
-        {
-            'classifier__n_estimators': randint(50, 1000),
-            'classifier__learning_rate': loguniform(1e-4, 1.0)
-        }
-    ),
-    'LightGBM': (
-        LGBMClassifier(random_state=seed),
-        {
-            'classifier__n_estimators': randint(100, 2000),
-            'classifier__max_depth': randint(3, 50),
-            'classifier__learning_rate': loguniform(1e-4, 0.5),
-            'classifier__num_leaves': randint(20, 512),
-            'classifier__colsample_bytree': uniform(0.3, 0.7),
-            'classifier__reg_alpha': loguniform(1e-4, 10),
-            'classifier__reg_lambda': loguniform(1e-4, 10)
-        }
-    )
-}
+preprocessor = modeling.build_preprocessor(num_features, cat_features)
+
+# Cache em disco do pré-processamento ajustado por fold, compartilhado por
+# todos os candidatos e famílias de modelo (None desativa o cache)
+preprocessor_memory = modeling.preprocessor_memory()
+
 # %%
-def report_metrics(y_true, y_proba, cohort=0.5):
+# 'random' reproduz a busca original; 'halving' usa successive halving
+search_config = dict(search_strategies.SEARCH_CONFIG, strategy='random')
 
-    y_pred = (y_proba[:, 1] > cohort).astype(int)
+# %%
+# Orçamento de núcleos da execução: até max_concurrent_families famílias
+# rodam ao mesmo tempo, cada uma com sua fatia de núcleos dividida entre
+# workers da busca e threads internas do estimador
+core_budget = os.cpu_count()
+max_concurrent_families = 3
+estimator_threads = 4
 
-    acc = metrics.accuracy_score(y_true, y_pred)
-    auc = metrics.roc_auc_score(y_true, y_proba[:, 1])
-    precision = metrics.precision_score(y_true, y_pred)
-    recall = metrics.recall_score(y_true, y_pred)
-    f1_score = metrics.f1_score(y_true, y_pred)
+# %%
+# Ponto de corte escolhido nas predições de treino de cada modelo; é gravado
+# no manifest e usado nas métricas de treino e teste (ver thresholds.py)
+threshold_config = dict(thresholds.THRESHOLD_CONFIG)
 
-    error_metrics = {
-        'accuracy': acc,
-        'auc': auc,
-        'precision': precision,
-        'recall': recall,
-        'f1_score': f1_score
-    }
+# %%
+models = modeling.build_models(seed)
+
+# %%
+# Checkpoints por candidato e por família: uma execução interrompida retoma
+# do ponto em que parou (None desativa)
+checkpoint_dir = checkpoint.run_dir({
+    'dataset': dataset_manifest['sha256'],
+    'search_config': search_config,
+    'threshold_config': threshold_config,
+    'metricas_treino': 'out_of_fold',
+    'seed': seed,
+    'features': features,
+    'modelos': checkpoint.describe_models(models)
+})
 
-    return error_metrics
+# %%
+# Triagem: poucos candidatos por família em uma subamostra estratificada;
+# só as famílias dentro da margem do líder vão para a busca completa
+# (ver screening.py; 'ativa': False mantém todas)
+screening_config = dict(screening.SCREENING_CONFIG)
+if screening_config['ativa']:
+    models = screening.screen_families(models, preprocessor, X_train, y_train, screening_config, search_config, seed)
+# %%
+report_metrics = modeling.report_metrics
 # %%
 
-def model_training(model_name, model, param_grid):
+def model_training(model_name, model, param_grid, search_jobs=-1, scoring='roc_auc', checkpoint_path=None,
+                   search_log_path=search_strategies.SEARCH_LOG_PATH):
 
-    pipeline = Pipeline([
-        ('preprocessor', preprocessor),
-        ('classifier', model)
-    ])
+    pipeline = modeling.build_pipeline(preprocessor, model, memory=preprocessor_memory)
 
-    search = model_selection.RandomizedSearchCV(
+    search = search_strategies.build_search(
         pipeline,
-        param_distributions=param_grid,
-        n_iter=100,
-        cv=5,
-        scoring='roc_auc',
-        n_jobs=-1,
+        param_grid,
+        config=search_config,
+        scoring=scoring,
+        checkpoint_path=checkpoint_path,
+        n_jobs=search_jobs,
         verbose=1,
         random_state=seed
     )
+    inicio = time.perf_counter()
     search.fit(X_train, y_train)
+    search_seconds = time.perf_counter() - inicio
+    search_strategies.log_search(model_name, search, search_config['strategy'], search_seconds, search_log_path)
+
+    # O modelo salvo não depende do diretório de cache
+    best_estimator = search.best_estimator_.set_params(memory=None)
 
-    y_pred_train = search.predict_proba(X_train)
-    y_pred_test = search.predict_proba(X_test)
+    # Métricas de treino vêm das predições out-of-fold da busca: honestas e
+    # sem reescorar o treino com o modelo final; só o teste é escorado
+    oof_proba = search_strategies.oof_predictions(search, X_train, y_train)
+    y_pred_train = np.column_stack([1 - oof_proba, oof_proba])
+    y_pred_test = best_estimator.predict_proba(X_test)
+
+    threshold = thresholds.choose_threshold(y_train, oof_proba, threshold_config)
+
+    train_result = report_metrics(y_train, y_pred_train, cohort=threshold['valor'])
+    test_result = report_metrics(y_test, y_pred_test, cohort=threshold['valor'])
 
-    train_result = report_metrics(y_train, y_pred_train)
-    test_result = report_metrics(y_test, y_pred_test)
-    
     result = {
-        'model': search.best_estimator_,
+        'model': best_estimator,
         "features": features,
         'best_params': search.best_params_,
         'best_score': search.best_score_,
         'train_metrics': train_result,
         'test_metrics': test_result,
+        'threshold': threshold,
+        'oof_proba': pd.DataFrame({
+            'paciente_id': df_processed.loc[X_train.index, 'paciente_id'].to_numpy(),
+            target: y_train.to_numpy(),
+            'oof_proba': oof_proba
+        }),
+        'search_strategy': search_config['strategy'],
+        'search_seconds': search_seconds,
         "dt_training": datetime.datetime.now()
     }
 
     return result
 
 # %%
-results = {}
+results = scheduler.run_families(
+    model_training,
+    models,
+    core_budget=core_budget,
+    max_concurrent=max_concurrent_families,
+    estimator_threads=estimator_threads,
+    checkpoint_dir=checkpoint_dir
+)
 
-for model_name, (model, param_grid) in models.items():
-    print(f'Treinando: {model_name}')
-    result = model_training(model_name, model, param_grid)
-    results[model_name] = result
+if preprocessor_memory is not None:
+    preprocessor_memory.clear(warn=False)
+# %%
+# Versão do dataset e pacientes do holdout de cada modelo, e o AUC de teste da
+# busca completa como referência: o retrain.py atualiza os modelos só com os
+# pacientes que chegarem depois e dispara uma nova busca se o AUC cair
+holdout = pd.DataFrame({
+    'paciente_id': df_processed.loc[X_test.index, 'paciente_id'].to_numpy(),
+    target: y_test.to_numpy()
+})
+for result in results.values():
+    result['dataset'] = {'versao': dataset_manifest['version'], 'sha256': dataset_manifest['sha256']}
+    result['holdout'] = holdout
+    result['auc_referencia'] = result['test_metrics']['auc']
 # %%
 results
 # %%
-file_path = '../data/predicted/model_series.pkl'
-
-with open(file_path, 'wb') as f:
-    pickle.dump(results, f)
\ No newline at end of file
+# Um diretório por modelo + manifest com métricas e parâmetros (ver artifacts.py)
+artifacts.save_artifacts(results)
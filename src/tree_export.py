@@ -0,0 +1,356 @@
+# Exportação dos modelos de árvores salvos (Decision Tree, Random Forest,
+# AdaBoost, XGBoost e LightGBM) para uma estrutura de arrays: todas as árvores
+# do ensemble concatenadas em vetores contíguos (feature, threshold, filhos,
+# valor da folha), gravados em um .npz ao lado do classificador. A leitura
+# não recria o grafo de objetos da biblioteca e a avaliação percorre todas as
+# árvores nível a nível sobre um bloco de linhas.
+# Uso: python tree_export.py [--modelos "Random Forest" XGBoost]
+import argparse
+import json
+import os
+
+import joblib
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+import artifacts
+
+TREE_FILE = 'classifier.npz'
+
+ARRAYS = ('feature', 'threshold', 'children', 'default_left', 'value', 'roots')
+
+
+class TreeEnsemble(ClassifierMixin, BaseEstimator):
+
+    # proba = link(base + escala * soma das folhas atingidas), com link
+    # 'identidade' (árvores do sklearn: média das probabilidades) ou
+    # 'sigmoide' (boosting: margem -> probabilidade). Os filhos do nó i ficam
+    # em children[2i] (esquerdo) e children[2i + 1] (direito); as folhas
+    # apontam para si mesmas. Os thresholds têm a precisão em que a biblioteca
+    # compara (float32 no sklearn e no XGBoost, float64 no LightGBM).
+    # Substitui o classificador no Pipeline (artifacts.loaded_pipeline), como o LGBMBoosterClassifier
+    def __init__(self, arrays=None, base=0.0, escala=1.0, link='identidade', menor_igual=True, profundidade=0):
+        self.arrays = arrays
+        self.base = base
+        self.escala = escala
+        self.link = link
+        self.menor_igual = menor_igual
+        self.profundidade = profundidade
+
+    @property
+    def classes_(self):
+        return np.array([0, 1])
+
+    @property
+    def n_trees(self):
+        return len(self.arrays['roots'])
+
+    def __sklearn_is_fitted__(self):
+        return self.arrays is not None
+
+    def _leaf_sum(self, X):
+
+        # Pares (linha, árvore) do bloco avançam juntos um nível por passo;
+        # quando uma parte relevante chega às folhas, os valores são somados e
+        # os pares terminados saem dos arrays
+        a = self.arrays
+        n, n_features = X.shape
+        X = X.ravel()
+        faltantes = np.isnan(X).any()
+        soma = np.zeros(n, dtype=np.float64)
+
+        linhas = np.repeat(np.arange(n, dtype=np.int32), self.n_trees)
+        inicio_linha = linhas * n_features
+        nos = np.tile(a['roots'], n)
+
+        for _ in range(self.profundidade):
+            x = X[inicio_linha + a['feature'][nos]]
+            limite = a['threshold'][nos]
+            direita = ~(x <= limite) if self.menor_igual else ~(x < limite)
+            if faltantes:
+                direita = np.where(np.isnan(x), ~a['default_left'][nos], direita)
+            nos = a['children'][2 * nos + direita]
+
+            ativos = ~a['folha'][nos]
+            qtd_ativos = np.count_nonzero(ativos)
+            if qtd_ativos == 0:
+                break
+            if qtd_ativos < 0.75 * len(nos):
+                terminados = ~ativos
+                soma += np.bincount(linhas[terminados], a['value'][nos[terminados]], minlength=n)
+                nos, linhas, inicio_linha = nos[ativos], linhas[ativos], inicio_linha[ativos]
+
+        return soma + np.bincount(linhas, a['value'][nos], minlength=n)
+
+    def decision_function(self, X, tamanho_bloco=256):
+
+        X = np.ascontiguousarray(X, dtype=self.arrays['threshold'].dtype)
+        soma = np.empty(len(X), dtype=np.float64)
+        for inicio in range(0, len(X), tamanho_bloco):
+            soma[inicio:inicio + tamanho_bloco] = self._leaf_sum(X[inicio:inicio + tamanho_bloco])
+
+        return self.base + self.escala * soma
+
+    def predict_proba(self, X):
+
+        margem = self.decision_function(X)
+        proba = 1 / (1 + np.exp(-margem)) if self.link == 'sigmoide' else margem
+
+        return np.column_stack([1 - proba, proba])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+    def save(self, path, origem_sha256=''):
+        # origem_sha256: hash do arquivo do classificador exportado (ver load_pipeline)
+        np.savez(path, base=self.base, escala=self.escala, link=self.link,
+                 menor_igual=self.menor_igual, profundidade=self.profundidade, origem_sha256=origem_sha256,
+                 **{nome: self.arrays[nome] for nome in ARRAYS})
+
+
+def _ensemble(arrays, **kwargs):
+    # Máscara das folhas (nós que apontam para si mesmos), derivada e não gravada
+    arrays['folha'] = arrays['children'][0::2] == np.arange(len(arrays['feature']))
+    return TreeEnsemble(arrays, **kwargs)
+
+
+def load(path):
+
+    with np.load(path) as dados:
+        ensemble = _ensemble({nome: dados[nome] for nome in ARRAYS}, base=float(dados['base']),
+                             escala=float(dados['escala']), link=str(dados['link']),
+                             menor_igual=bool(dados['menor_igual']), profundidade=int(dados['profundidade']))
+        ensemble.origem_sha256_ = str(dados['origem_sha256']) if 'origem_sha256' in dados else ''
+
+    return ensemble
+
+
+def source_sha256(entrada):
+    # Hash (do manifest) do arquivo do classificador de onde o .npz deve ter saído
+    return entrada['artifact']['sha256'][artifacts.CLASSIFIER_FILES[entrada['artifact']['format']]]
+
+
+def load_pipeline(model_name='XGBoost', artifacts_dir=artifacts.ARTIFACTS_DIR):
+
+    # Pipeline do modelo salvo com o classificador lido do .npz (sem
+    # desserializar a biblioteca). O .npz só é gerado por este módulo: depois
+    # de um train.py/retrain.py ele pode ser de um classificador anterior, e
+    # nesse caso a leitura falha em vez de servir o modelo antigo
+    entrada = artifacts.load_artifacts(artifacts_dir)[model_name]
+    diretorio = os.path.join(artifacts_dir, entrada['artifact']['dir'])
+    classifier = load(os.path.join(diretorio, TREE_FILE))
+    if classifier.origem_sha256_ != source_sha256(entrada):
+        raise ValueError(f'{TREE_FILE} de {model_name} não corresponde ao classificador salvo; '
+                         f'rode python tree_export.py --modelos "{model_name}"')
+
+    return artifacts.loaded_pipeline(joblib.load(os.path.join(diretorio, artifacts.PREPROCESSOR_FILE)), classifier)
+
+
+def _float32_floor(threshold):
+
+    # Maior float32 <= threshold: com X em float32, x <= t e x <= floor32(t) são equivalentes
+    limite = np.asarray(threshold, dtype=np.float64)
+    limite32 = limite.astype(np.float32)
+    acima = limite32.astype(np.float64) > limite
+
+    return np.where(acima, np.nextafter(limite32, np.float32(-np.inf)), limite32)
+
+
+def _flatten(arvores, precisao=np.float32, **kwargs):
+
+    # Concatena as árvores (arrays locais, filho -1 nas folhas) em arrays
+    # globais; folhas viram laços (filhos = o próprio nó, feature 0)
+    partes = {nome: [] for nome in ARRAYS}
+    inicio = 0
+    for arvore in arvores:
+        n = len(arvore['left'])
+        folha = arvore['left'] < 0
+        proprio = np.arange(inicio, inicio + n)
+        filhos = [np.where(folha, proprio, arvore['left'] + inicio), np.where(folha, proprio, arvore['right'] + inicio)]
+        partes['feature'].append(np.where(folha, 0, arvore['feature']))
+        partes['threshold'].append(np.where(folha, 0, arvore['threshold']))
+        partes['children'].append(np.column_stack(filhos).ravel())
+        partes['default_left'].append(np.asarray(arvore['default_left'], dtype=bool))
+        partes['value'].append(np.where(folha, arvore['value'], 0))
+        partes['roots'].append([inicio])
+        inicio += n
+
+    tipos = {'feature': np.int32, 'threshold': precisao, 'children': np.int32,
+             'default_left': bool, 'value': np.float32, 'roots': np.int32}
+    arrays = {nome: np.concatenate(partes[nome]).astype(tipos[nome]) for nome in ARRAYS}
+    if precisao == np.float32:
+        arrays['threshold'] = _float32_floor(np.concatenate(partes['threshold'])).astype(np.float32)
+
+    return _ensemble(arrays, profundidade=max(arvore['profundidade'] for arvore in arvores), **kwargs)
+
+
+def _depth(left, right):
+
+    profundidade = np.zeros(len(left), dtype=np.int64)
+    for no in range(len(left)):
+        if left[no] >= 0:
+            profundidade[left[no]] = profundidade[right[no]] = profundidade[no] + 1
+
+    return int(profundidade.max())
+
+
+def _sklearn_tree(tree, value):
+
+    # Nós do sklearn já vêm em pré-ordem (pai antes dos filhos)
+    return {
+        'feature': tree.feature,
+        'threshold': tree.threshold,
+        'left': tree.children_left,
+        'right': tree.children_right,
+        'default_left': getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=bool)),
+        'value': value,
+        'profundidade': tree.max_depth
+    }
+
+
+def _class_one_proba(tree):
+    return tree.value[:, 0, 1] / tree.value[:, 0, :].sum(axis=1)
+
+
+def _from_sklearn_forest(estimators):
+    arvores = [_sklearn_tree(est.tree_, _class_one_proba(est.tree_)) for est in estimators]
+    return _flatten(arvores, base=0, escala=1 / len(arvores), link='identidade', menor_igual=True)
+
+
+def _from_adaboost(classifier):
+
+    # SAMME binário: cada árvore vota ±peso na classe prevista e
+    # proba = sigmoide(2 * soma / soma dos pesos)
+    arvores = []
+    for est, peso in zip(classifier.estimators_, classifier.estimator_weights_):
+        sinal = np.where(est.tree_.value[:, 0, 1] > est.tree_.value[:, 0, 0], 1.0, -1.0)
+        arvores.append(_sklearn_tree(est.tree_, sinal * peso))
+
+    return _flatten(arvores, base=0, escala=2 / classifier.estimator_weights_.sum(), link='sigmoide', menor_igual=True)
+
+
+def _from_xgboost(classifier):
+
+    booster = classifier.get_booster()
+    modelo = json.loads(booster.save_raw('json'))['learner']
+    if modelo['gradient_booster']['name'] != 'gbtree' or modelo['objective']['name'] != 'binary:logistic':
+        raise ValueError('Exportação do XGBoost só para gbtree com binary:logistic')
+
+    # Mesmo intervalo de iterações do predict_proba (melhor iteração com early stopping)
+    arvores_por_iteracao = int(modelo['gradient_booster']['model']['gbtree_model_param']['num_parallel_tree'])
+    iteracoes = booster.num_boosted_rounds()
+    if booster.attr('best_iteration') is not None:
+        iteracoes = int(booster.attr('best_iteration')) + 1
+
+    arvores = []
+    for arvore in modelo['gradient_booster']['model']['trees'][:iteracoes * arvores_por_iteracao]:
+        if any(arvore['split_type']):
+            raise ValueError('Splits categóricos do XGBoost não são exportados')
+        left, right = np.array(arvore['left_children']), np.array(arvore['right_children'])
+        condicao = np.array(arvore['split_conditions'], dtype=np.float32)
+        arvores.append({
+            'feature': np.array(arvore['split_indices']),
+            'threshold': condicao,
+            'left': left,
+            'right': right,
+            'default_left': np.array(arvore['default_left'], dtype=bool),
+            'value': condicao,
+            'profundidade': _depth(left, right)
+        })
+
+    base_score = float(modelo['learner_model_param']['base_score'].strip('[]'))
+
+    return _flatten(arvores, base=np.log(base_score / (1 - base_score)), escala=1, link='sigmoide', menor_igual=False)
+
+
+def _lightgbm_tree(estrutura):
+
+    # Árvore aninhada do dump_model -> arrays em pré-ordem
+    arvore = {'feature': [], 'threshold': [], 'left': [], 'right': [], 'default_left': [], 'value': []}
+    profundidade = 0
+    pilha = [(estrutura, -1, False, 0)]
+    while pilha:
+        no, pai, direita, nivel = pilha.pop()
+        indice = len(arvore['left'])
+        if pai >= 0:
+            arvore['right' if direita else 'left'][pai] = indice
+        profundidade = max(profundidade, nivel)
+
+        if 'leaf_value' in no:
+            valores = (0, 0.0, -1, -1, False, no['leaf_value'])
+        else:
+            if no['decision_type'] != '<=':
+                raise ValueError('Splits categóricos do LightGBM não são exportados')
+            valores = (no['split_feature'], no['threshold'], -1, -1, no['default_left'], 0.0)
+            pilha.append((no['right_child'], indice, True, nivel + 1))
+            pilha.append((no['left_child'], indice, False, nivel + 1))
+        for nome, valor in zip(['feature', 'threshold', 'left', 'right', 'default_left', 'value'], valores):
+            arvore[nome].append(valor)
+
+    return {**{nome: np.array(valores) for nome, valores in arvore.items()}, 'profundidade': profundidade}
+
+
+def _from_lightgbm(booster):
+
+    # O valor inicial (boost_from_average) já está nas folhas da primeira
+    # árvore; o LightGBM compara em float64, então os thresholds ficam em float64
+    modelo = booster.dump_model()
+    objetivo = modelo['objective'].split()
+    if objetivo[0] != 'binary':
+        raise ValueError('Exportação do LightGBM só para o objetivo binary')
+    sigmoide = float(next((p.split(':')[1] for p in objetivo if p.startswith('sigmoid:')), 1.0))
+
+    arvores = [_lightgbm_tree(info['tree_structure']) for info in modelo['tree_info']]
+
+    return _flatten(arvores, precisao=np.float64, base=0, escala=sigmoide, link='sigmoide', menor_igual=True)
+
+
+def export_classifier(classifier):
+
+    nome = type(classifier).__name__
+    if nome == 'DecisionTreeClassifier':
+        return _from_sklearn_forest([classifier])
+    if nome == 'RandomForestClassifier':
+        return _from_sklearn_forest(classifier.estimators_)
+    if nome == 'AdaBoostClassifier':
+        return _from_adaboost(classifier)
+    if nome == 'XGBClassifier':
+        return _from_xgboost(classifier)
+    if nome in ('LGBMClassifier', 'LGBMBoosterClassifier'):
+        return _from_lightgbm(classifier.booster_)
+
+    raise ValueError(f'{nome} não é um modelo de árvores exportável')
+
+
+def tree_path(entrada, artifacts_dir=artifacts.ARTIFACTS_DIR):
+    return os.path.join(artifacts_dir, entrada['artifact']['dir'], TREE_FILE)
+
+
+def export_artifacts(model_names=None, artifacts_dir=artifacts.ARTIFACTS_DIR):
+
+    # Grava o .npz de cada modelo de árvores salvo; os demais são ignorados
+    registry = artifacts.load_artifacts(artifacts_dir)
+    exportados = {}
+    for model_name in model_names or list(registry):
+        entrada = registry[model_name]
+        try:
+            ensemble = export_classifier(entrada['model'].named_steps['classifier'])
+        except ValueError as erro:
+            print(f'{model_name}: {erro}')
+            continue
+        ensemble.save(tree_path(entrada, artifacts_dir), source_sha256(entrada))
+        exportados[model_name] = tree_path(entrada, artifacts_dir)
+        print(f'{model_name}: {ensemble.n_trees} árvores, {len(ensemble.arrays["feature"])} nós, '
+              f'profundidade {ensemble.profundidade} -> {exportados[model_name]}')
+
+    return exportados
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Exporta os modelos de árvores salvos para arrays (.npz)')
+    parser.add_argument('--artefatos', default=artifacts.ARTIFACTS_DIR)
+    parser.add_argument('--modelos', nargs='+', help='modelos do manifest (padrão: todos os de árvores)')
+    args = parser.parse_args()
+
+    export_artifacts(args.modelos, args.artefatos)